@@ -0,0 +1,37 @@
+"""add HNSW index on knowledge_nodes.embedding
+
+Revision ID: b7c1d2e3f4a5
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+
+from app.db.vector_index import hnsw_index_sql
+
+# revision identifiers, used by Alembic.
+revision = 'b7c1d2e3f4a5'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_knowledge_nodes_embedding_hnsw'
+
+# pgvector 默认构建参数；调整前用 scripts/benchmark_pgvector_ann.py 对比召回与延迟
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    # CONCURRENTLY 不能在事务中执行，且不阻塞 knowledge_nodes 的写入
+    with op.get_context().autocommit_block():
+        op.execute(hnsw_index_sql(
+            INDEX_NAME, 'knowledge_nodes',
+            m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, distance='cosine',
+        ))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
@@ -0,0 +1,24 @@
+"""add last_decayed_at to user_node_status
+
+Revision ID: c3d4e5f6a7b8
+Revises: b7c1d2e3f4a5
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b7c1d2e3f4a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 每日衰减的幂等标记；可空，已有行视为当天尚未衰减
+    op.add_column('user_node_status', sa.Column('last_decayed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_node_status', 'last_decayed_at')
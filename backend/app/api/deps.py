@@ -7,7 +7,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
+from app.db.session import get_db, AsyncSessionLocal
+from app.core.auth_cache import auth_user_cache
 from app.core.security import decode_token
 from app.core.exceptions import AuthenticationError
 from app.models.user import User # Added import
@@ -39,10 +40,32 @@ async def get_current_user_id(
         )
 
 async def get_current_user(
+    user_id: str = Depends(get_current_user_id),
+) -> User:
+    """
+    获取当前用户（鉴权快速路径）
+
+    优先读取认证用户缓存（进程内 + Redis），未命中时才占用数据库连接回源。
+    返回的是游离实例，仅用于读取；需要修改并保存用户时使用 get_current_user_from_db。
+    """
+    user = await auth_user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+    if not user:
+        raise AuthenticationError("User not found")
+    await auth_user_cache.put(user)
+    return user
+
+async def get_current_user_from_db(
     db: AsyncSession = Depends(get_db),
     user_id: str = Depends(get_current_user_id),
 ) -> User:
-    from app.models.user import User # Import here to avoid circular dependency
+    """
+    从请求会话加载当前用户（用于需要修改并持久化用户的接口）
+    """
     user = await db.get(User, user_id)
     if not user:
         raise AuthenticationError("User not found")
@@ -12,7 +12,7 @@ from app.db.session import get_db
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.services.llm_service import llm_service, LLMResponse, StreamChunk
-from app.services.analytics_service import AnalyticsService
+from app.services.learning_summary_service import learning_summary_service
 from app.tools.registry import tool_registry
 from app.orchestration.executor import ToolExecutor
 from app.orchestration.composer import ResponseComposer
@@ -536,7 +536,6 @@ async def get_user_context(db: AsyncSession, user_id: UUID) -> dict:
     from datetime import datetime, timedelta
     from app.models.task import Task
     from app.models.plan import Plan
-    from app.models.knowledge import UserNodeStatus
 
     context = {
         "recent_tasks": [],
@@ -548,12 +547,10 @@ async def get_user_context(db: AsyncSession, user_id: UUID) -> dict:
     }
 
     try:
-        # 0. 获取 Analytics Summary
-        analytics_service = AnalyticsService(db)
-        # Ensure today's stats are up to date (optional, might be slow for every chat, maybe skip calculation here and just read?)
-        # For MVP, let's just get the summary which reads stored data.
-        # Ideally, we calculate it async or periodically.
-        context["analytics_summary"] = await analytics_service.get_user_profile_summary(user_id)
+        # 0. 学习状态摘要（知识星图统计 + Analytics Summary），由 Redis 预计算维护
+        summary = await learning_summary_service.get_summary(db, user_id)
+        context["knowledge_stats"] = summary["knowledge_stats"]
+        context["analytics_summary"] = summary["analytics_summary"]
 
         # 1. 获取用户基本信息（火花等级和亮度）
         user_stmt = select(User).where(User.id == user_id)
@@ -622,24 +619,6 @@ async def get_user_context(db: AsyncSession, user_id: UUID) -> dict:
             for plan in plans
         ]
 
-        # 4. 获取知识星图统计
-        nodes_stmt = (
-            select(UserNodeStatus)
-            .where(UserNodeStatus.user_id == user_id)
-        )
-        nodes_result = await db.execute(nodes_stmt)
-        nodes = nodes_result.scalars().all()
-
-        total_nodes = len(nodes)
-        mastered_nodes = sum(1 for n in nodes if n.mastery_level >= 0.8)
-        learning_nodes = sum(1 for n in nodes if 0.3 <= n.mastery_level < 0.8)
-
-        context["knowledge_stats"] = {
-            "total_nodes": total_nodes,
-            "mastered_nodes": mastered_nodes,
-            "learning_nodes": learning_nodes
-        }
-
     except Exception as e:
         # 如果获取上下文失败，返回默认值，不影响聊天功能
         print(f"获取用户上下文时出错: {e}")
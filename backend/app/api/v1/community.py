@@ -10,6 +10,7 @@ from uuid import UUID
 from app.db.session import get_db
 from app.core.security import decode_token
 from app.api.deps import get_current_user
+from app.core.auth_cache import auth_user_cache
 from app.core.websocket import manager
 from app.core.rate_limiting import limiter
 from app.models.user import User, UserStatus
@@ -571,6 +572,7 @@ async def _update_user_status(user_id: str, status: UserStatus):
         user.status = status
         db.add(user)
         await db.commit()
+        await auth_user_cache.invalidate(user_id)
 
         # 广播 (分布式优化版：PUBLISH ONCE)
         broadcast_status = status.value
@@ -589,6 +591,7 @@ async def update_status(
     user.status = UserStatus(data.status.value)
     db.add(user)
     await db.commit()
+    await auth_user_cache.invalidate(user.id)
     
     # 通知
     broadcast_status = data.status.value
@@ -7,7 +7,7 @@
 from fastapi import APIRouter, Depends, Query
 from typing import Dict, Any, List
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from loguru import logger
 
 from app.core.deps import get_current_user, get_db
@@ -21,7 +21,7 @@ router = APIRouter(prefix="/decay", tags=["decay"])
 
 class DecayProjectionResponse(BaseModel):
     """时光机预测响应"""
-    days_ahead: int
+    days_ahead: int = Field(ge=0, le=90)
     total_nodes: int
     projections: Dict[str, Dict[str, Any]]
 
@@ -32,7 +32,7 @@ class DecayProjectionResponse(BaseModel):
 class InterventionSimulationRequest(BaseModel):
     """干预模拟请求"""
     node_ids: List[str]  # 要复习的节点ID
-    days_ahead: int = 30
+    days_ahead: int = Field(30, ge=0, le=90, description="预测天数（0-90天），与预计算的投影矩阵范围一致")
     review_boost: float = 30.0  # 复习提升的掌握度
 
 
@@ -11,6 +11,7 @@ from pydantic import BaseModel, Field
 
 from app.db.session import get_db
 from app.api.deps import get_current_user
+from app.core.auth_cache import auth_user_cache
 from app.models.user import User
 from app.models.focus import FocusType, FocusStatus
 from app.services.focus_service import focus_service
@@ -64,6 +65,9 @@ async def log_focus_session(
             FocusStatus(data.status)
         )
         await db.commit()
+        if result["rewards"]["flame_earned"]:
+            # 火苗亮度 / 等级属于认证缓存字段
+            await auth_user_cache.invalidate(current_user.id)
         
         session = result["session"]
         rewards = result["rewards"]
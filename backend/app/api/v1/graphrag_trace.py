@@ -39,6 +39,7 @@ class GraphRAGTraceResponse(BaseModel):
 
     # 性能指标
     timing: Dict[str, float]
+    critical_path: List[str] = []
 
     class Config:
         from_attributes = True
@@ -96,7 +97,8 @@ async def get_trace_by_id(
         vector_search_count=len(trace.vector_search_results),
         graph_search_count=len(trace.graph_search_results),
         user_interest_count=len(trace.user_interest_nodes),
-        timing=trace.timing
+        timing=trace.timing,
+        critical_path=trace.critical_path
     )
 
 
@@ -149,6 +151,7 @@ async def test_graphrag_retrieval(
                 "graph_count": len(result.trace.graph_search_results),
                 "relationships_count": len(result.trace.relationships),
                 "timing": result.trace.timing,
+                "critical_path": result.trace.critical_path,
                 "fused_context_preview": result.fused_context[:200] + "..."
             }
         else:
@@ -222,6 +222,7 @@ async def queue_status() -> Dict[str, Any]:
         # 检查各个队列
         queues = {
             "summarization": "queue:summarization",
+            "summarization_high": "queue:summarization:high",
             "billing": "queue:billing",
             "expansion": "queue:expansion",
         }
@@ -5,7 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.db.session import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_from_db
+from app.core.auth_cache import auth_user_cache
 from app.models.user import User
 from app.schemas.user import UserPreferences, UserProfile, UserUpdate, PasswordChange
 from app.core.security import verify_password, get_password_hash
@@ -23,7 +24,7 @@ async def get_me(current_user: User = Depends(get_current_user)):
 @router.put("/me", response_model=UserProfile)
 async def update_me(
     obj_in: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_from_db),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -46,13 +47,14 @@ async def update_me(
     
     db.add(current_user)
     await db.commit()
+    await auth_user_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     return current_user
 
 @router.post("/me/avatar", response_model=UserProfile)
 async def update_avatar(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_from_db),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -81,13 +83,14 @@ async def update_avatar(
     
     db.add(current_user)
     await db.commit()
+    await auth_user_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     return current_user
 
 @router.post("/me/password")
 async def change_password(
     obj_in: PasswordChange,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_from_db),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -100,12 +103,13 @@ async def change_password(
     
     db.add(current_user)
     await db.commit()
+    await auth_user_cache.invalidate(current_user.id)
     return {"detail": "Password updated successfully"}
 
 @router.put("/me/preferences", response_model=UserProfile)
 async def update_my_preferences(
     preferences: UserPreferences,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_from_db),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -116,6 +120,7 @@ async def update_my_preferences(
     
     db.add(current_user)
     await db.commit()
+    await auth_user_cache.invalidate(current_user.id)
     await db.refresh(current_user)
     
     return current_user
\ No newline at end of file
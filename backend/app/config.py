@@ -3,7 +3,7 @@ Application Configuration Management
 使用 pydantic-settings 管理配置
 """
 import os
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 from dotenv import load_dotenv
@@ -37,6 +37,7 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_PASSWORD: str = "devpassword"
+    REDIS_SEARCH_EF_RUNTIME: int = 10  # idx:knowledge HNSW 查询时的候选列表大小 (越大召回越高、越慢)
 
     # Database Pool Settings (for PostgreSQL)
     DB_POOL_SIZE: int = 20  # 连接池大小
@@ -45,6 +46,9 @@ class Settings(BaseSettings):
     DB_POOL_TIMEOUT: int = 30  # 获取连接超时时间（秒）
     DB_ECHO: bool = False  # 是否打印SQL语句（生产环境应为False）
 
+    # pgvector ANN 检索 (knowledge_nodes.embedding 的 HNSW 索引)
+    PGVECTOR_EF_SEARCH: int = 40  # 默认 hnsw.ef_search (pgvector 默认值 40)，越大召回越高、越慢
+
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = []
 
@@ -74,6 +78,58 @@ class Settings(BaseSettings):
     # Embedding Service
     EMBEDDING_MODEL: str = "text-embedding-v2"  # 向量模型
     EMBEDDING_DIM: int = 1536  # 向量维度
+    EMBEDDING_MAX_BATCH_SIZE: int = 25  # 单次 /v1/embeddings 请求最多文本数
+    EMBEDDING_BATCH_WINDOW_MS: int = 10  # 合并并发 get_embedding 调用的时间窗口
+    EMBEDDING_MAX_CONNECTIONS: int = 20  # 长连接池大小
+    EMBEDDING_CACHE_SIZE: int = 10000  # 进程内 LRU 缓存条目数
+    EMBEDDING_CACHE_TTL: int = 604800  # Redis 向量缓存过期时间（秒，7天）
+
+    # Reranker (Cross-Encoder)
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_BACKEND: str = "torch"  # torch | onnx (需安装 onnxruntime)
+    RERANK_ONNX_PATH: str = ""  # 导出的 (int8 量化) ONNX 模型目录，含 model.onnx 与 tokenizer 文件
+    RERANK_INTRA_OP_THREADS: int = 4  # 推理线程数
+    RERANK_MAX_BATCH_SIZE: int = 64  # 单次推理最多 (query, chunk) 对数
+    RERANK_BATCH_WINDOW_MS: int = 5  # 合并并发 rerank 请求的时间窗口
+    RERANK_CACHE_SIZE: int = 20000  # (query, chunk) 分数 LRU 条目数
+
+    # Graph Reasoning (进程级前置依赖图)
+    GRAPH_SYNC_INTERVAL: float = 1.0  # 增量同步 stream:graph_sync 的最小间隔（秒）
+    GRAPH_CACHE_MAX_AGE: int = 600  # 全量重建的最长间隔（秒），兜底未经事件流写入的关系
+
+    # 知识衰减时光机
+    DECAY_PROJECTION_CACHE_TTL: int = 3600  # 用户衰减预测矩阵缓存时间（秒）
+
+    # 聊天上下文：用户学习状态摘要
+    LEARNING_SUMMARY_TTL: int = 86400  # 摘要缓存时间（秒），兜底修正增量更新的漂移
+
+    # 聊天上下文：历史窗口 Token 预算 (0 表示按消息条数裁剪)
+    CONTEXT_TOKEN_BUDGET: int = 0  # 历史消息 + 摘要的默认 Token 预算
+    CONTEXT_MODEL_TOKEN_BUDGETS: Dict[str, int] = {}  # 按模型覆盖，如 {"qwen-turbo": 6000}
+    CONTEXT_TOKEN_ENCODING: str = "cl100k_base"  # tiktoken 编码
+
+    # 智能推送周期
+    PUSH_BATCH_SIZE: int = 1000  # 每批（按 user_id keyset 分页）评估的用户数
+    PUSH_CONTENT_CONCURRENCY: int = 8  # 推送文案 / 好奇心胶囊生成的并发上限
+
+    # 认证用户缓存 (get_current_user 快速路径)
+    AUTH_USER_LOCAL_TTL: float = 30.0  # 进程内缓存时间（秒），也是跨进程失效的最大滞后
+    AUTH_USER_LOCAL_CACHE_SIZE: int = 10000  # 进程内缓存的用户数上限
+    AUTH_USER_CACHE_TTL: int = 300  # Redis 缓存时间（秒）
+
+    # Token 吊销检查 (进程内布隆过滤器 + Redis pub/sub 同步)
+    TOKEN_REVOCATION_BLOOM_CAPACITY: int = 100000  # 预期同时有效的吊销 JTI 数
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE: float = 0.001  # 误判率（误判只会多一次 Redis 确认）
+    TOKEN_REVOCATION_REBUILD_INTERVAL: int = 3600  # 从 Redis 全量重建的间隔（秒），清除已过期的 JTI
+
+    # 夜间批处理任务 (隐式行为挖掘 / 复习提醒)
+    NIGHTLY_JOB_CHUNK_SIZE: int = 500  # 每块（按 user_id keyset 分页）处理的用户数，完成后写检查点
+    IMPLICIT_MINING_CONCURRENCY: int = 4  # 隐式行为挖掘的并发用户数（各自独立会话）
+
+    # GraphRAG 实体识别 (本地词典优先，未命中才调用 LLM)
+    ENTITY_DICT_REFRESH_INTERVAL: int = 300  # 知识点名称/关键词词典重建间隔（秒）
+    ENTITY_CACHE_SIZE: int = 2000  # 按查询缓存的实体识别结果条目数
+    ENTITY_CACHE_TTL: int = 600  # 实体识别结果缓存时间（秒）
 
     # File Storage
     UPLOAD_DIR: str = "./uploads"
@@ -0,0 +1,159 @@
+"""
+认证用户缓存 (Auth User Cache)
+
+get_current_user 的快速路径：两级缓存鉴权 / 授权所需的用户字段
+- L1: 进程内 LRU，短 TTL（默认 30 秒），命中时不访问网络
+- L2: Redis JSON，`auth:user:{user_id}`，TTL 默认 5 分钟
+两级都未命中才回源数据库。
+
+缓存不含 hashed_password 等敏感字段；返回的 User 是按缓存字段重建的游离 (detached) 实例，
+每次请求一个新对象。需要修改并持久化用户的接口应使用数据库加载的实例。
+
+失效：UserService.invalidate_user_cache 及资料更新接口调用 invalidate()，
+删除本进程 L1 与 Redis；其他进程的 L1 最多滞后 AUTH_USER_LOCAL_TTL 秒。
+"""
+
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import settings
+from app.core.cache import cache_service
+from app.core.metrics import CACHE_HIT_COUNT
+from app.models.user import User, AvatarStatus, UserStatus
+
+AUTH_USER_KEY = "auth:user:{}"
+
+# 鉴权 / 授权及常用展示字段（不含密码哈希、第三方登录 ID 等）
+CACHED_FIELDS = (
+    "id", "username", "email", "nickname", "avatar_url", "avatar_status", "pending_avatar_url",
+    "flame_level", "flame_brightness", "depth_preference", "curiosity_preference",
+    "is_active", "is_superuser", "status", "created_at", "updated_at",
+)
+_DATETIME_FIELDS = ("created_at", "updated_at")
+_ENUM_FIELDS = {"avatar_status": AvatarStatus, "status": UserStatus}
+
+
+def _serialize(user: User) -> Dict[str, Any]:
+    data = {}
+    for field in CACHED_FIELDS:
+        value = getattr(user, field)
+        if isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif field in _ENUM_FIELDS and value is not None:
+            value = _ENUM_FIELDS[field](value).value
+        data[field] = value
+    return data
+
+
+def _build_user(data: Dict[str, Any]) -> User:
+    values = dict(data)
+    values["id"] = UUID(values["id"])
+    for field in _DATETIME_FIELDS:
+        if values.get(field):
+            values[field] = datetime.fromisoformat(values[field])
+    for field, enum_type in _ENUM_FIELDS.items():
+        if values.get(field) is not None:
+            values[field] = enum_type(values[field])
+
+    user = User(**values)
+    # 带主键身份的游离实例：误 add 到会话时按已存在的行处理，而不是 INSERT
+    make_transient_to_detached(user)
+    return user
+
+
+class AuthUserCache:
+    """
+    两级认证用户缓存
+    """
+
+    def __init__(
+        self,
+        local_ttl: float = settings.AUTH_USER_LOCAL_TTL,
+        local_size: int = settings.AUTH_USER_LOCAL_CACHE_SIZE,
+        redis_ttl: int = settings.AUTH_USER_CACHE_TTL,
+    ):
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.redis_ttl = redis_ttl
+        # user_id -> (过期时间, 序列化字段)
+        self._local: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def _local_get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return data
+
+    def _local_put(self, user_id: str, data: Dict[str, Any]):
+        self._local[user_id] = (time.monotonic() + self.local_ttl, data)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id: str) -> Optional[User]:
+        """按缓存字段重建用户；两级都未命中返回 None（由调用方回源数据库）"""
+        user_id = str(user_id)
+
+        data = self._local_get(user_id)
+        if data is not None:
+            CACHE_HIT_COUNT.labels(cache_name="auth_user_local", result="hit").inc()
+            return _build_user(data)
+        CACHE_HIT_COUNT.labels(cache_name="auth_user_local", result="miss").inc()
+
+        if not cache_service.redis:
+            return None
+        try:
+            raw = await cache_service.redis.get(AUTH_USER_KEY.format(user_id))
+        except Exception as e:
+            logger.warning(f"Auth user cache lookup failed: {e}")
+            return None
+        if raw is None:
+            CACHE_HIT_COUNT.labels(cache_name="auth_user_redis", result="miss").inc()
+            return None
+
+        CACHE_HIT_COUNT.labels(cache_name="auth_user_redis", result="hit").inc()
+        data = json.loads(raw)
+        self._local_put(user_id, data)
+        return _build_user(data)
+
+    async def put(self, user: User):
+        """写入两级缓存（数据库回源后调用）"""
+        user_id = str(user.id)
+        data = _serialize(user)
+        self._local_put(user_id, data)
+
+        if not cache_service.redis:
+            return
+        try:
+            await cache_service.redis.set(AUTH_USER_KEY.format(user_id), json.dumps(data), ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"Auth user cache write failed: {e}")
+
+    async def invalidate(self, user_id: Any):
+        """删除本进程 L1 与 Redis 中的缓存"""
+        user_id = str(user_id)
+        self._local.pop(user_id, None)
+
+        if not cache_service.redis:
+            return
+        try:
+            await cache_service.redis.delete(AUTH_USER_KEY.format(user_id))
+        except Exception as e:
+            logger.warning(f"Auth user cache invalidation failed for {user_id}: {e}")
+
+
+auth_user_cache = AuthUserCache()
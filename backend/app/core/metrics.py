@@ -35,6 +35,13 @@ CACHE_HIT_COUNT = Counter(
     ['cache_name', 'result']  # result: hit, miss
 )
 
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    'sparkle_semantic_cache_similarity',
+    'Cosine similarity of the nearest cached query on semantic cache lookups',
+    ['result'],  # result: hit, miss
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.95, 0.96, 0.98, 0.99, 1.0)
+)
+
 # 4. 工具执行指标
 TOOL_EXECUTION_COUNT = Counter(
     'sparkle_tool_executions_total',
@@ -42,7 +49,52 @@ TOOL_EXECUTION_COUNT = Counter(
     ['tool_name', 'status']
 )
 
-# 5. 系统指标
+TOOL_EXECUTION_LATENCY = Histogram(
+    'sparkle_tool_execution_duration_seconds',
+    'Tool execution duration in seconds',
+    ['tool_name', 'status'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# 5. 智能推送指标
+PUSH_CYCLE_USERS = Counter(
+    'sparkle_push_cycle_users_total',
+    'Total number of users evaluated by the smart push cycle',
+    ['result']  # result: sent, skipped, error
+)
+
+PUSH_CYCLE_DURATION = Histogram(
+    'sparkle_push_cycle_duration_seconds',
+    'Smart push cycle duration in seconds',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 900, 1800)
+)
+
+PUSH_CYCLE_THROUGHPUT = Gauge(
+    'sparkle_push_cycle_users_per_second',
+    'Users evaluated per second in the last completed smart push cycle'
+)
+
+# 6. 定时批处理任务指标
+SCHEDULED_JOB_DURATION = Histogram(
+    'sparkle_scheduled_job_duration_seconds',
+    'Scheduled batch job duration in seconds',
+    ['job'],
+    buckets=(10, 30, 60, 300, 600, 1800, 3600, 7200)
+)
+
+SCHEDULED_JOB_PROGRESS = Gauge(
+    'sparkle_scheduled_job_processed_users',
+    'Users processed so far by the current (or last) run of a scheduled batch job',
+    ['job']
+)
+
+SCHEDULED_JOB_ERRORS = Counter(
+    'sparkle_scheduled_job_errors_total',
+    'Total number of per-user failures in scheduled batch jobs',
+    ['job']
+)
+
+# 7. 系统指标
 ACTIVE_SESSIONS = Gauge(
     'sparkle_active_sessions_total',
     'Total number of active chat sessions'
@@ -1,18 +1,30 @@
+import re
 import struct
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
 from redis.asyncio import Redis
 from redis.commands.search.query import Query
 from loguru import logger
 from app.config import settings
 
+# Characters that must be escaped inside a TAG filter value (e.g. UUID hyphens)
+_TAG_ESCAPE = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+
+DEFAULT_RETURN_FIELDS = ("id", "parent_id", "content", "vector_score", "parent_name", "importance")
+
+
 class RedisSearchClient:
     """
     Wrapper for Redis Search (RediSearch)
     Handles Vector Search + Hybrid Search
+
+    Vector queries can be pre-filtered on the indexed metadata of idx:knowledge
+    (subject_id / importance NUMERIC, parent_id TAG) so KNN only ranks the
+    chunks inside the requested scope.
     """
     def __init__(self, redis_url: str = settings.REDIS_URL, password: str = settings.REDIS_PASSWORD):
         self.redis = Redis.from_url(redis_url, password=password, decode_responses=True)
         self.index_name = "idx:knowledge"
+        self.ef_runtime = settings.REDIS_SEARCH_EF_RUNTIME
 
     async def search(self, query: Query, query_params: Optional[Dict[str, Any]] = None):
         """Execute a search query"""
@@ -22,40 +34,114 @@ class RedisSearchClient:
             logger.error(f"Redis search failed: {e}")
             return None
 
+    @staticmethod
+    def build_filter(
+        subject_id: Optional[int] = None,
+        parent_ids: Optional[Iterable[str]] = None,
+        min_importance: Optional[int] = None,
+        max_importance: Optional[int] = None,
+    ) -> str:
+        """
+        Build a RediSearch filter expression over the chunk metadata.
+        Returns an empty string when no filter is requested.
+        """
+        clauses = []
+        if subject_id is not None:
+            clauses.append(f"@subject_id:[{int(subject_id)} {int(subject_id)}]")
+        if parent_ids:
+            tags = "|".join(_TAG_ESCAPE.sub(r"\\\1", str(pid)) for pid in parent_ids)
+            clauses.append(f"@parent_id:{{{tags}}}")
+        if min_importance is not None or max_importance is not None:
+            low = int(min_importance) if min_importance is not None else "-inf"
+            high = int(max_importance) if max_importance is not None else "+inf"
+            clauses.append(f"@importance:[{low} {high}]")
+        return " ".join(clauses)
+
+    @staticmethod
+    def _combine(text_query: str, filter_expr: str) -> str:
+        text = text_query.strip()
+        if text in ("", "*"):
+            return filter_expr or "*"
+        return f"({text}) {filter_expr}" if filter_expr else text
+
+    @staticmethod
+    def _vector_blob(vector: List[float]) -> bytes:
+        # Convert list of floats to binary string (Little Endian Float32)
+        return struct.pack(f'{len(vector)}f', *vector)
+
     async def hybrid_search(
         self,
         text_query: str,
         vector: List[float],
         top_k: int = 10,
-        vector_field: str = "vector"
+        vector_field: str = "vector",
+        subject_id: Optional[int] = None,
+        parent_ids: Optional[Iterable[str]] = None,
+        min_importance: Optional[int] = None,
+        max_importance: Optional[int] = None,
+        ef_runtime: Optional[int] = None,
     ):
         """
-        Perform Hybrid Search (Text Filter + Vector Similarity)
-        Syntax: (<text_query>) => [KNN <k> @vector $vec_param AS vector_score]
+        Perform Hybrid Search (Text/Metadata Filter + Vector Similarity)
+        Syntax: (<filter>) => [KNN <k> @vector $vec EF_RUNTIME $ef AS vector_score]
+
+        The filter is applied before KNN, so the k nearest neighbours are taken
+        from the matching chunks only instead of the whole index.
         """
-        # 1. Prepare Vector Blob
-        # Convert list of floats to binary string (Little Endian Float32)
-        vector_blob = struct.pack(f'{len(vector)}f', *vector)
-        
-        # 2. Construct Query
-        # If text_query is empty, use wildcard
-        actual_text = text_query if text_query.strip() else "*"
-        
-        # RediSearch Query Syntax for Hybrid
-        # We want to pre-filter by text, then run KNN on the result.
-        # Format: "text_query=>[KNN k @vector $vec AS score]"
-        q_str = f"({actual_text})=>[KNN {top_k} @{vector_field} $vec AS vector_score]"
-        
+        filter_expr = self.build_filter(subject_id, parent_ids, min_importance, max_importance)
+        prefilter = self._combine(text_query, filter_expr)
+
+        q_str = (
+            f"({prefilter})=>[KNN {top_k} @{vector_field} $vec "
+            f"EF_RUNTIME $ef AS vector_score]"
+        )
+
         q = (
             Query(q_str)
             .sort_by("vector_score")
             .paging(0, top_k)
-            .return_fields("id", "parent_id", "content", "vector_score", "parent_name", "importance")
+            .return_fields(*DEFAULT_RETURN_FIELDS)
+            .dialect(2)
+        )
+
+        params = {
+            "vec": self._vector_blob(vector),
+            "ef": ef_runtime or self.ef_runtime,
+        }
+
+        return await self.search(q, params)
+
+    async def range_search(
+        self,
+        vector: List[float],
+        radius: float,
+        limit: int = 10,
+        vector_field: str = "vector",
+        subject_id: Optional[int] = None,
+        parent_ids: Optional[Iterable[str]] = None,
+        min_importance: Optional[int] = None,
+        max_importance: Optional[int] = None,
+    ):
+        """
+        Return every chunk within `radius` (cosine distance) of the vector,
+        optionally restricted by the same metadata filters as hybrid_search.
+        Syntax: @vector:[VECTOR_RANGE $radius $vec]=>{$YIELD_DISTANCE_AS: vector_score} <filter>
+        """
+        filter_expr = self.build_filter(subject_id, parent_ids, min_importance, max_importance)
+        q_str = f"@{vector_field}:[VECTOR_RANGE $radius $vec]=>{{$YIELD_DISTANCE_AS: vector_score}}"
+        if filter_expr:
+            q_str = f"{q_str} {filter_expr}"
+
+        q = (
+            Query(q_str)
+            .sort_by("vector_score")
+            .paging(0, limit)
+            .return_fields(*DEFAULT_RETURN_FIELDS)
             .dialect(2)
         )
-        
-        params = {"vec": vector_blob}
-        
+
+        params = {"vec": self._vector_blob(vector), "radius": radius}
+
         return await self.search(q, params)
 
     async def close(self):
@@ -1,15 +1,56 @@
 """
 Token Revocation Service
 Manages JWT token revocation and blacklisting
+
+Local fast path:
+- Every process keeps an in-memory Bloom filter of revoked JTIs, built from a SCAN of
+  the blacklist keys at startup and kept in sync over the Redis pub/sub channel
+  `token:revoked`.
+- A JTI the filter has never seen is answered locally, with no network call. A filter
+  hit (revoked, or a false positive) is confirmed against Redis.
+- While the filter is not in sync (not started, or pub/sub connection lost until the
+  next rebuild), every check goes to Redis. Redis errors still fail closed.
+- The filter is rebuilt periodically so expired blacklist entries drop out.
 """
 import asyncio
+import hashlib
+import math
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterable, Optional
 
 from app.config import settings
 from app.core.cache import cache_service
+from app.core.metrics import CACHE_HIT_COUNT
 from loguru import logger
 
+REVOCATION_CHANNEL = "token:revoked"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter (double hashing over a blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
 
 class TokenRevocationService:
     """Service to handle token revocation and blacklisting"""
@@ -18,7 +59,91 @@ class TokenRevocationService:
         # Use Redis for token blacklist (persistent across restarts)
         self.blacklist_prefix = "token:blacklist:"
         self.default_ttl = 3600  # 1 hour default TTL for blacklisted tokens
-    
+
+        self.bloom_capacity = settings.TOKEN_REVOCATION_BLOOM_CAPACITY
+        self.bloom_error_rate = settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE
+        self.rebuild_interval = settings.TOKEN_REVOCATION_REBUILD_INTERVAL
+        self._filter = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        self._synced = False  # Only a synced filter may answer "not revoked" locally
+        self._last_rebuild = 0.0
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    # ==========================================
+    # Local filter sync
+    # ==========================================
+
+    async def start(self):
+        """Subscribe to revocation events, then build the local filter from Redis"""
+        if not cache_service.redis:
+            logger.warning("Redis not initialized, token revocation checks will not use the local filter")
+            return
+        try:
+            # Subscribe before the SCAN so no revocation falls between the two
+            self._pubsub = cache_service.redis.pubsub()
+            await self._pubsub.subscribe(REVOCATION_CHANNEL)
+            await self._rebuild()
+            self._listener_task = asyncio.create_task(self._listen())
+        except Exception as e:
+            self._synced = False
+            logger.error(f"Failed to start token revocation sync: {e}")
+
+    async def stop(self):
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        self._synced = False
+
+    async def _rebuild(self):
+        """Rebuild the filter from the blacklist keys currently in Redis"""
+        bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        prefix_len = len(self.blacklist_prefix)
+        async for key in cache_service.redis.scan_iter(match=f"{self.blacklist_prefix}*", count=1000):
+            bloom.add(key.decode()[prefix_len:])
+
+        if bloom.count > self.bloom_capacity:
+            logger.warning(
+                f"{bloom.count} revoked tokens exceed bloom capacity {self.bloom_capacity}, "
+                f"more checks will fall back to Redis"
+            )
+        self._filter = bloom
+        self._last_rebuild = time.monotonic()
+        self._synced = True
+        logger.info(f"Token revocation filter rebuilt with {bloom.count} entries")
+
+    async def _listen(self):
+        """Apply revocations published by other processes; resync after connection errors"""
+        needs_rebuild = False
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    self._filter.add(message["data"].decode())
+
+                # Messages may have been missed while disconnected, or entries may have expired
+                if needs_rebuild or time.monotonic() - self._last_rebuild > self.rebuild_interval:
+                    await self._rebuild()
+                    needs_rebuild = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._synced:
+                    logger.error(f"Token revocation sync lost, checking Redis directly until resynced: {e}")
+                self._synced = False
+                needs_rebuild = True
+                await asyncio.sleep(1)
+
+    # ==========================================
+    # Blacklist
+    # ==========================================
+
     async def blacklist_token(self, token_jti: str, expires_in: Optional[int] = None) -> bool:
         """
         Add a token to the blacklist
@@ -33,12 +158,20 @@ class TokenRevocationService:
         try:
             key = f"{self.blacklist_prefix}{token_jti}"
             ttl = expires_in or self.default_ttl
-            await cache_service.set(key, "revoked", ex=ttl)
-            logger.info(f"Token blacklisted: {token_jti}")
-            return True
+            await cache_service.set(key, "revoked", ttl=ttl)
+            self._filter.add(token_jti)
         except Exception as e:
             logger.error(f"Failed to blacklist token {token_jti}: {e}")
             return False
+
+        try:
+            if cache_service.redis:
+                await cache_service.redis.publish(REVOCATION_CHANNEL, token_jti)
+        except Exception as e:
+            # The key is stored; other processes pick it up at their next filter rebuild
+            logger.error(f"Failed to publish revocation of {token_jti}: {e}")
+        logger.info(f"Token blacklisted: {token_jti}")
+        return True
     
     async def is_token_blacklisted(self, token_jti: str) -> bool:
         """
@@ -50,6 +183,12 @@ class TokenRevocationService:
         Returns:
             bool: True if token is blacklisted or if cache service is down (Fail-closed)
         """
+        # Bloom filters have no false negatives: never seen means never revoked
+        if self._synced and token_jti not in self._filter:
+            CACHE_HIT_COUNT.labels(cache_name="token_revocation_local", result="hit").inc()
+            return False
+        CACHE_HIT_COUNT.labels(cache_name="token_revocation_local", result="miss").inc()
+
         try:
             key = f"{self.blacklist_prefix}{token_jti}"
             result = await cache_service.get(key)
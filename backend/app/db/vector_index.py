@@ -0,0 +1,58 @@
+"""
+pgvector ANN 索引管理
+
+- hnsw_index_sql: 生成 HNSW 索引 DDL（迁移与基准脚本共用同一组参数含义）
+- apply_ef_search: 为当前事务设置 hnsw.ef_search，在召回率与延迟之间按查询调节
+"""
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+
+# 距离函数 -> operator class
+OPCLASSES = {
+    "cosine": "vector_cosine_ops",
+    "l2": "vector_l2_ops",
+    "ip": "vector_ip_ops",
+}
+
+
+def hnsw_index_sql(
+    index_name: str,
+    table: str,
+    column: str = "embedding",
+    m: int = 16,
+    ef_construction: int = 64,
+    distance: str = "cosine",
+    concurrently: bool = True,
+) -> str:
+    """
+    生成 HNSW 索引 DDL
+
+    Args:
+        m: 每层最大连接数，越大召回越高、索引越大
+        ef_construction: 构建时候选列表大小，越大构建越慢、索引质量越高
+        distance: cosine / l2 / ip，需与查询使用的距离函数一致
+    """
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name} "
+        f"ON {table} USING hnsw ({column} {OPCLASSES[distance]}) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    )
+
+
+async def apply_ef_search(db: AsyncSession, ef_search: Optional[int] = None):
+    """
+    为当前事务设置 hnsw.ef_search（SET LOCAL，事务结束后自动恢复）
+
+    ef_search 需不小于查询的 LIMIT，否则 HNSW 返回的结果可能少于 LIMIT。
+    即使等于 pgvector 默认值也照常 SET，以覆盖同一事务中先前设置的更大值。
+    非 PostgreSQL（如 SQLite 开发模式）时忽略。
+    """
+    ef_search = ef_search or settings.PGVECTOR_EF_SEARCH
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    await db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
@@ -15,12 +15,15 @@ from app.services.job_service import JobService
 from app.services.subject_service import SubjectService
 from app.services.scheduler_service import scheduler_service
 from app.core.cache import cache_service
+from app.core.token_revocation import token_revocation_service
+from app.services.embedding_service import embedding_service
 from app.core.access_control import verify_token
 from app.core.idempotency import get_idempotency_store
 from app.api.middleware import IdempotencyMiddleware
 from loguru import logger
 from app.api.v1.router import api_router
 from app.workers.expansion_worker import start_expansion_worker, stop_expansion_worker
+from app.workers.chunk_index_worker import start_chunk_index_worker, stop_chunk_index_worker
 from app.workers.graph_sync_worker import start_sync_worker, stop_sync_worker
 from app.api.v1.health import set_start_time
 from app.core.websocket import manager
@@ -56,6 +59,8 @@ async def lifespan(app: FastAPI):
     
     # Initialize Cache (Redis)
     await cache_service.init_redis()
+    # Token 吊销检查的本地过滤器 (依赖 cache_service.redis)
+    await token_revocation_service.start()
     # Initialize WebSocket Redis
     await manager.init_redis()
     
@@ -80,6 +85,9 @@ async def lifespan(app: FastAPI):
 
             # 🆕 5. 启动图同步 Worker (AGE)
             await start_sync_worker()
+
+            # 🆕 6. 启动知识块增量索引 Worker (RediSearch)
+            await start_chunk_index_worker()
         except Exception as e:
             logger.error(f"Startup tasks failed: {e}")
             # 可以在这里决定是否终止启动
@@ -96,7 +104,16 @@ async def lifespan(app: FastAPI):
 
     # 停止知识拓展后台任务
     await stop_expansion_worker()
+
+    # 停止知识块索引 Worker
+    await stop_chunk_index_worker()
     
+    # Close Embedding connection pool
+    await embedding_service.close()
+
+    # Stop token revocation sync
+    await token_revocation_service.stop()
+
     # Close Cache
     await cache_service.close()
     # Close WebSocket Redis
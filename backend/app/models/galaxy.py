@@ -106,6 +106,7 @@ class UserNodeStatus(Base):
     last_study_at = Column(DateTime, nullable=True) # Doc uses last_study_at
     last_interacted_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keep for compatibility or remove?
     decay_paused = Column(Boolean, default=False)
+    last_decayed_at = Column(DateTime, nullable=True)  # 每日衰减任务最近一次处理时间 (幂等标记)
     next_review_at = Column(DateTime, nullable=True, index=True)
     
     # 元数据
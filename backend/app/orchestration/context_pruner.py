@@ -7,17 +7,33 @@ ContextPruner - 上下文修剪器
 1. Sliding Window: 只保留最近 N 轮对话
 2. Summarization: 超过阈值时触发异步总结
 3. Token Counting: 精确计算 token 数量（可选）
+
+Token 预算模式 (token_budget > 0):
+- 摘要检查点 summary:upto 记录摘要已覆盖的消息数，只读取检查点之后的尾部消息
+- 从最新消息向前装填，直到达到模型的 Token 预算（摘要本身也计入预算）
+- 未装入窗口且未被摘要覆盖的消息累计到一定数量时，触发增量总结推进检查点
 """
 
 import json
 import time
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from loguru import logger
 
 import redis.asyncio as redis
 
+from app.config import settings
+from app.orchestration.summarization_worker import (
+    SUMMARY_KEY,
+    SUMMARY_UPTO_KEY,
+    enqueue_summarization,
+)
+from app.orchestration.token_counter import get_token_counter
+
+# 窗口外未被摘要覆盖的消息达到该数量时推进摘要检查点
+MIN_MESSAGES_PER_SUMMARY = 4
+
 
 class ContextPruner:
     """
@@ -35,7 +51,11 @@ class ContextPruner:
         redis_client: redis.Redis,
         max_history_messages: int = 10,
         summary_threshold: int = 20,
-        summary_cache_ttl: int = 3600
+        summary_cache_ttl: int = 3600,
+        token_budget: Optional[int] = None,
+        model_token_budgets: Optional[Dict[str, int]] = None,
+        token_encoding: Optional[str] = None,
+        max_tail_messages: int = 200
     ):
         """
         初始化 ContextPruner
@@ -45,11 +65,21 @@ class ContextPruner:
             max_history_messages: 滑动窗口保留的最大消息数
             summary_threshold: 触发总结的历史消息阈值
             summary_cache_ttl: 总结缓存的 TTL（秒）
+            token_budget: 默认 Token 预算，0 表示按消息条数裁剪（默认取配置）
+            model_token_budgets: 按模型覆盖的 Token 预算（默认取配置）
+            token_encoding: tiktoken 编码名（默认取配置）
+            max_tail_messages: 预算模式下单次最多读取的尾部消息数
         """
         self.redis = redis_client
         self.max_history_messages = max_history_messages
         self.summary_threshold = summary_threshold
         self.summary_cache_ttl = summary_cache_ttl
+        self.token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.model_token_budgets = (
+            settings.CONTEXT_MODEL_TOKEN_BUDGETS if model_token_budgets is None else model_token_budgets
+        )
+        self.token_counter = get_token_counter(token_encoding or settings.CONTEXT_TOKEN_ENCODING)
+        self.max_tail_messages = max_tail_messages
 
         logger.info(
             f"ContextPruner initialized: max_history={max_history_messages}, "
@@ -60,12 +90,13 @@ class ContextPruner:
         self,
         session_id: str,
         user_id: str,
-        force_summary: bool = False
+        force_summary: bool = False,
+        model: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取修剪后的聊天历史
 
-        策略:
+        配置了 Token 预算时使用预算模式（见 _get_budgeted_history），否则按条数:
         1. 历史 <= max_history: 直接返回全部
         2. max_history < 历史 <= summary_threshold: 滑动窗口
         3. 历史 > summary_threshold: 触发总结 + 滑动窗口
@@ -74,6 +105,7 @@ class ContextPruner:
             session_id: 会话 ID
             user_id: 用户 ID
             force_summary: 强制触发总结（即使未达到阈值）
+            model: 模型名称，用于选择 Token 预算（默认当前 LLM 模型）
 
         Returns:
             {
@@ -84,6 +116,10 @@ class ContextPruner:
                 "summary_used": True/False  # 是否使用了总结
             }
         """
+        budget = self._resolve_budget(model)
+        if budget > 0:
+            return await self._get_budgeted_history(session_id, user_id, budget, force_summary)
+
         start_time = time.time()
 
         # 1. 从 Redis 加载历史
@@ -154,6 +190,88 @@ class ContextPruner:
                 "summary_used": False
             }
 
+    def _resolve_budget(self, model: Optional[str]) -> int:
+        return self.model_token_budgets.get(model or settings.LLM_MODEL_NAME, self.token_budget)
+
+    async def _get_budgeted_history(
+        self,
+        session_id: str,
+        user_id: str,
+        budget: int,
+        force_summary: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Token 预算模式：摘要 + 检查点之后按预算装填的最近消息
+        """
+        start_time = time.time()
+        history_key = f"chat:history:{session_id}"
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(history_key)
+            pipe.mget(SUMMARY_KEY.format(session_id), SUMMARY_UPTO_KEY.format(session_id))
+            total, (cached_summary, covered) = await pipe.execute()
+
+        if not total:
+            return {
+                "messages": [],
+                "summary": None,
+                "original_count": 0,
+                "pruned_count": 0,
+                "summary_used": False,
+                "token_count": 0
+            }
+
+        summary = cached_summary.decode("utf-8") if cached_summary else None
+        checkpoint = min(int(covered), total) if summary and covered else 0
+
+        # 只读取检查点之后的消息
+        start = max(checkpoint, total - self.max_tail_messages)
+        raw = await self.redis.lrange(history_key, start, -1)
+        tail = self._parse_history(raw, offset=start)
+
+        # 从最新消息向前装填（至少保留最后一条）
+        summary_tokens = self.token_counter.count(summary) if summary else 0
+        available = budget - summary_tokens
+        window: List[Tuple[int, Dict]] = []
+        used = 0
+        for index, message in reversed(tail):
+            tokens = self.token_counter.count_message(message)
+            if window and used + tokens > available:
+                break
+            window.append((index, message))
+            used += tokens
+        window.reverse()
+
+        # 窗口之前、检查点之后的消息既不在窗口也不在摘要里，累计足够后推进检查点
+        first_kept = window[0][0] if window else total
+        if first_kept > checkpoint and (
+            force_summary or first_kept - checkpoint >= MIN_MESSAGES_PER_SUMMARY
+        ):
+            queued = await enqueue_summarization(
+                self.redis, session_id, user_id, upto=first_kept, priority="high"
+            )
+            if queued:
+                logger.info(
+                    f"Triggered summarization for session {session_id}: "
+                    f"checkpoint {checkpoint} -> {first_kept}"
+                )
+
+        messages = [message for _, message in window]
+        logger.debug(
+            f"Session {session_id}: {total} messages, read {len(raw)} after checkpoint {checkpoint}, "
+            f"packed {len(messages)} ({used + summary_tokens}/{budget} tokens), "
+            f"took {time.time() - start_time:.3f}s"
+        )
+
+        return {
+            "messages": messages,
+            "summary": summary,
+            "original_count": total,
+            "pruned_count": len(messages),
+            "summary_used": summary is not None,
+            "token_count": used + summary_tokens
+        }
+
     async def _get_summarized_history(
         self,
         session_id: str,
@@ -168,12 +286,17 @@ class ContextPruner:
         3. 如果缓存不存在，触发异步总结任务
         4. 返回最近消息作为 fallback
         """
-        # 检查缓存
-        cache_key = f"summary:{session_id}"
-        cached_summary = await self.redis.get(cache_key)
+        # 检查缓存（摘要及其已覆盖的消息数）
+        cached_summary, covered = await self.redis.mget(
+            SUMMARY_KEY.format(session_id), SUMMARY_UPTO_KEY.format(session_id)
+        )
 
         if cached_summary:
             logger.debug(f"Summary cache hit for session {session_id}")
+            # 摘要落后超过一个窗口时，触发增量更新（worker 只总结新增部分）
+            covered = int(covered) if covered else 0
+            if len(history) - 5 - covered > self.max_history_messages:
+                await self._trigger_summary(session_id, history, user_id)
             return {
                 "messages": history[-5:],  # 保留最近5条
                 "summary": cached_summary.decode("utf-8")
@@ -197,29 +320,22 @@ class ContextPruner:
         """
         异步触发总结任务
 
-        将总结任务推送到 Redis 队列，由后台 worker 处理
+        将总结任务推送到 Redis 队列，由后台 worker 处理；
+        任务只携带消息数，worker 自行从 chat:history 读取
         """
-        # 准备任务数据
         # 只总结除最近5条外的历史，保留最新上下文
-        history_to_summarize = history[:-5] if len(history) > 5 else history
-
-        task = {
-            "session_id": session_id,
-            "history": history_to_summarize,
-            "user_id": user_id,
-            "timestamp": time.time(),
-            "priority": "high"
-        }
-
-        # 推送到队列
-        queue_key = "queue:summarization"
-        await self.redis.rpush(queue_key, json.dumps(task))
+        upto = len(history) - 5 if len(history) > 5 else len(history)
 
-        logger.info(
-            f"Triggered summarization task for session {session_id}, "
-            f"history size: {len(history_to_summarize)}"
+        queued = await enqueue_summarization(
+            self.redis, session_id, user_id, upto=upto, priority="high"
         )
 
+        if queued:
+            logger.info(
+                f"Triggered summarization task for session {session_id}, "
+                f"history size: {upto}"
+            )
+
     async def _load_chat_history(self, session_id: str) -> List[Dict]:
         """
         从 Redis 加载聊天历史
@@ -236,25 +352,27 @@ class ContextPruner:
         try:
             # 获取所有消息
             messages = await self.redis.lrange(cache_key, 0, -1)
-
-            # 解析 JSON
-            history = []
-            for msg in messages:
-                try:
-                    parsed = json.loads(msg)
-                    # 确保有必要的字段
-                    if "role" in parsed and "content" in parsed:
-                        history.append(parsed)
-                except json.JSONDecodeError:
-                    logger.warning(f"Failed to parse message: {msg}")
-                    continue
-
-            return history
+            return [message for _, message in self._parse_history(messages)]
 
         except Exception as e:
             logger.error(f"Failed to load chat history for session {session_id}: {e}")
             return []
 
+    @staticmethod
+    def _parse_history(messages: List[bytes], offset: int = 0) -> List[Tuple[int, Dict]]:
+        """解析 JSON 消息，返回 (在 chat:history 中的下标, 消息)"""
+        history = []
+        for index, msg in enumerate(messages, start=offset):
+            try:
+                parsed = json.loads(msg)
+                # 确保有必要的字段
+                if "role" in parsed and "content" in parsed:
+                    history.append((index, parsed))
+            except json.JSONDecodeError:
+                logger.warning(f"Failed to parse message: {msg}")
+                continue
+        return history
+
     async def get_summary_status(self, session_id: str) -> Dict[str, Any]:
         """
         获取总结状态（用于监控和调试）
@@ -282,7 +400,7 @@ class ContextPruner:
         清除会话的总结缓存（用于测试或重置）
         """
         cache_key = f"summary:{session_id}"
-        result = await self.redis.delete(cache_key)
+        result = await self.redis.delete(cache_key, SUMMARY_UPTO_KEY.format(session_id))
         logger.info(f"Cleared summary cache for session {session_id}")
         return result > 0
 
@@ -1,14 +1,46 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
 from pydantic import ValidationError
 from app.tools.registry import tool_registry
-from app.tools.base import ToolResult
+from app.tools.base import BaseTool, ToolResult
+from app.core.metrics import TOOL_EXECUTION_COUNT, TOOL_EXECUTION_LATENCY
+from app.db.session import AsyncSessionLocal
+
+# 单个工具默认的并发上限（进程级，跨请求共享）
+DEFAULT_TOOL_CONCURRENCY = 8
+
+# 进程级的每工具信号量
+_tool_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _tool_semaphore(tool: BaseTool) -> asyncio.Semaphore:
+    if tool.name not in _tool_semaphores:
+        _tool_semaphores[tool.name] = asyncio.Semaphore(tool.max_concurrency or DEFAULT_TOOL_CONCURRENCY)
+    return _tool_semaphores[tool.name]
+
 
 class ToolExecutor:
     """
     工具执行器
     负责解析 LLM 的工具调用请求并执行
+
+    同一轮的多个工具调用按依赖关系并发执行:
+    - 不访问数据库的工具 (uses_db=False) 直接并发
+    - 只读工具若排在所有写操作之前，各自使用独立会话并发执行
+    - 写操作以及排在写操作之后的调用，按原顺序在调用方的会话上串行执行
+      （AsyncSession 不支持并发使用，且后续读取需要看到本轮未提交的写入）
     """
-    
+
+    def __init__(self, max_parallel: int = 8):
+        """
+        Args:
+            max_parallel: 单轮最多同时执行的工具调用数
+        """
+        self.max_parallel = max_parallel
+
     async def execute_tool_call(
         self,
         tool_name: str,
@@ -19,45 +51,68 @@ class ToolExecutor:
     ) -> ToolResult:
         """
         执行单个工具调用
-        
+
         Args:
             tool_name: 工具名称
             arguments: LLM 提供的参数（JSON）
             user_id: 用户 ID
             db_session: 数据库会话
-            
+
         Returns:
             ToolResult: 执行结果
         """
         tool = tool_registry.get_tool(tool_name)
-        
+
         if not tool:
+            TOOL_EXECUTION_COUNT.labels(tool_name=tool_name, status="unknown_tool").inc()
             return ToolResult(
                 success=False,
                 tool_name=tool_name,
                 error_message=f"未知工具: {tool_name}",
                 suggestion="请检查工具名称是否正确"
             )
-        
+
         # 验证参数
         try:
             validated_params = tool.parameters_schema(**arguments)
         except ValidationError as e:
+            TOOL_EXECUTION_COUNT.labels(tool_name=tool_name, status="invalid_params").inc()
             return ToolResult(
                 success=False,
                 tool_name=tool_name,
                 error_message=f"参数验证失败: {str(e)}",
                 suggestion="请检查参数格式是否正确"
             )
-        
+
         # 执行工具
-        # 如果工具有 is_long_running 属性，可以传递进度回调
-        if getattr(tool, "is_long_running", False) and progress_callback:
-            result = await tool.execute(validated_params, user_id, db_session, progress_callback=progress_callback)
-        else:
-            result = await tool.execute(validated_params, user_id, db_session)
-        return result
-    
+        async with _tool_semaphore(tool):
+            start_time = time.perf_counter()
+            status = "error"
+            try:
+                # 如果工具有 is_long_running 属性，可以传递进度回调
+                if getattr(tool, "is_long_running", False) and progress_callback:
+                    execution = tool.execute(validated_params, user_id, db_session, progress_callback=progress_callback)
+                else:
+                    execution = tool.execute(validated_params, user_id, db_session)
+                timeout = tool.effective_timeout
+                result = await asyncio.wait_for(execution, timeout=timeout)
+                status = "success" if result.success else "failure"
+                return result
+            except asyncio.TimeoutError:
+                status = "timeout"
+                logger.warning(f"Tool {tool_name} timed out after {timeout}s")
+                return ToolResult(
+                    success=False,
+                    tool_name=tool_name,
+                    error_message=f"工具执行超时（{timeout} 秒）",
+                    suggestion="请缩小查询范围后重试"
+                )
+            finally:
+                TOOL_EXECUTION_COUNT.labels(tool_name=tool_name, status=status).inc()
+                TOOL_EXECUTION_LATENCY.labels(tool_name=tool_name, status=status).observe(
+                    time.perf_counter() - start_time
+                )
+
     async def execute_tool_calls(
         self,
         tool_calls: List[Dict[str, Any]],
@@ -65,23 +120,89 @@ class ToolExecutor:
         db_session: Any
     ) -> List[ToolResult]:
         """
-        批量执行工具调用（按顺序）
-        
+        批量执行工具调用（独立的调用并发执行，结果顺序与输入一致）
+
         Args:
             tool_calls: 工具调用列表，格式为 OpenAI function_call
-            
+
         Returns:
             List[ToolResult]: 执行结果列表
         """
-        results = []
-        for call in tool_calls:
-            result = await self.execute_tool_call(
-                tool_name=call["function"]["name"],
-                arguments=call["function"]["arguments"] if isinstance(call["function"]["arguments"], dict) else json.loads(call["function"]["arguments"]),
-                user_id=user_id,
-                db_session=db_session
-            )
-            results.append(result)
+        calls = [self._parse_call(call) for call in tool_calls]
+        if len(calls) <= 1:
+            return [
+                await self.execute_tool_call(name, arguments, user_id, db_session)
+                for name, arguments in calls
+            ]
+
+        results: List[Optional[ToolResult]] = [None] * len(calls)
+        serial: List[int] = []  # 在调用方会话上按顺序执行
+        parallel: List[Tuple[int, bool]] = []  # (下标, 是否需要独立会话)
+        seen_mutation = False
+
+        for i, (name, _) in enumerate(calls):
+            tool = tool_registry.get_tool(name)
+            if tool is None or not tool.uses_db:
+                parallel.append((i, False))
+            elif tool.read_only and not seen_mutation and db_session is not None:
+                parallel.append((i, True))
+            else:
+                serial.append(i)
+                seen_mutation = seen_mutation or not tool.read_only
+
+        limiter = asyncio.Semaphore(self.max_parallel)
+
+        # 每个调用的异常都在本调用内转换为失败结果，不会让 gather 提前返回：
+        # 否则调用方在处理异常 / 回滚时，串行链仍在后台使用它的会话
+        async def run_serial():
+            for i in serial:
+                async with limiter:
+                    results[i] = await self._execute_isolated(*calls[i], user_id, db_session)
+
+        async def run_parallel(i: int, own_session: bool):
+            async with limiter:
+                if not own_session:
+                    results[i] = await self._execute_isolated(*calls[i], user_id, db_session)
+                    return
+                try:
+                    async with AsyncSessionLocal() as session:
+                        results[i] = await self._execute_isolated(*calls[i], user_id, session)
+                except Exception as e:
+                    # 打开 / 关闭独立会话失败（工具内部的异常已由 _execute_isolated 处理）
+                    if results[i] is None:
+                        name = calls[i][0]
+                        TOOL_EXECUTION_COUNT.labels(tool_name=name, status="error").inc()
+                        results[i] = self._error_result(name, e)
+
+        await asyncio.gather(run_serial(), *(run_parallel(i, own) for i, own in parallel))
         return results
 
-import json
\ No newline at end of file
+    async def _execute_isolated(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        user_id: str,
+        db_session: Any
+    ) -> ToolResult:
+        """执行单个调用，异常转换为失败结果（error 指标已在 execute_tool_call 中记录）"""
+        try:
+            return await self.execute_tool_call(tool_name, arguments, user_id, db_session)
+        except Exception as e:
+            return self._error_result(tool_name, e)
+
+    @staticmethod
+    def _error_result(tool_name: str, error: Exception) -> ToolResult:
+        logger.error(f"Tool {tool_name} failed: {error}")
+        return ToolResult(
+            success=False,
+            tool_name=tool_name,
+            error_message=f"工具执行失败: {error}",
+            suggestion="请稍后重试"
+        )
+
+    @staticmethod
+    def _parse_call(call: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        arguments = call["function"]["arguments"]
+        if not isinstance(arguments, dict):
+            arguments = json.loads(arguments)
+        return call["function"]["name"], arguments
@@ -6,7 +6,7 @@ ChatOrchestrator - 生产级实现
 2. ✅ 并发安全: 消息 ID 追踪，防止重复处理
 3. ✅ 错误处理: Redis/LLM 故障时的优雅降级
 4. ✅ 熔断机制: 防止队列积压导致 OOM
-5. ✅ 监控指标: Prometheus 埋点
+5. ✅ 监控指标: Prometheus 埋点（有界标签 + 分阶段延迟 + 首 token 延迟，会话明细走 exemplar）
 6. ✅ 结构化日志: 增强可观察性
 7. ✅ 配置管理: 环境变量支持
 8. ✅ 健康检查: 内置健康状态
@@ -14,8 +14,9 @@ ChatOrchestrator - 生产级实现
 
 import json
 import asyncio
+import hashlib
 import time
-from typing import AsyncGenerator, List, Dict, Optional, Any, Set
+from typing import AsyncGenerator, Callable, List, Dict, Optional, Any, Set, Tuple
 from datetime import datetime
 import uuid
 
@@ -30,6 +31,8 @@ except ImportError:
     PROMETHEUS_AVAILABLE = False
     logger.warning("Prometheus not available, metrics disabled")
 
+from opentelemetry import trace
+
 from app.services.llm_service import llm_service
 from app.services.knowledge_service import KnowledgeService
 from app.services.graph_knowledge_service import GraphKnowledgeService
@@ -43,6 +46,7 @@ from app.orchestration.composer import ResponseComposer
 from app.orchestration.context_pruner import ContextPruner
 from app.orchestration.token_tracker import TokenTracker
 from app.gen.agent.v1 import agent_service_pb2
+from app.db.session import AsyncSessionLocal
 from app.config import settings
 
 # FSM States
@@ -54,17 +58,68 @@ STATE_DONE = "DONE"
 STATE_FAILED = "FAILED"
 
 # Prometheus Metrics (if available)
+# 所有标签均为有界集合（status / model / stage / tool_name / source），
+# 会话级明细通过 exemplar（trace_id、session_id）关联到链路追踪，而不是作为标签
+STAGE_VALIDATION = "validation"
+STAGE_CONTEXT_BUILD = "context_build"
+STAGE_GRAPHRAG = "graphrag"
+STAGE_FIRST_TOKEN = "first_token"
+STAGE_LLM_GENERATION = "llm_generation"
+STAGE_TOOL_CALL = "tool_call"
+STAGE_TOTAL = "total"
+
+# 上下文来源及默认截止时间（秒），超时的来源以降级结果参与 Prompt 构建
+CONTEXT_SOURCE_USER = "user_context"
+CONTEXT_SOURCE_CONVERSATION = "conversation"
+CONTEXT_SOURCE_KNOWLEDGE = "knowledge"
+
+DEFAULT_CONTEXT_DEADLINES = {
+    CONTEXT_SOURCE_USER: 1.0,
+    CONTEXT_SOURCE_CONVERSATION: 1.0,
+    CONTEXT_SOURCE_KNOWLEDGE: 3.0,
+}
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
 if PROMETHEUS_AVAILABLE:
     REQUEST_COUNTER = Counter(
         'chat_orchestrator_requests_total',
         'Total chat requests processed',
-        ['status', 'session_id']
+        ['status', 'model']  # status: success, error, duplicate, circuit_open, rate_limited, cache_hit
+    )
+
+    STAGE_DURATION = Histogram(
+        'chat_orchestrator_stage_duration_seconds',
+        'Latency of each request processing stage',
+        ['stage'],
+        buckets=LATENCY_BUCKETS
+    )
+
+    TIME_TO_FIRST_TOKEN = Histogram(
+        'chat_orchestrator_time_to_first_token_seconds',
+        'Time from request arrival to the first streamed token',
+        ['model'],
+        buckets=LATENCY_BUCKETS
+    )
+
+    TOOL_CALL_DURATION = Histogram(
+        'chat_orchestrator_tool_call_duration_seconds',
+        'Time from the first tool call chunk to the complete tool call',
+        ['tool_name'],
+        buckets=LATENCY_BUCKETS
     )
 
-    REQUEST_DURATION = Histogram(
-        'chat_orchestrator_request_duration_seconds',
-        'Request processing duration',
-        ['operation']
+    CONTEXT_SOURCE_DURATION = Histogram(
+        'chat_orchestrator_context_source_duration_seconds',
+        'Latency of each context source in the concurrent fan-out',
+        ['source', 'status'],  # status: ok, timeout, error
+        buckets=LATENCY_BUCKETS
+    )
+
+    KNOWLEDGE_RETRIEVAL_COUNTER = Counter(
+        'chat_orchestrator_knowledge_retrieval_total',
+        'Knowledge retrieval outcomes by source',
+        ['source', 'status']  # source: graphrag, vector; status: success, failed
     )
 
     CIRCUIT_BREAKER_STATE = Gauge(
@@ -84,6 +139,44 @@ if PROMETHEUS_AVAILABLE:
     )
 
 
+# Prometheus 限制 exemplar 标签集（标签名 + 值）总长不超过 128 个字符，超出时 prometheus_client 抛 ValueError
+EXEMPLAR_MAX_CHARS = 128
+_EXEMPLAR_SESSION_ID_MAX = EXEMPLAR_MAX_CHARS - len("trace_id") - 32 - len("session_id")
+
+
+def _exemplar_session_id(session_id: str) -> str:
+    """超长会话 ID 替换为定长哈希，保证与 trace_id 一起不超过 exemplar 长度上限"""
+    session_id = session_id or ""
+    if len(session_id) <= _EXEMPLAR_SESSION_ID_MAX:
+        return session_id
+    return "sha1:" + hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+
+
+def _exemplar(session_id: str) -> Dict[str, str]:
+    """构建 exemplar：当前链路的 trace_id + 会话 ID"""
+    exemplar = {"session_id": _exemplar_session_id(session_id)}
+    span_context = trace.get_current_span().get_span_context()
+    if span_context.is_valid:
+        exemplar["trace_id"] = format(span_context.trace_id, "032x")
+    return exemplar
+
+
+def _record_with_exemplar(record: Callable[..., None], value: float, session_id: str):
+    """
+    带 exemplar 记录指标（Counter.inc / Histogram.observe）
+
+    指标记录绝不影响请求：exemplar 无效时退化为不带 exemplar 记录，其余异常只记日志
+    """
+    try:
+        try:
+            record(value, exemplar=_exemplar(session_id))
+        except ValueError as e:
+            logger.warning(f"Dropping invalid metric exemplar: {e}")
+            record(value)
+    except Exception as e:
+        logger.warning(f"Failed to record metric: {e}")
+
+
 class CircuitBreaker:
     """熔断器 - 防止系统过载"""
 
@@ -197,9 +290,14 @@ class ProductionChatOrchestrator:
         # 配置
         enable_metrics: bool = True,
         enable_circuit_breaker: bool = True,
+        # 上下文来源截止时间（秒），缺省使用 DEFAULT_CONTEXT_DEADLINES
+        context_deadlines: Optional[Dict[str, float]] = None,
+        # 知识检索使用的独立会话工厂，缺省为 AsyncSessionLocal
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
     ):
         self.db_session = db_session
         self.redis = redis_client
+        self.session_factory = session_factory or AsyncSessionLocal
 
         # 核心组件
         self.state_manager = SessionStateManager(redis_client) if redis_client else None
@@ -215,8 +313,10 @@ class ProductionChatOrchestrator:
 
         # 配置
         self.enable_metrics = enable_metrics and PROMETHEUS_AVAILABLE
+        self.model_name = settings.LLM_MODEL_NAME
         self.enable_circuit_breaker = enable_circuit_breaker
         self.max_concurrent_sessions = max_concurrent_sessions
+        self.context_deadlines = {**DEFAULT_CONTEXT_DEADLINES, **(context_deadlines or {})}
         self.active_sessions: Set[str] = set()
         self.session_lock = asyncio.Lock()
 
@@ -393,6 +493,141 @@ class ProductionChatOrchestrator:
             logger.error(f"Failed to prune conversation: {e}")
             return {"messages": [], "summary": None}
 
+    async def _retrieve_knowledge(self, query: str, user_id: str) -> str:
+        """
+        GraphRAG 检索（增强版，带降级）
+
+        使用 session_factory 创建的独立数据库会话，以便与用户上下文构建并发执行
+        """
+        async with self.session_factory() as rag_db:
+            try:
+                # 使用 GraphKnowledgeService 进行增强的 GraphRAG 检索
+                graph_ks = GraphKnowledgeService(rag_db)
+                rag_result = await graph_ks.graph_rag_search(
+                    query=query,
+                    user_id=uuid.UUID(user_id),
+                    depth=2,
+                    top_k=5
+                )
+
+                # 记录 GraphRAG 指标
+                if rag_result.get("metadata"):
+                    logger.info(
+                        f"GraphRAG results: "
+                        f"vector={rag_result['metadata'].get('vector_count', 0)}, "
+                        f"graph={rag_result['metadata'].get('graph_count', 0)}, "
+                        f"fused={rag_result['metadata'].get('fusion_count', 0)}"
+                    )
+
+                self._count_retrieval("graphrag", "success")
+                return rag_result.get("context", "")
+            except Exception as e:
+                logger.warning(f"GraphRAG retrieval failed: {e}, falling back to vector search")
+                self._count_retrieval("graphrag", "failed")
+
+            # 降级到普通向量检索
+            try:
+                ks = KnowledgeService(rag_db)
+                context = await ks.retrieve_context(user_id=uuid.UUID(user_id), query=query)
+                self._count_retrieval("vector", "success")
+                return context
+            except Exception as e2:
+                logger.error(f"Fallback knowledge retrieval also failed: {e2}")
+                self._count_retrieval("vector", "failed")
+                return ""
+
+    async def _run_context_source(
+        self,
+        source: str,
+        coro,
+        fallback: Any,
+        session_id: str
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """
+        在截止时间内执行单个上下文来源
+
+        Returns:
+            (结果或降级值, {"status": ok|timeout|error, "duration_ms": ...})
+        """
+        started = time.time()
+        try:
+            result = await asyncio.wait_for(coro, timeout=self.context_deadlines[source])
+            status = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Context source '{source}' exceeded {self.context_deadlines[source]}s deadline, "
+                f"using fallback"
+            )
+            result, status = fallback, "timeout"
+        except Exception as e:
+            logger.error(f"Context source '{source}' failed: {e}")
+            result, status = fallback, "error"
+
+        elapsed = time.time() - started
+        if self.enable_metrics:
+            _record_with_exemplar(
+                CONTEXT_SOURCE_DURATION.labels(source=source, status=status).observe, elapsed, session_id
+            )
+        return result, {"status": status, "duration_ms": round(elapsed * 1000, 2)}
+
+    async def _build_context(
+        self,
+        request: agent_service_pb2.ChatRequest,
+        session_id: str,
+        user_id: str,
+        db_session: Optional[AsyncSession]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], str, Dict[str, Dict[str, Any]]]:
+        """
+        并发构建用户上下文、对话上下文与知识上下文
+
+        三个来源互不依赖，各自带截止时间；慢来源只会降级 Prompt，
+        首 token 延迟受最慢来源（而不是三者之和）约束。
+
+        Returns:
+            (user_context_data, conversation_context, knowledge_context, report)
+            report 记录每个来源的状态、耗时与贡献（字符数/消息数）
+        """
+        query = request.message if request.HasField("message") else ""
+        knowledge_enabled = bool(db_session and user_id)
+
+        async def _no_knowledge() -> str:
+            return ""
+
+        (user_ctx, user_rec), (conv_ctx, conv_rec), (knowledge_ctx, knowledge_rec) = await asyncio.gather(
+            self._run_context_source(
+                CONTEXT_SOURCE_USER,
+                self._build_user_context(user_id, db_session),
+                self._get_fallback_context(),
+                session_id,
+            ),
+            self._run_context_source(
+                CONTEXT_SOURCE_CONVERSATION,
+                self._build_conversation_context(session_id, user_id),
+                {"messages": [], "summary": None},
+                session_id,
+            ),
+            self._run_context_source(
+                CONTEXT_SOURCE_KNOWLEDGE,
+                self._retrieve_knowledge(query, user_id) if knowledge_enabled else _no_knowledge(),
+                "",
+                session_id,
+            ),
+        )
+
+        user_rec["has_profile"] = user_ctx.get("user_context") is not None
+        conv_rec["messages"] = len(conv_ctx.get("messages") or [])
+        conv_rec["has_summary"] = bool(conv_ctx.get("summary"))
+        knowledge_rec["chars"] = len(knowledge_ctx or "")
+
+        report = {
+            CONTEXT_SOURCE_USER: user_rec,
+            CONTEXT_SOURCE_CONVERSATION: conv_rec,
+            CONTEXT_SOURCE_KNOWLEDGE: knowledge_rec,
+        }
+        logger.debug(f"Context fan-out for {session_id}: {json.dumps(report)}")
+
+        return user_ctx, conv_ctx, knowledge_ctx or "", report
+
     async def _get_tools_schema(self) -> List[Dict[str, Any]]:
         """获取工具模式（带错误处理）"""
         try:
@@ -457,6 +692,31 @@ class ProductionChatOrchestrator:
         else:
             logger.error(f"Request failed: {json.dumps(log_data)}")
 
+    def _count_request(self, status: str, session_id: str):
+        """记录请求结果（有界标签，会话 ID 放在 exemplar 中）"""
+        if self.enable_metrics:
+            _record_with_exemplar(
+                REQUEST_COUNTER.labels(status=status, model=self.model_name).inc, 1, session_id
+            )
+
+    def _observe_stage(self, stage: str, seconds: float, session_id: str):
+        """记录阶段耗时"""
+        if self.enable_metrics:
+            _record_with_exemplar(STAGE_DURATION.labels(stage=stage).observe, seconds, session_id)
+
+    def _observe_first_token(self, seconds: float, session_id: str):
+        """记录首 token 延迟（同时计入 first_token 阶段）"""
+        if self.enable_metrics:
+            _record_with_exemplar(
+                TIME_TO_FIRST_TOKEN.labels(model=self.model_name).observe, seconds, session_id
+            )
+        self._observe_stage(STAGE_FIRST_TOKEN, seconds, session_id)
+
+    def _count_retrieval(self, source: str, status: str):
+        """记录知识检索结果"""
+        if self.enable_metrics:
+            KNOWLEDGE_RETRIEVAL_COUNTER.labels(source=source, status=status).inc()
+
     async def process_stream(
         self,
         request: agent_service_pb2.ChatRequest,
@@ -473,8 +733,9 @@ class ProductionChatOrchestrator:
         4. 消息去重
         5. 幂等性检查
         6. 分布式锁
-        7. 执行处理
-        8. 记录指标
+        7. 并发构建上下文（用户 / 对话 / 知识，各自带截止时间）
+        8. 执行处理
+        9. 记录指标
         """
         start_time = time.time()
         request_id = request.request_id
@@ -484,6 +745,7 @@ class ProductionChatOrchestrator:
         # 消息去重检查
         if await self.message_tracker.is_processed(request_id):
             logger.warning(f"Duplicate request detected: {request_id}")
+            self._count_request("duplicate", session_id)
             yield agent_service_pb2.ChatResponse(
                 response_id=f"resp_{uuid.uuid4()}",
                 created_at=int(datetime.now().timestamp()),
@@ -501,6 +763,7 @@ class ProductionChatOrchestrator:
         if self.circuit_breaker and not await self.circuit_breaker.can_execute():
             state = self.circuit_breaker.get_state()
             logger.error(f"Circuit breaker is {state}, rejecting request")
+            self._count_request("circuit_open", session_id)
             yield agent_service_pb2.ChatResponse(
                 response_id=f"resp_{uuid.uuid4()}",
                 created_at=int(datetime.now().timestamp()),
@@ -517,6 +780,7 @@ class ProductionChatOrchestrator:
         # 并发控制
         session_tracked = await self._track_session(session_id, add=True)
         if not session_tracked:
+            self._count_request("rate_limited", session_id)
             yield agent_service_pb2.ChatResponse(
                 response_id=f"resp_{uuid.uuid4()}",
                 created_at=int(datetime.now().timestamp()),
@@ -534,15 +798,17 @@ class ProductionChatOrchestrator:
 
         try:
             # 验证请求
-            with REQUEST_DURATION.labels(operation="validation").time():
-                validation_result = await self.validator.validate_chat_request(request)
-                if not validation_result.is_valid:
-                    raise ValueError(f"Validation failed: {validation_result.error_message}")
+            stage_start = time.time()
+            validation_result = await self.validator.validate_chat_request(request)
+            self._observe_stage(STAGE_VALIDATION, time.time() - stage_start, session_id)
+            if not validation_result.is_valid:
+                raise ValueError(f"Validation failed: {validation_result.error_message}")
 
             # 幂等性检查
             cached_response = await self._check_idempotency(session_id, request_id)
             if cached_response:
                 logger.info(f"Cache hit for {session_id}/{request_id}")
+                self._count_request("cache_hit", session_id)
                 yield agent_service_pb2.ChatResponse(
                     response_id=f"resp_{uuid.uuid4()}",
                     created_at=int(datetime.now().timestamp()),
@@ -557,53 +823,16 @@ class ProductionChatOrchestrator:
             if not lock_acquired:
                 raise ValueError("Another request is processing for this session")
 
-            # 构建上下文
-            with REQUEST_DURATION.labels(operation="context_building").time():
-                user_context_data = await self._build_user_context(user_id, active_db)
-                conversation_context = await self._build_conversation_context(session_id, user_id)
-
-                # GraphRAG 检索（增强版，带降级）
-                knowledge_context = ""
-                try:
-                    if active_db and user_id:
-                        # 使用 GraphKnowledgeService 进行增强的 GraphRAG 检索
-                        graph_ks = GraphKnowledgeService(active_db)
-                        rag_result = await graph_ks.graph_rag_search(
-                            query=request.message if request.HasField("message") else "",
-                            user_id=uuid.UUID(user_id),
-                            depth=2,
-                            top_k=5
-                        )
-                        knowledge_context = rag_result.get("context", "")
-
-                        # 记录 GraphRAG 指标
-                        if rag_result.get("metadata"):
-                            logger.info(
-                                f"GraphRAG results: "
-                                f"vector={rag_result['metadata'].get('vector_count', 0)}, "
-                                f"graph={rag_result['metadata'].get('graph_count', 0)}, "
-                                f"fused={rag_result['metadata'].get('fusion_count', 0)}"
-                            )
-
-                        # Prometheus 指标
-                        if PROMETHEUS_AVAILABLE:
-                            REQUEST_COUNTER.labels(status="graphrag_success", session_id=session_id).inc()
-                except Exception as e:
-                    logger.warning(f"GraphRAG retrieval failed: {e}, falling back to vector search")
-                    # 降级到普通向量检索
-                    try:
-                        if active_db and user_id:
-                            ks = KnowledgeService(active_db)
-                            knowledge_context = await ks.retrieve_context(
-                                user_id=uuid.UUID(user_id),
-                                query=request.message if request.HasField("message") else ""
-                            )
-                            if PROMETHEUS_AVAILABLE:
-                                REQUEST_COUNTER.labels(status="vector_success", session_id=session_id).inc()
-                    except Exception as e2:
-                        logger.error(f"Fallback knowledge retrieval also failed: {e2}")
-                        if PROMETHEUS_AVAILABLE:
-                            REQUEST_COUNTER.labels(status="rag_failed", session_id=session_id).inc()
+            # 构建上下文（并发 fan-out，单个来源超时只降级不阻塞）
+            stage_start = time.time()
+            user_context_data, conversation_context, knowledge_context, context_report = \
+                await self._build_context(request, session_id, user_id, active_db)
+            self._observe_stage(
+                STAGE_GRAPHRAG,
+                context_report[CONTEXT_SOURCE_KNOWLEDGE]["duration_ms"] / 1000,
+                session_id
+            )
+            self._observe_stage(STAGE_CONTEXT_BUILD, time.time() - stage_start, session_id)
 
             # 构建 Prompt
             base_system_prompt = build_system_prompt(
@@ -631,59 +860,80 @@ class ProductionChatOrchestrator:
             total_prompt_tokens = 0
             total_completion_tokens = 0
 
-            with REQUEST_DURATION.labels(operation="llm_generation").time():
-                tools = await self._get_tools_schema()
-                user_message = ""
-                if request.HasField("message"):
-                    user_message = request.message
-                elif request.HasField("tool_result"):
-                    tool_result = request.tool_result
-                    user_message = f"Tool '{tool_result.tool_name}' result: {tool_result.result_json}"
-
-                async for chunk in llm_service.chat_stream_with_tools(
-                    system_prompt=base_system_prompt,
-                    user_message=user_message,
-                    tools=tools
-                ):
-                    if chunk.type == "text":
-                        full_response += chunk.content
-                        yield agent_service_pb2.ChatResponse(
-                            response_id=f"resp_{uuid.uuid4()}",
-                            created_at=int(datetime.now().timestamp()),
-                            request_id=request_id,
-                            delta=chunk.content
+            llm_start = time.time()
+            first_token_at = None
+            tool_call_started: Dict[str, float] = {}
+
+            tools = await self._get_tools_schema()
+            user_message = ""
+            if request.HasField("message"):
+                user_message = request.message
+            elif request.HasField("tool_result"):
+                tool_result = request.tool_result
+                user_message = f"Tool '{tool_result.tool_name}' result: {tool_result.result_json}"
+
+            async for chunk in llm_service.chat_stream_with_tools(
+                system_prompt=base_system_prompt,
+                user_message=user_message,
+                tools=tools
+            ):
+                if chunk.type == "text":
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                        self._observe_first_token(first_token_at - start_time, session_id)
+                    full_response += chunk.content
+                    yield agent_service_pb2.ChatResponse(
+                        response_id=f"resp_{uuid.uuid4()}",
+                        created_at=int(datetime.now().timestamp()),
+                        request_id=request_id,
+                        delta=chunk.content
+                    )
+
+                elif chunk.type == "tool_call_chunk":
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                        self._observe_first_token(first_token_at - start_time, session_id)
+                    tool_call_started.setdefault(chunk.tool_call_id, time.time())
+
+                elif chunk.type == "tool_call_end":
+                    started = tool_call_started.pop(chunk.tool_call_id, None)
+                    if started is not None and self.enable_metrics:
+                        elapsed = time.time() - started
+                        _record_with_exemplar(
+                            TOOL_CALL_DURATION.labels(tool_name=chunk.tool_name).observe, elapsed, session_id
                         )
-
-                    elif chunk.type == "tool_call_end":
-                        await self._update_state(session_id, STATE_TOOL_CALLING, f"Calling {chunk.tool_name}...")
-                        yield agent_service_pb2.ChatResponse(
-                            response_id=f"resp_{uuid.uuid4()}",
-                            created_at=int(datetime.now().timestamp()),
-                            request_id=request_id,
-                            status_update=agent_service_pb2.AgentStatus(
-                                state=agent_service_pb2.AgentStatus.TOOL_CALLING,
-                                details=f"Executing {chunk.tool_name}..."
-                            ),
-                            tool_call=agent_service_pb2.ToolCall(
-                                id=chunk.tool_call_id,
-                                name=chunk.tool_name,
-                                arguments=json.dumps(chunk.full_arguments)
-                            )
+                        self._observe_stage(STAGE_TOOL_CALL, elapsed, session_id)
+                    await self._update_state(session_id, STATE_TOOL_CALLING, f"Calling {chunk.tool_name}...")
+                    yield agent_service_pb2.ChatResponse(
+                        response_id=f"resp_{uuid.uuid4()}",
+                        created_at=int(datetime.now().timestamp()),
+                        request_id=request_id,
+                        status_update=agent_service_pb2.AgentStatus(
+                            state=agent_service_pb2.AgentStatus.TOOL_CALLING,
+                            details=f"Executing {chunk.tool_name}..."
+                        ),
+                        tool_call=agent_service_pb2.ToolCall(
+                            id=chunk.tool_call_id,
+                            name=chunk.tool_name,
+                            arguments=json.dumps(chunk.full_arguments)
                         )
-
-                    elif chunk.type == "usage" and self.token_tracker:
-                        total_prompt_tokens = chunk.prompt_tokens or 0
-                        total_completion_tokens = chunk.completion_tokens or 0
-                        yield agent_service_pb2.ChatResponse(
-                            response_id=f"resp_{uuid.uuid4()}",
-                            created_at=int(datetime.now().timestamp()),
-                            request_id=request_id,
-                            usage=agent_service_pb2.Usage(
-                                prompt_tokens=total_prompt_tokens,
-                                completion_tokens=total_completion_tokens,
-                                total_tokens=total_prompt_tokens + total_completion_tokens
-                            )
+                    )
+
+                elif chunk.type == "usage" and self.token_tracker:
+                    total_prompt_tokens = chunk.prompt_tokens or 0
+                    total_completion_tokens = chunk.completion_tokens or 0
+                    yield agent_service_pb2.ChatResponse(
+                        response_id=f"resp_{uuid.uuid4()}",
+                        created_at=int(datetime.now().timestamp()),
+                        request_id=request_id,
+                        usage=agent_service_pb2.Usage(
+                            prompt_tokens=total_prompt_tokens,
+                            completion_tokens=total_completion_tokens,
+                            total_tokens=total_prompt_tokens + total_completion_tokens
                         )
+                    )
+
+            self._observe_stage(STAGE_LLM_GENERATION, time.time() - llm_start, session_id)
 
             # 记录 Token 使用
             await self._record_token_usage(
@@ -691,7 +941,8 @@ class ProductionChatOrchestrator:
                 session_id=session_id,
                 request_id=request_id,
                 prompt_tokens=total_prompt_tokens,
-                completion_tokens=total_completion_tokens
+                completion_tokens=total_completion_tokens,
+                model=self.model_name
             )
 
             # 组合响应
@@ -722,8 +973,8 @@ class ProductionChatOrchestrator:
 
             # 指标和日志
             duration = time.time() - start_time
-            if self.enable_metrics:
-                REQUEST_COUNTER.labels(status="success", session_id=session_id).inc()
+            self._count_request("success", session_id)
+            self._observe_stage(STAGE_TOTAL, duration, session_id)
 
             self._log_request(session_id, request_id, user_id, duration, "success")
 
@@ -736,8 +987,8 @@ class ProductionChatOrchestrator:
                 await self.circuit_breaker.record_failure()
 
             # 指标和日志
-            if self.enable_metrics:
-                REQUEST_COUNTER.labels(status="error", session_id=session_id).inc()
+            self._count_request("error", session_id)
+            self._observe_stage(STAGE_TOTAL, duration, session_id)
 
             self._log_request(session_id, request_id, user_id, duration, "error", str(e))
 
@@ -3,17 +3,71 @@ SummarizationWorker - 后台总结任务处理器
 
 从 Redis 队列消费总结任务，使用 LLM 生成历史对话摘要，
 并将结果缓存回 Redis。
+
+- 任务只携带 session_id 与待总结的消息数 upto，历史由 worker 从 chat:history 读取
+- 按 high / normal / low 三条队列优先消费
+- 同一会话的重复请求在入队时 (summary:pending) 和批内合并为一次
+- 摘要是增量的：在上次摘要基础上只总结新增的消息，已覆盖的消息数存于 summary:upto
 """
 
 import json
+import time
 import asyncio
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 from loguru import logger
 
 import redis.asyncio as redis
 from app.services.llm_service import llm_service
 
+# 按优先级排列的队列；normal 沿用原有的 queue:summarization
+SUMMARY_QUEUES = {
+    "high": "queue:summarization:high",
+    "normal": "queue:summarization",
+    "low": "queue:summarization:low",
+}
+PRIORITY_ORDER = ["high", "normal", "low"]
+
+SUMMARY_KEY = "summary:{}"
+SUMMARY_UPTO_KEY = "summary:upto:{}"
+SUMMARY_PENDING_KEY = "summary:pending:{}"
+HISTORY_KEY = "chat:history:{}"
+
+# 单次总结最多输入的新增消息数，避免输入过大；积压更多时分多次从检查点向前推进
+MAX_TURNS_PER_SUMMARY = 20
+
+
+async def enqueue_summarization(
+    redis_client: redis.Redis,
+    session_id: str,
+    user_id: str,
+    upto: int,
+    priority: str = "normal",
+    dedup_ttl: int = 300
+) -> bool:
+    """
+    投递总结任务；同一会话已有待处理任务时直接合并（不重复入队）
+
+    Args:
+        upto: 需要被摘要覆盖的消息数（chat:history 的前 upto 条）
+
+    Returns:
+        是否新入队
+    """
+    if not await redis_client.set(SUMMARY_PENDING_KEY.format(session_id), upto, nx=True, ex=dedup_ttl):
+        return False
+
+    task = {
+        "session_id": session_id,
+        "user_id": user_id,
+        "upto": upto,
+        "timestamp": time.time(),
+        "priority": priority
+    }
+    queue_key = SUMMARY_QUEUES.get(priority, SUMMARY_QUEUES["normal"])
+    await redis_client.rpush(queue_key, json.dumps(task))
+    return True
+
 
 class SummarizationWorker:
     """
@@ -24,6 +78,8 @@ class SummarizationWorker:
     2. 调用 LLM 生成摘要
     3. 缓存结果到 Redis
     4. 支持任务优先级和重试
+
+    最多 max_concurrency 个会话并发总结，单个慢请求不会阻塞队列
     """
 
     def __init__(
@@ -31,7 +87,9 @@ class SummarizationWorker:
         redis_client: redis.Redis,
         batch_size: int = 10,
         max_retries: int = 3,
-        worker_id: str = None
+        worker_id: str = None,
+        max_concurrency: int = 4,
+        summary_ttl: int = 3600
     ):
         """
         初始化 SummarizationWorker
@@ -41,15 +99,24 @@ class SummarizationWorker:
             batch_size: 批量处理的任务数
             max_retries: 最大重试次数
             worker_id: 工作器 ID（用于日志和监控）
+            max_concurrency: 同时进行的 LLM 总结调用数上限
+            summary_ttl: 摘要缓存的 TTL（秒）
         """
         self.redis = redis_client
         self.batch_size = batch_size
         self.max_retries = max_retries
         self.worker_id = worker_id or f"worker-{id(self)}"
+        self.max_concurrency = max_concurrency
+        self.summary_ttl = summary_ttl
 
         self.running = False
         self.processed_count = 0
         self.failed_count = 0
+        self.coalesced_count = 0
+
+        self._llm_semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set = set()
+        self._in_flight: set = set()
 
         logger.info(f"SummarizationWorker {self.worker_id} initialized")
 
@@ -66,9 +133,8 @@ class SummarizationWorker:
 
         try:
             while self.running:
-                # 批量消费任务
+                # 批量消费任务（队列为空时阻塞等待，不会忙等）
                 await self._process_batch()
-                await asyncio.sleep(0.1)  # 短暂休眠，避免忙等待
 
         except asyncio.CancelledError:
             logger.info(f"Worker {self.worker_id} cancelled")
@@ -76,6 +142,9 @@ class SummarizationWorker:
             logger.error(f"Worker {self.worker_id} crashed: {e}", exc_info=True)
         finally:
             self.running = False
+            # 等待进行中的总结完成
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
             logger.info(f"SummarizationWorker {self.worker_id} stopped")
 
     async def stop(self):
@@ -85,33 +154,110 @@ class SummarizationWorker:
 
     async def _process_batch(self):
         """
-        批量处理队列中的任务
+        取出一批任务，合并同一会话的请求后并发处理
         """
-        queue_key = "queue:summarization"
-
-        # 批量获取任务
-        for _ in range(self.batch_size):
-            try:
-                # 非阻塞获取任务
-                task_data = await self.redis.blpop(queue_key, timeout=0.1)
-
-                if task_data is None:
-                    break  # 队列为空
-
-                # 解析任务
-                task = json.loads(task_data[1])
-
-                # 处理单个任务
-                success = await self._process_task(task)
+        # 并发已满时先等待任一任务完成，未取出的任务留在队列中
+        if len(self._tasks) >= self.max_concurrency:
+            await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
 
-                if success:
-                    self.processed_count += 1
-                else:
-                    self.failed_count += 1
+        slots = min(self.batch_size, self.max_concurrency - len(self._tasks))
+        try:
+            tasks = await self._pop_tasks(slots)
+        except Exception as e:
+            logger.error(f"Failed to fetch summarization tasks: {e}")
+            await asyncio.sleep(1)
+            return
 
+        for task in self._coalesce(tasks):
+            session_id = task["session_id"]
+            if session_id in self._in_flight:
+                # 该会话正在总结，本次请求并入进行中的任务
+                self.coalesced_count += 1
+                continue
+
+            self._in_flight.add(session_id)
+            job = asyncio.create_task(self._run_task(task))
+            self._tasks.add(job)
+            job.add_done_callback(self._tasks.discard)
+
+    async def _pop_tasks(self, count: int) -> List[Dict[str, Any]]:
+        """按优先级取出最多 count 个任务"""
+        queues = [SUMMARY_QUEUES[p] for p in PRIORITY_ORDER]
+
+        # BLPOP 按参数顺序检查队列，天然优先 high
+        first = await self.redis.blpop(queues, timeout=1)
+        if first is None:
+            return []
+        raw = [first[1]]
+
+        for queue_key in queues:
+            if len(raw) >= count:
+                break
+            items = await self.redis.lpop(queue_key, count - len(raw))
+            raw.extend(items or [])
+
+        tasks = []
+        for data in raw:
+            try:
+                task = json.loads(data)
             except Exception as e:
-                logger.error(f"Failed to process batch item: {e}")
+                logger.error(f"Invalid summarization task payload: {e}")
                 self.failed_count += 1
+                continue
+            if not task.get("session_id"):
+                logger.warning("Invalid task: missing session_id")
+                self.failed_count += 1
+                continue
+            tasks.append(task)
+        return tasks
+
+    def _coalesce(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """同一会话的多个任务合并为一个：取最大的 upto 与最高的优先级"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for task in tasks:
+            session_id = task["session_id"]
+            current = merged.get(session_id)
+            if current is None:
+                merged[session_id] = dict(task)
+                continue
+
+            self.coalesced_count += 1
+            priority = min(current.get("priority"), task.get("priority"), key=self._priority_rank)
+            if self._task_upto(task) > self._task_upto(current):
+                current = merged[session_id] = dict(task)
+            current["priority"] = priority
+
+        # 高优先级先处理
+        return sorted(merged.values(), key=lambda t: self._priority_rank(t.get("priority")))
+
+    @staticmethod
+    def _priority_rank(priority: Optional[str]) -> int:
+        return PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else PRIORITY_ORDER.index("normal")
+
+    @staticmethod
+    def _task_upto(task: Dict[str, Any]) -> int:
+        if task.get("history") is not None:
+            return len(task["history"])
+        return int(task.get("upto") or 0)
+
+    async def _run_task(self, task: Dict[str, Any]):
+        session_id = task["session_id"]
+        try:
+            success = await self._process_task(task)
+            if success:
+                self.processed_count += 1
+            else:
+                self.failed_count += 1
+        except Exception as e:
+            logger.error(f"Failed to process summarization task for session {session_id}: {e}")
+            self.failed_count += 1
+        finally:
+            self._in_flight.discard(session_id)
+            # 释放去重标记，之后的新请求可以再次入队
+            try:
+                await self.redis.delete(SUMMARY_PENDING_KEY.format(session_id))
+            except Exception:
+                pass
 
     async def _process_task(self, task: Dict[str, Any]) -> bool:
         """
@@ -125,41 +271,61 @@ class SummarizationWorker:
         """
         session_id = task.get("session_id")
         user_id = task.get("user_id")
-        history = task.get("history", [])
-        timestamp = task.get("timestamp", time.time())
         priority = task.get("priority", "normal")
 
-        if not session_id or not history:
-            logger.warning(f"Invalid task: missing session_id or history")
+        if not session_id:
+            logger.warning(f"Invalid task: missing session_id")
+            return False
+
+        cache_key = SUMMARY_KEY.format(session_id)
+        upto_key = SUMMARY_UPTO_KEY.format(session_id)
+
+        # 读取上一次的摘要及其覆盖的消息数
+        previous, covered = await self.redis.mget(cache_key, upto_key)
+        previous_summary = previous.decode("utf-8") if isinstance(previous, bytes) else previous
+        covered = int(covered) if covered and previous_summary else 0
+
+        # 兼容旧格式：任务直接携带完整历史
+        history = task.get("history")
+        upto = self._task_upto(task) if history is not None else int(task.get("upto") or 0)
+        if history is None and not upto:
+            upto = await self.redis.llen(HISTORY_KEY.format(session_id))
+
+        if upto <= covered:
+            logger.debug(f"Summary for session {session_id} already covers {covered} messages, skipping")
+            return True
+
+        # 每次最多向前推进 MAX_TURNS_PER_SUMMARY 条，检查点写到实际总结到的位置；
+        # 积压更多时剩余部分由后续触发继续追赶，不跳过任何消息
+        end = min(upto, covered + MAX_TURNS_PER_SUMMARY)
+        if history is not None:
+            new_turns = history[covered:end]
+        else:
+            new_turns = await self._load_turns(session_id, covered, end)
+        if not new_turns:
+            logger.warning(f"Invalid task: no history to summarize for session {session_id}")
             return False
 
         logger.info(
             f"Processing summarization task for session {session_id}, "
-            f"history size: {len(history)}, priority: {priority}"
+            f"new messages: {len(new_turns)} (covered {covered} -> {end} of {upto}), priority: {priority}"
         )
 
-        # 检查是否已经有总结（避免重复处理）
-        cache_key = f"summary:{session_id}"
-        existing = await self.redis.get(cache_key)
-        if existing:
-            logger.debug(f"Summary already exists for session {session_id}, skipping")
-            return True
-
         # 重试逻辑
         for attempt in range(1, self.max_retries + 1):
             try:
-                summary = await self._generate_summary(history, user_id)
+                async with self._llm_semaphore:
+                    summary = await self._generate_summary(new_turns, user_id, previous_summary)
 
                 # 验证总结结果
                 if not summary or len(summary.strip()) < 10:
                     raise ValueError("Summary too short or empty")
 
-                # 保存到 Redis
-                await self.redis.setex(
-                    cache_key,
-                    3600,  # 1小时 TTL
-                    summary
-                )
+                # 摘要与覆盖位置一起写入，保持一致
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.setex(cache_key, self.summary_ttl, summary)
+                    pipe.setex(upto_key, self.summary_ttl, end)
+                    await pipe.execute()
 
                 logger.info(
                     f"✅ Summary generated for session {session_id} "
@@ -167,7 +333,7 @@ class SummarizationWorker:
                 )
 
                 # 记录到历史日志（可选）
-                await self._log_summary(session_id, summary, history)
+                await self._log_summary(session_id, summary, new_turns)
 
                 return True
 
@@ -186,37 +352,55 @@ class SummarizationWorker:
 
         return False
 
-    async def _generate_summary(self, history: List[Dict], user_id: str) -> str:
+    async def _load_turns(self, session_id: str, start: int, end: int) -> List[Dict]:
+        """读取 chat:history 中 [start, end) 区间的消息"""
+        messages = await self.redis.lrange(HISTORY_KEY.format(session_id), start, end - 1)
+
+        turns = []
+        for msg in messages:
+            try:
+                parsed = json.loads(msg)
+                if "role" in parsed and "content" in parsed:
+                    turns.append(parsed)
+            except json.JSONDecodeError:
+                continue
+        return turns
+
+    async def _generate_summary(
+        self,
+        history: List[Dict],
+        user_id: str,
+        previous_summary: Optional[str] = None
+    ) -> str:
         """
         使用 LLM 生成历史对话摘要
 
         Args:
-            history: 历史对话列表
+            history: 需要总结的（新增）对话列表
             user_id: 用户 ID
+            previous_summary: 之前的摘要，存在时在其基础上增量更新
 
         Returns:
             生成的摘要文本
         """
         # 构建总结提示词
-        prompt = self._build_summary_prompt(history)
+        prompt = self._build_summary_prompt(history, previous_summary)
 
-        # 调用 LLM 服务
-        # 注意：这里使用 chat_stream_with_tools 的简化版本
-        # 或者使用专门的 generate_summary 方法（如果存在）
         try:
-            # 方式1: 使用现有的 LLM 服务
-            summary = await llm_service.generate_summary(prompt)
+            # 优先使用专门的 generate_summary 方法（如果存在）
+            generate_summary = getattr(llm_service, "generate_summary", None)
+            summary = await generate_summary(prompt) if generate_summary else None
 
-            # 方式2: 如果没有专门的 generate_summary，使用通用方法
+            # 降级到通用调用
             if not summary:
-                # 降级到通用调用
-                response = await llm_service.chat(
-                    system_prompt="你是一个专业的对话总结助手。请用简洁的语言总结对话的核心内容。",
-                    user_message=prompt,
+                summary = await llm_service.chat(
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的对话总结助手。请用简洁的语言总结对话的核心内容。"},
+                        {"role": "user", "content": prompt}
+                    ],
                     temperature=0.3,
                     max_tokens=500
                 )
-                summary = response.content
 
             return summary
 
@@ -224,24 +408,35 @@ class SummarizationWorker:
             logger.error(f"LLM call failed: {e}")
             raise
 
-    def _build_summary_prompt(self, history: List[Dict]) -> str:
+    def _build_summary_prompt(self, history: List[Dict], previous_summary: Optional[str] = None) -> str:
         """
         构建总结提示词
 
         Args:
             history: 历史对话
+            previous_summary: 之前的摘要
 
         Returns:
             提示词文本
         """
         # 限制历史长度，避免输入过大
-        limited_history = history[-20:] if len(history) > 20 else history
-
-        prompt_parts = [
-            "请总结以下对话的核心内容，提取关键信息：",
-            "",
-            "对话历史："
-        ]
+        limited_history = history[-MAX_TURNS_PER_SUMMARY:]
+
+        if previous_summary:
+            prompt_parts = [
+                "以下是之前对话的摘要：",
+                previous_summary,
+                "",
+                "请结合摘要与之后新增的对话，输出一份更新后的完整摘要。",
+                "",
+                "新增对话："
+            ]
+        else:
+            prompt_parts = [
+                "请总结以下对话的核心内容，提取关键信息：",
+                "",
+                "对话历史："
+            ]
 
         for msg in limited_history:
             role = "用户" if msg["role"] == "user" else "助手"
@@ -276,11 +471,10 @@ class SummarizationWorker:
 
         # 写入 Redis 日志队列（可选）
         try:
-            await self.redis.rpush(
-                "logs:summarization",
-                json.dumps(log_entry),
-                ex=86400  # 24小时过期
-            )
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.rpush("logs:summarization", json.dumps(log_entry))
+                pipe.expire("logs:summarization", 86400)  # 24小时过期
+                await pipe.execute()
         except:
             pass  # 日志失败不影响主流程
 
@@ -293,6 +487,8 @@ class SummarizationWorker:
             "running": self.running,
             "processed": self.processed_count,
             "failed": self.failed_count,
+            "coalesced": self.coalesced_count,
+            "in_flight": len(self._in_flight),
             "success_rate": (
                 self.processed_count / (self.processed_count + self.failed_count)
                 if (self.processed_count + self.failed_count) > 0
@@ -0,0 +1,82 @@
+"""
+TokenCounter - 消息 Token 计数器
+
+基于 tiktoken 计算消息的 Token 数，按消息内容哈希缓存结果，
+同一条历史消息在多次请求中只编码一次。
+tiktoken 编码文件不可用（如离线环境）时退化为按字符估算。
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from loguru import logger
+
+# 每条消息的格式开销（role、分隔符等），与 OpenAI chat 格式的计算方式一致
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算：CJK 字符约 1 token/字，其他约 4 字符/token"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenCounter:
+    """
+    带缓存的 Token 计数器
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", cache_size: int = 10000):
+        self.encoding_name = encoding_name
+        self.cache_size = cache_size
+        self._encoding = None
+        self._encoding_failed = False
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def _get_encoding(self):
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding {self.encoding_name} unavailable, estimating tokens: {e}")
+                self._encoding_failed = True
+        return self._encoding
+
+    def count(self, text: Optional[str]) -> int:
+        """计算文本的 Token 数（不缓存）"""
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            return _estimate_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: Dict) -> int:
+        """计算单条消息的 Token 数（含格式开销），按内容缓存"""
+        content = message.get("content") or ""
+        key = hashlib.sha1(f"{message.get('role')}\x00{content}".encode("utf-8")).hexdigest()
+
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self._cache.move_to_end(key)
+            return tokens
+
+        tokens = self.count(content) + MESSAGE_OVERHEAD_TOKENS
+        self._cache[key] = tokens
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+_token_counters: Dict[str, TokenCounter] = {}
+
+
+def get_token_counter(encoding_name: str = "cl100k_base") -> TokenCounter:
+    """按编码获取共享的 TokenCounter（进程内共享缓存）"""
+    if encoding_name not in _token_counters:
+        _token_counters[encoding_name] = TokenCounter(encoding_name)
+    return _token_counters[encoding_name]
@@ -26,8 +26,14 @@ class TokenTracker:
     - 每日配额管理
     - 使用统计查询
     - 异步记账队列
+
+    每日用量保存在有序集合 leaderboard:daily_tokens:{date} (member=user_id)，
+    配额检查用 ZSCORE 读取，Top N 用 ZUNIONSTORE + ZREVRANGE，无需扫描键空间
     """
 
+    LEADERBOARD_PREFIX = "leaderboard:daily_tokens"
+    LEADERBOARD_TTL = 8 * 86400  # 覆盖默认 7 天统计窗口
+
     def __init__(self, redis_client: redis.Redis):
         """
         初始化 TokenTracker
@@ -38,6 +44,14 @@ class TokenTracker:
         self.redis = redis_client
         logger.info("TokenTracker initialized")
 
+    def _leaderboard_key(self, date: str) -> str:
+        return f"{self.LEADERBOARD_PREFIX}:{date}"
+
+    @staticmethod
+    def _recent_dates(days: int) -> List[str]:
+        now = datetime.now()
+        return [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
     async def record_usage(
         self,
         user_id: str,
@@ -65,8 +79,9 @@ class TokenTracker:
         """
         total_tokens = prompt_tokens + completion_tokens
         timestamp = time.time()
+        today = datetime.now().strftime("%Y-%m-%d")
 
-        # 1. 记录到计费队列（异步持久化）
+        # 计费队列记录（异步持久化）
         usage_record = {
             "user_id": user_id,
             "session_id": session_id,
@@ -79,25 +94,7 @@ class TokenTracker:
             "timestamp": timestamp
         }
 
-        await self.redis.rpush("queue:billing", json.dumps(usage_record))
-
-        # 2. 更新用户当日累计
-        today = datetime.now().strftime("%Y-%m-%d")
-        daily_key = f"user:daily_tokens:{user_id}:{today}"
-        await self.redis.incrby(daily_key, total_tokens)
-        await self.redis.expire(daily_key, 86400)  # 24小时过期
-
-        # 3. 更新会话累计
-        session_key = f"session:tokens:{session_id}"
-        await self.redis.incrby(session_key, total_tokens)
-
-        # 4. 更新模型统计
-        model_key = f"model:tokens:{model}:{today}"
-        await self.redis.incrby(model_key, total_tokens)
-        await self.redis.expire(model_key, 86400)
-
-        # 5. 记录到历史明细（可选，用于详细分析）
-        detail_key = f"user:details:{user_id}:{today}"
+        # 历史明细（用于详细分析）
         detail = {
             "request_id": request_id,
             "session_id": session_id,
@@ -107,8 +104,34 @@ class TokenTracker:
             "model": model,
             "timestamp": timestamp
         }
-        await self.redis.rpush(detail_key, json.dumps(detail))
-        await self.redis.expire(detail_key, 86400)  # 保留24小时
+
+        # 所有写入放在一个 MULTI 中：一次往返，且计费记录与计数同时生效
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # 1. 计费队列
+            pipe.rpush("queue:billing", json.dumps(usage_record))
+
+            # 2. 当日排行榜（同时作为配额计数）
+            leaderboard_key = self._leaderboard_key(today)
+            pipe.zincrby(leaderboard_key, total_tokens, user_id)
+            pipe.expire(leaderboard_key, self.LEADERBOARD_TTL)
+
+            # 3. 会话累计
+            pipe.incrby(f"session:tokens:{session_id}", total_tokens)
+
+            # 4. 模型与系统统计
+            model_key = f"model:tokens:{model}:{today}"
+            pipe.incrby(model_key, total_tokens)
+            pipe.expire(model_key, self.LEADERBOARD_TTL)
+            system_key = f"system:tokens:{today}"
+            pipe.incrby(system_key, total_tokens)
+            pipe.expire(system_key, self.LEADERBOARD_TTL)
+
+            # 5. 明细保留24小时
+            detail_key = f"user:details:{user_id}:{today}"
+            pipe.rpush(detail_key, json.dumps(detail))
+            pipe.expire(detail_key, 86400)
+
+            await pipe.execute()
 
         logger.debug(
             f"Recorded usage for user {user_id}: "
@@ -131,8 +154,7 @@ class TokenTracker:
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
 
-        key = f"user:daily_tokens:{user_id}:{date}"
-        result = await self.redis.get(key)
+        result = await self.redis.zscore(self._leaderboard_key(date), user_id)
         return int(result) if result else 0
 
     async def check_quota(
@@ -186,13 +208,13 @@ class TokenTracker:
         Returns:
             {date: tokens, ...}
         """
-        breakdown = {}
-        for i in range(days):
-            date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            usage = await self.get_daily_usage(user_id, date)
-            breakdown[date] = usage
+        dates = self._recent_dates(days)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for date in dates:
+                pipe.zscore(self._leaderboard_key(date), user_id)
+            results = await pipe.execute()
 
-        return breakdown
+        return {date: int(usage) if usage else 0 for date, usage in zip(dates, results)}
 
     async def get_session_usage(self, session_id: str) -> int:
         """
@@ -223,16 +245,14 @@ class TokenTracker:
         Returns:
             统计信息
         """
-        breakdown = {}
-        total = 0
+        dates = self._recent_dates(days)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for date in dates:
+                pipe.get(f"model:tokens:{model}:{date}")
+            results = await pipe.execute()
 
-        for i in range(days):
-            date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            key = f"model:tokens:{model}:{date}"
-            usage = await self.redis.get(key)
-            tokens = int(usage) if usage else 0
-            breakdown[date] = tokens
-            total += tokens
+        breakdown = {date: int(usage) if usage else 0 for date, usage in zip(dates, results)}
+        total = sum(breakdown.values())
 
         return {
             "model": model,
@@ -256,39 +276,24 @@ class TokenTracker:
         Returns:
             [{user_id: ..., total_tokens: ...}, ...]
         """
-        # 使用 Redis SCAN 查找所有用户
-        pattern = "user:daily_tokens:*"
-        user_totals = {}
-
-        async for key in self.redis.scan_iter(match=pattern):
-            # key 格式: user:daily_tokens:{user_id}:{date}
-            parts = key.decode("utf-8").split(":")
-            if len(parts) >= 4:
-                user_id = parts[2]
-                date = parts[3]
-
-                # 只统计指定天数内的
-                try:
-                    key_date = datetime.strptime(date, "%Y-%m-%d")
-                    days_ago = (datetime.now() - key_date).days
-
-                    if 0 <= days_ago < days:
-                        usage = await self.redis.get(key)
-                        if usage:
-                            user_totals[user_id] = user_totals.get(user_id, 0) + int(usage)
-                except:
-                    continue
-
-        # 排序并返回 Top N
-        sorted_users = sorted(
-            user_totals.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:limit]
+        dates = self._recent_dates(days)
+        if days == 1:
+            top = await self.redis.zrevrange(self._leaderboard_key(dates[0]), 0, limit - 1, withscores=True)
+        else:
+            # 在服务端合并多日排行榜，一次往返
+            union_key = f"{self.LEADERBOARD_PREFIX}:union:{days}:{dates[0]}"
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(union_key, [self._leaderboard_key(d) for d in dates])
+                pipe.zrevrange(union_key, 0, limit - 1, withscores=True)
+                pipe.delete(union_key)
+                _, top, _ = await pipe.execute()
 
         return [
-            {"user_id": uid, "total_tokens": tokens}
-            for uid, tokens in sorted_users
+            {
+                "user_id": uid.decode("utf-8") if isinstance(uid, bytes) else uid,
+                "total_tokens": int(tokens)
+            }
+            for uid, tokens in top
         ]
 
     async def get_user_details(
@@ -333,28 +338,22 @@ class TokenTracker:
         """
         today = datetime.now().strftime("%Y-%m-%d")
 
-        # 总 Token 使用
-        total_key = f"system:tokens:{today}"
-        total = await self.redis.get(total_key) or 0
-
-        # 模型分布
-        gpt4_key = f"model:tokens:gpt-4:{today}"
-        gpt4 = await self.redis.get(gpt4_key) or 0
-
-        gpt35_key = f"model:tokens:gpt-3.5-turbo:{today}"
-        gpt35 = await self.redis.get(gpt35_key) or 0
-
-        # 活跃用户数
-        active_users = 0
-        async for key in self.redis.scan_iter(match="user:daily_tokens:*:today"):
-            active_users += 1
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # 总 Token 使用
+            pipe.get(f"system:tokens:{today}")
+            # 模型分布
+            pipe.get(f"model:tokens:gpt-4:{today}")
+            pipe.get(f"model:tokens:gpt-3.5-turbo:{today}")
+            # 活跃用户数
+            pipe.zcard(self._leaderboard_key(today))
+            total, gpt4, gpt35, active_users = await pipe.execute()
 
         return {
             "date": today,
-            "total_tokens": int(total),
+            "total_tokens": int(total or 0),
             "model_distribution": {
-                "gpt-4": int(gpt4),
-                "gpt-3.5-turbo": int(gpt35)
+                "gpt-4": int(gpt4 or 0),
+                "gpt-3.5-turbo": int(gpt35 or 0)
             },
             "active_users": active_users
         }
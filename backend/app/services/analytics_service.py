@@ -133,6 +133,11 @@ class AnalyticsService:
             
             await self.db.commit()
             await self.db.refresh(metric)
+
+            # 画像摘要依赖每日指标，需重新生成
+            from app.services.learning_summary_service import learning_summary_service
+            await learning_summary_service.invalidate_analytics(user_id)
+
             logger.info(f"Daily metrics calculated successfully for user {user_id}")
             return metric
         except Exception as e:
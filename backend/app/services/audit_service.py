@@ -3,6 +3,7 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.auth_cache import auth_user_cache
 from app.models.user import User, AvatarStatus
 from app.services.notification_service import NotificationService
 from app.schemas.notification import NotificationCreate
@@ -29,6 +30,7 @@ class AuditService:
         
         db.add(user)
         await db.commit()
+        await auth_user_cache.invalidate(user_id)
         await db.refresh(user)
         
         # 发送通知
@@ -58,6 +60,7 @@ class AuditService:
         
         db.add(user)
         await db.commit()
+        await auth_user_cache.invalidate(user_id)
         await db.refresh(user)
         
         # 发送通知
@@ -2,77 +2,98 @@
 BillingWorker - 异步计费任务处理器
 
 负责从 Redis 队列中消费 Token 使用记录，并批量持久化到数据库中。
+
+可靠性:
+- 每次用 Lua 脚本原子地把最多 batch_size 条记录从 queue:billing 移到
+  该消费者自己的处理中列表 queue:billing:processing:{consumer}
+- 数据库事务提交后才删除处理中列表；进程崩溃后，同名消费者重启时先重放该列表
+- 写入使用 INSERT ... ON CONFLICT (request_id) DO NOTHING，重放不会重复计费
 """
 
 import json
 import asyncio
+import socket
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+from uuid import UUID
 from loguru import logger
 import redis.asyncio as redis
-from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.models.chat import TokenUsage
 from app.config import settings
 
+# token_usage 的 String(100) 列；超长的记录在转换时丢弃
+MAX_ID_LENGTH = 100
+
+BILLING_QUEUE = "queue:billing"
+PROCESSING_PREFIX = "queue:billing:processing:"
+
+# 原子地取出队首最多 N 条并追加到处理中列表
+_CLAIM_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+
 class BillingWorker:
     """
     异步计费工作器
-    
+
     采用批量写入策略减少数据库压力，支持异常重试。
+    concurrency > 1 时在同一进程内并行运行多个消费者，每个消费者有独立的处理中列表。
     """
-    
+
     def __init__(
-        self, 
+        self,
         redis_url: str = settings.REDIS_URL,
         redis_password: str = settings.REDIS_PASSWORD,
         db_url: str = settings.DATABASE_URL,
-        batch_size: int = 10,
-        flush_interval: int = 5
+        batch_size: int = 500,
+        flush_interval: int = 1,
+        concurrency: int = 1,
+        worker_name: Optional[str] = None
     ):
         self.redis_url = redis_url
         self.batch_size = batch_size
         self.flush_interval = flush_interval
-        
+        self.concurrency = concurrency
+        # 名称需在重启后保持不变，才能找回崩溃前未提交的处理中列表
+        self.worker_name = worker_name or socket.gethostname()
+
         # 初始化 Redis
         self.redis = redis.from_url(redis_url, password=redis_password)
-        
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+
         # 初始化数据库引擎和会话工厂
         self.engine = create_async_engine(db_url)
         self.async_session_factory = sessionmaker(
             self.engine, expire_on_commit=False, class_=AsyncSession
         )
-        
+
         self.is_running = False
-        self._batch: List[Dict[str, Any]] = []
-        self._last_flush_time = time.time()
-        
+        self.processed = 0
+
     async def start(self):
         """启动工作器"""
-        logger.info(f"BillingWorker starting... (batch_size={self.batch_size}, flush_interval={self.flush_interval})")
+        logger.info(
+            f"BillingWorker starting... (batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval}, concurrency={self.concurrency})"
+        )
         self.is_running = True
-        
+
         try:
-            while self.is_running:
-                # 尝试从队列获取任务，超时 1 秒
-                result = await self.redis.blpop("queue:billing", timeout=1)
-                
-                if result:
-                    _, data = result
-                    try:
-                        record = json.loads(data)
-                        self._batch.append(record)
-                        logger.debug(f"Added record to batch. Current size: {len(self._batch)}")
-                    except Exception as e:
-                        logger.error(f"Failed to parse billing record: {e}")
-                
-                # 检查是否需要刷新到数据库
-                if self._should_flush():
-                    await self._flush_to_db()
-                    
+            await asyncio.gather(*(
+                self._consume(f"{self.worker_name}:{i}") for i in range(self.concurrency)
+            ))
         except asyncio.CancelledError:
             logger.info("BillingWorker stopping (cancelled)...")
         except Exception as e:
@@ -80,102 +101,114 @@ class BillingWorker:
             raise
         finally:
             self.is_running = False
-            # 停止前尝试刷新最后一批
-            if self._batch:
-                await self._flush_to_db()
             await self.redis.close()
             await self.engine.dispose()
             logger.info("BillingWorker stopped.")
 
-    def _should_flush(self) -> bool:
-        """判断是否应该刷新批处理"""
-        if not self._batch:
-            return False
-            
-        # 达到批大小
-        if len(self._batch) >= self.batch_size:
-            return True
-            
-        # 超过刷新时间间隔
-        if time.time() - self._last_flush_time >= self.flush_interval:
-            return True
-            
-        return False
-
-    async def _flush_to_db(self):
-        """将批处理中的记录持久化到数据库"""
-        if not self._batch:
+    async def _consume(self, consumer: str):
+        """单个消费者循环"""
+        processing_key = f"{PROCESSING_PREFIX}{consumer}"
+
+        # 先重放上次崩溃前未提交的记录
+        pending = await self.redis.lrange(processing_key, 0, -1)
+        if pending:
+            logger.warning(f"[{consumer}] Replaying {len(pending)} unacknowledged billing records")
+            await self._flush_until_done(processing_key, pending)
+
+        while self.is_running:
+            items = await self._claim(keys=[BILLING_QUEUE, processing_key], args=[self.batch_size])
+            if items:
+                await self._flush_until_done(processing_key, items)
+
+            # 队列已取空时等待，避免空转
+            if len(items) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+
+    async def _flush_until_done(self, processing_key: str, items: List[bytes]):
+        """写入数据库直至成功，然后确认（删除处理中列表）"""
+        rows = self._parse(items)
+        delay = self.flush_interval
+        while True:
+            try:
+                await self._flush_to_db(rows)
+                break
+            except Exception as e:
+                if not self.is_running:
+                    # 停止时不再重试，记录留在处理中列表，下次启动重放
+                    logger.warning(f"Leaving {len(rows)} billing records in {processing_key}: {e}")
+                    return
+                logger.error(f"Failed to persist billing records, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+        await self.redis.delete(processing_key)
+        self.processed += len(rows)
+
+    @classmethod
+    def _parse(cls, items: List[bytes]) -> List[Dict[str, Any]]:
+        """
+        解析并转换为数据库行
+
+        无法解析或缺少字段 / 类型不符的记录记日志后丢弃：它们永远无法写入，
+        留在批次中只会让整批无限重试、处理中列表永远得不到确认
+        """
+        rows = []
+        for data in items:
+            try:
+                rows.append(cls._to_row(json.loads(data)))
+            except Exception as e:
+                logger.error(f"Dropping malformed billing record {data[:200]!r}: {e!r}")
+        return rows
+
+    @staticmethod
+    def _to_row(r: Dict[str, Any]) -> Dict[str, Any]:
+        """转换记录格式以匹配模型（缺少字段或类型不符时抛出异常）"""
+        timestamp = datetime.utcfromtimestamp(r["timestamp"]) if r.get("timestamp") else datetime.utcnow()
+        strings = {field: str(r[field]) for field in ("session_id", "request_id", "model")}
+        for field, value in strings.items():
+            if len(value) > MAX_ID_LENGTH:
+                raise ValueError(f"{field} longer than {MAX_ID_LENGTH} characters")
+        return {
+            "user_id": UUID(str(r["user_id"])),
+            **strings,
+            "prompt_tokens": int(r["prompt_tokens"]),
+            "completion_tokens": int(r["completion_tokens"]),
+            "total_tokens": int(r["total_tokens"]),
+            "cost": float(r.get("cost") or 0.0),
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+
+    async def _flush_to_db(self, rows: List[Dict[str, Any]]):
+        """将一批（已转换的）记录持久化到数据库"""
+        if not rows:
             return
-            
-        logger.info(f"Flushing {len(self._batch)} records to database...")
+
         start_time = time.time()
-        
+        # executemany 由 SQLAlchemy 合并为多行 INSERT；重复的 request_id 直接跳过
+        stmt = pg_insert(TokenUsage).on_conflict_do_nothing(index_elements=[TokenUsage.request_id])
+
         try:
             async with self.async_session_factory() as session:
                 async with session.begin():
-                    # 转换记录格式以匹配模型，并处理可能的 UUID 转换或时间格式转换
-                    stmt_data = []
-                    for r in self._batch:
-                        stmt_data.append({
-                            "user_id": r["user_id"],
-                            "session_id": r["session_id"],
-                            "request_id": r["request_id"],
-                            "model": r["model"],
-                            "prompt_tokens": r["prompt_tokens"],
-                            "completion_tokens": r["completion_tokens"],
-                            "total_tokens": r["total_tokens"],
-                            "cost": r.get("cost", 0.0),
-                            "timestamp": datetime.fromtimestamp(r["timestamp"]) if "timestamp" in r else datetime.utcnow()
-                        })
-                    
-                    # 批量插入
-                    await session.execute(insert(TokenUsage), stmt_data)
-                
-                await session.commit()
-                
-            logger.info(f"Successfully persisted {len(self._batch)} records in {time.time() - start_time:.3f}s")
-            self._batch = []
-            self._last_flush_time = time.time()
-            
-        except Exception as e:
-            logger.error(f"Failed to persist billing records: {e}")
-            # 如果是唯一约束冲突（可能是重复请求），尝试逐条插入或记录错误
-            if "duplicate key" in str(e).lower() or "unique constraint" in str(e).lower():
-                logger.warning("Duplicate key detected, retrying individual records...")
-                await self._retry_individually()
-            else:
-                # 其他错误则保留在批中待下次重试（需谨慎处理，防止死循环）
-                logger.error("Keeping records in batch for retry...")
-
-    async def _retry_individually(self):
-        """逐条重试插入，跳过已存在的记录"""
+                    await session.execute(stmt, rows)
+        except (IntegrityError, DataError) as e:
+            # 外键、列类型等数据错误：逐条写入，只丢弃有问题的记录
+            logger.warning(f"Bulk billing insert rejected ({e.orig}), retrying individually...")
+            await self._retry_individually(stmt, rows)
+
+        logger.info(f"Persisted {len(rows)} billing records in {time.time() - start_time:.3f}s")
+
+    async def _retry_individually(self, stmt, rows: List[Dict[str, Any]]):
+        """逐条重试插入，跳过无法写入的记录"""
         async with self.async_session_factory() as session:
-            for r in self._batch:
-                try:
-                    async with session.begin_nested():
-                        stmt_data = {
-                            "user_id": r["user_id"],
-                            "session_id": r["session_id"],
-                            "request_id": r["request_id"],
-                            "model": r["model"],
-                            "prompt_tokens": r["prompt_tokens"],
-                            "completion_tokens": r["completion_tokens"],
-                            "total_tokens": r["total_tokens"],
-                            "cost": r.get("cost", 0.0),
-                            "timestamp": datetime.fromtimestamp(r["timestamp"]) if "timestamp" in r else datetime.utcnow()
-                        }
-                        await session.execute(insert(TokenUsage), stmt_data)
-                    await session.commit()
-                except Exception as e:
-                    if "duplicate key" in str(e).lower() or "unique constraint" in str(e).lower():
-                        logger.debug(f"Skipping duplicate request_id: {r['request_id']}")
-                    else:
-                        logger.error(f"Failed to persist individual record {r['request_id']}: {e}")
-            
-            await session.commit()
-            
-        self._batch = []
-        self._last_flush_time = time.time()
+            async with session.begin():
+                for row in rows:
+                    try:
+                        async with session.begin_nested():
+                            await session.execute(stmt, row)
+                    except (IntegrityError, DataError) as e:
+                        logger.error(f"Dropping billing record {row['request_id']}: {e.orig}")
 
     def stop(self):
         """停止工作器"""
@@ -184,4 +217,4 @@ class BillingWorker:
 if __name__ == "__main__":
     # 简单的本地运行逻辑
     worker = BillingWorker()
-    asyncio.run(worker.start())
\ No newline at end of file
+    asyncio.run(worker.start())
@@ -0,0 +1,286 @@
+"""
+知识块增量索引服务 (Chunk Index Service)
+
+维护 RediSearch idx:knowledge 下的 sparkle:chunk:{node_id}:{i} 文档：
+- 节点创建/更新时通过 stream:chunk_index 事件触发增量索引 (ChunkIndexWorker 消费)
+- 每个节点在 sparkle:chunkmeta:{node_id} 中记录各块的内容哈希，未变化的块直接跳过
+- 需要写入的块合并为一次批量向量化，JSON.SET 与清理过期块通过 pipeline 提交
+- reconcile() 为全量对账模式：按主键分页扫描，游标持久化在 Redis，可中断后续跑
+"""
+
+import hashlib
+import json
+from typing import List, Dict, Any, Iterable, Optional
+from uuid import UUID
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from app.core.cache import cache_service
+from app.core.redis_search_client import redis_search_client
+from app.db.session import AsyncSessionLocal
+from app.models.galaxy import KnowledgeNode
+from app.services.embedding_service import embedding_service
+
+CHUNK_INDEX_STREAM = "stream:chunk_index"
+CHUNK_PREFIX = "sparkle:chunk:"
+CHUNK_META_PREFIX = "sparkle:chunkmeta:"
+RECONCILE_CURSOR_KEY = "sparkle:chunk_reconcile:cursor"
+
+EVENT_UPSERTED = "node_upserted"
+EVENT_DELETED = "node_deleted"
+
+_NODE_COLUMNS = (
+    KnowledgeNode.id,
+    KnowledgeNode.name,
+    KnowledgeNode.description,
+    KnowledgeNode.keywords,
+    KnowledgeNode.subject_id,
+    KnowledgeNode.importance_level,
+)
+
+
+def _doc_hash(doc: Dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(doc, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class ChunkIndexer:
+    """idx:knowledge 的增量索引引擎"""
+
+    PIPELINE_SIZE = 100  # 每个 pipeline 最多的写命令数
+
+    def __init__(self):
+        # 与 scripts/sync_pg_to_redis.py 历史数据保持一致的切分参数
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=400,  # Approx 100-200 tokens
+            chunk_overlap=50,
+            separators=["\n\n", "\n", "。", ".", " ", ""]
+        )
+
+    @property
+    def redis(self):
+        return redis_search_client.redis
+
+    # ==========================================
+    # 事件
+    # ==========================================
+
+    async def enqueue(self, node_ids: Iterable[UUID], event_type: str = EVENT_UPSERTED):
+        """发布节点变更事件（失败不影响主流程，由 reconcile 兜底）"""
+        redis = cache_service.redis
+        if not redis:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for node_id in node_ids:
+                    pipe.xadd(
+                        CHUNK_INDEX_STREAM,
+                        {"type": event_type, "node_id": str(node_id)},
+                        maxlen=10000,
+                        approximate=True
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to enqueue chunk index events: {e}")
+
+    # ==========================================
+    # 索引
+    # ==========================================
+
+    def build_documents(self, node: KnowledgeNode) -> List[Dict[str, Any]]:
+        """将节点切分为块文档（不含向量）"""
+        if not node.description:
+            return []
+
+        keywords = node.keywords if isinstance(node.keywords, list) else []
+        docs = []
+        for i, chunk_text in enumerate(self.splitter.split_text(node.description)):
+            key = f"{CHUNK_PREFIX}{node.id}:{i}"
+            docs.append({
+                "id": key,
+                "parent_id": str(node.id),
+                "parent_name": node.name,
+                "content": chunk_text,
+                "keywords": " ".join([node.name, *map(str, keywords)]),
+                "subject_id": node.subject_id if node.subject_id else 0,
+                "importance": node.importance_level,
+            })
+        return docs
+
+    async def index_nodes(self, nodes: List[KnowledgeNode]) -> Dict[str, int]:
+        """
+        增量索引一批节点
+
+        Returns:
+            {"nodes": int, "written": int, "skipped": int, "deleted": int}
+        """
+        stats = {"nodes": len(nodes), "written": 0, "skipped": 0, "deleted": 0}
+        if not nodes:
+            return stats
+
+        documents = {str(node.id): self.build_documents(node) for node in nodes}
+        manifests = await self._load_manifests(list(documents))
+
+        to_write = []  # (node_id, index, doc, hash)
+        stale = []  # (node_id, index)
+        for node_id, docs in documents.items():
+            manifest = manifests.get(node_id, {})
+            for i, doc in enumerate(docs):
+                digest = _doc_hash(doc)
+                if manifest.get(str(i)) == digest:
+                    stats["skipped"] += 1
+                else:
+                    to_write.append((node_id, i, doc, digest))
+            stale.extend(
+                (node_id, int(i)) for i in manifest if int(i) >= len(docs)
+            )
+
+        # 一次批量向量化（embedding_service 内部按内容哈希去重并缓存）
+        vectors = []
+        if to_write:
+            vectors = await embedding_service.batch_embeddings([doc["content"] for _, _, doc, _ in to_write])
+
+        commands = []
+        for (node_id, i, doc, digest), vector in zip(to_write, vectors):
+            commands.append(("set", doc["id"], {**doc, "vector": vector}))
+            commands.append(("meta", node_id, str(i), digest))
+        for node_id, i in stale:
+            commands.append(("delete", f"{CHUNK_PREFIX}{node_id}:{i}", node_id, str(i)))
+
+        await self._execute(commands)
+
+        stats["written"] = len(to_write)
+        stats["deleted"] = len(stale)
+        return stats
+
+    async def remove_nodes(self, node_ids: Iterable[str]) -> int:
+        """删除节点的全部块"""
+        node_ids = [str(nid) for nid in node_ids]
+        manifests = await self._load_manifests(node_ids)
+        commands = []
+        for node_id in node_ids:
+            for i in manifests.get(node_id, {}):
+                commands.append(("delete", f"{CHUNK_PREFIX}{node_id}:{i}", node_id, i))
+        await self._execute(commands)
+        return len(commands)
+
+    async def _load_manifests(self, node_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for node_id in node_ids:
+                pipe.hgetall(f"{CHUNK_META_PREFIX}{node_id}")
+            results = await pipe.execute()
+        return {node_id: (manifest or {}) for node_id, manifest in zip(node_ids, results)}
+
+    async def _execute(self, commands: List[tuple]):
+        """分批通过 pipeline 执行写命令"""
+        for start in range(0, len(commands), self.PIPELINE_SIZE):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for command in commands[start:start + self.PIPELINE_SIZE]:
+                    if command[0] == "set":
+                        _, key, doc = command
+                        pipe.json().set(key, "$", doc)
+                    elif command[0] == "meta":
+                        _, node_id, index, digest = command
+                        pipe.hset(f"{CHUNK_META_PREFIX}{node_id}", index, digest)
+                    else:
+                        _, key, node_id, index = command
+                        pipe.delete(key)
+                        pipe.hdel(f"{CHUNK_META_PREFIX}{node_id}", index)
+                await pipe.execute()
+
+    # ==========================================
+    # 加载
+    # ==========================================
+
+    async def index_node_ids(self, node_ids: Iterable[UUID]) -> Dict[str, int]:
+        """按 ID 加载节点并索引；不存在或已删除的节点清理其块"""
+        node_ids = list(dict.fromkeys(str(nid) for nid in node_ids))
+        if not node_ids:
+            return {"nodes": 0, "written": 0, "skipped": 0, "deleted": 0}
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(KnowledgeNode)
+                .options(load_only(*_NODE_COLUMNS))
+                .where(
+                    KnowledgeNode.id.in_([UUID(nid) for nid in node_ids]),
+                    KnowledgeNode.deleted_at.is_(None)
+                )
+            )
+            nodes = result.scalars().all()
+
+        stats = await self.index_nodes(nodes)
+        missing = set(node_ids) - {str(node.id) for node in nodes}
+        if missing:
+            stats["deleted"] += await self.remove_nodes(missing)
+        return stats
+
+    async def reconcile(self, batch_size: int = 100, restart: bool = False) -> Dict[str, int]:
+        """
+        全量对账：确保索引与数据库一致
+
+        - 按节点主键分页，每批完成后把游标写入 Redis，中断后从游标继续
+        - 内容未变化的块只比较哈希，不重新向量化、不重写
+        - 最后清理数据库中已不存在（或已软删除）的节点残留的块
+        """
+        totals = {"nodes": 0, "written": 0, "skipped": 0, "deleted": 0}
+        cursor: Optional[str] = None if restart else await self.redis.get(RECONCILE_CURSOR_KEY)
+        if cursor:
+            logger.info(f"Resuming chunk reconciliation after node {cursor}")
+
+        while True:
+            async with AsyncSessionLocal() as db:
+                stmt = (
+                    select(KnowledgeNode)
+                    .options(load_only(*_NODE_COLUMNS))
+                    .where(KnowledgeNode.deleted_at.is_(None))
+                    .order_by(KnowledgeNode.id)
+                    .limit(batch_size)
+                )
+                if cursor:
+                    stmt = stmt.where(KnowledgeNode.id > UUID(cursor))
+                nodes = (await db.execute(stmt)).scalars().all()
+
+            if not nodes:
+                break
+
+            stats = await self.index_nodes(nodes)
+            for key, value in stats.items():
+                totals[key] += value
+
+            cursor = str(nodes[-1].id)
+            await self.redis.set(RECONCILE_CURSOR_KEY, cursor)
+            logger.info(f"Reconciled {totals['nodes']} nodes ({totals['written']} chunks written)")
+
+        totals["deleted"] += await self._prune_orphans(batch_size)
+        await self.redis.delete(RECONCILE_CURSOR_KEY)
+        return totals
+
+    async def _prune_orphans(self, batch_size: int) -> int:
+        """删除数据库中已不存在的节点的块"""
+        indexed = []
+        async for key in self.redis.scan_iter(match=f"{CHUNK_META_PREFIX}*", count=1000):
+            indexed.append(key[len(CHUNK_META_PREFIX):])
+
+        deleted = 0
+        for start in range(0, len(indexed), batch_size):
+            batch = indexed[start:start + batch_size]
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(KnowledgeNode.id).where(
+                        KnowledgeNode.id.in_([UUID(nid) for nid in batch]),
+                        KnowledgeNode.deleted_at.is_(None)
+                    )
+                )
+                alive = {str(nid) for nid in result.scalars().all()}
+            orphans = [nid for nid in batch if nid not in alive]
+            if orphans:
+                deleted += await self.remove_nodes(orphans)
+        return deleted
+
+
+chunk_indexer = ChunkIndexer()
@@ -3,15 +3,24 @@
 实现艾宾浩斯遗忘曲线，让知识点随时间逐渐暗淡
 """
 import math
+import numpy as np
 from uuid import UUID
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
-from sqlalchemy import select, and_, func
+from typing import List, Dict, Optional, Sequence, Tuple, Any
+from loguru import logger
+from sqlalchemy import select, update, and_, or_, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.core.cache import cache_service
+from app.services.learning_summary_service import learning_summary_service
 from app.models.galaxy import UserNodeStatus, KnowledgeNode
 
 
+def _projection_key(user_id: UUID) -> str:
+    return f"{settings.APP_NAME}:decay:projection:{user_id}"
+
+
 class DecayService:
     """
     遗忘曲线衰减服务
@@ -25,6 +34,8 @@ class DecayService:
     BASE_HALF_LIFE_DAYS = 7.0  # 基础半衰期 (天)
     MIN_MASTERY = 5.0  # 最低掌握度 (不会降到 0)
     DECAY_CHECK_INTERVAL = 1  # 检查间隔 (天)
+    CHUNK_SIZE = 5000  # 每日衰减每块处理 (并提交) 的行数
+    PROJECTION_DAYS = 90  # 时光机预计算的天数范围 (0..90)
 
     # 掌握度阈值
     THRESHOLD_DIM = 20.0  # 低于此值星星变暗
@@ -37,52 +48,125 @@ class DecayService:
         """
         每日遗忘衰减任务
 
+        按主键 (user_id, node_id) 键集分页，每块一条 UPDATE ... FROM 语句在数据库端
+        计算指数衰减并 RETURNING 新旧掌握度用于统计，每块单独提交，避免整表加载与长事务。
+
+        已衰减的行会将 last_decayed_at 写为本次运行时间，而候选条件要求它为空或早于当天
+        零点，因此任务中途失败后重跑只会处理剩余的行，同一天内重复执行不会二次衰减。
+        （不使用 updated_at：收藏、坍缩、暂停等操作也会更新它，会让这些行跳过当天的衰减）
+
         Returns:
             dict: 衰减统计 {processed: int, dimmed: int, collapsed: int}
         """
         stats = {'processed': 0, 'dimmed': 0, 'collapsed': 0}
-        now = datetime.now(timezone.utc)
-
-        # 1. 查询需要衰减的节点状态
-        # 条件：已解锁 + 未暂停衰减 + 上次学习超过 1 天
-        query = select(UserNodeStatus).where(
-            and_(
-                UserNodeStatus.is_unlocked == True,
-                UserNodeStatus.decay_paused == False,
-                UserNodeStatus.last_study_at < now - timedelta(days=self.DECAY_CHECK_INTERVAL),
-                UserNodeStatus.mastery_score > self.MIN_MASTERY
+        # 模型时间字段均为 naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        cursor: Optional[Tuple[UUID, UUID]] = None
+        chunks = 0
+        while True:
+            rows = await self._decay_chunk(now, day_start, cursor)
+            if not rows:
+                break
+            await self.db.commit()
+            chunks += 1
+            await learning_summary_service.apply_mastery_changes(
+                (user_id, old_mastery, new_mastery)
+                for user_id, _, old_mastery, new_mastery, _ in rows
             )
-        )
 
-        result = await self.db.execute(query)
-        statuses = result.scalars().all()
+            for user_id, node_id, old_mastery, new_mastery, is_collapsed in rows:
+                stats['processed'] += 1
 
-        # 2. 逐个应用衰减
-        for status in statuses:
-            old_mastery = status.mastery_score
+                # 检查状态变化
+                if old_mastery >= self.THRESHOLD_DIM > new_mastery:
+                    stats['dimmed'] += 1
 
-            # 计算衰减
-            days_elapsed = (now - status.last_study_at).days
-            new_mastery = self._calculate_decay(
-                current_mastery=status.mastery_score,
-                days_elapsed=days_elapsed
-            )
+                if new_mastery < self.THRESHOLD_COLLAPSE and not is_collapsed:
+                    # 标记坍缩风险 (但不自动坍缩)
+                    stats['collapsed'] += 1
 
-            # 更新状态
-            status.mastery_score = new_mastery
-            stats['processed'] += 1
+            cursor = max((row[0], row[1]) for row in rows)
+            if len(rows) < self.CHUNK_SIZE:
+                break
 
-            # 检查状态变化
-            if old_mastery >= self.THRESHOLD_DIM > new_mastery:
-                stats['dimmed'] += 1
+        if stats['processed']:
+            await cache_service.delete_pattern(_projection_key("*"))
 
-            if new_mastery < self.THRESHOLD_COLLAPSE and not status.is_collapsed:
-                # 标记坍缩风险 (但不自动坍缩)
-                stats['collapsed'] += 1
+        logger.debug(f"Decay applied in {chunks} chunks: {stats}")
+        return stats
 
-        await self.db.commit()
+    async def _decay_chunk(
+        self,
+        now: datetime,
+        day_start: datetime,
+        cursor: Optional[Tuple[UUID, UUID]]
+    ) -> List[Tuple]:
+        """
+        衰减下一块候选行
 
-        return stats
+        Returns:
+            [(user_id, node_id, old_mastery, new_mastery, is_collapsed), ...]
+        """
+        # 条件：已解锁 + 未暂停衰减 + 上次学习超过 1 天 + 今天尚未衰减
+        conditions = [
+            UserNodeStatus.is_unlocked == True,
+            UserNodeStatus.decay_paused == False,
+            UserNodeStatus.last_study_at < now - timedelta(days=self.DECAY_CHECK_INTERVAL),
+            UserNodeStatus.mastery_score > self.MIN_MASTERY,
+            or_(UserNodeStatus.last_decayed_at.is_(None), UserNodeStatus.last_decayed_at < day_start),
+        ]
+        if cursor is not None:
+            conditions.append(
+                tuple_(UserNodeStatus.user_id, UserNodeStatus.node_id) > tuple_(*cursor)
+            )
+
+        chunk = (
+            select(
+                UserNodeStatus.user_id,
+                UserNodeStatus.node_id,
+                UserNodeStatus.mastery_score.label('old_mastery'),
+            )
+            .where(and_(*conditions))
+            .order_by(UserNodeStatus.user_id, UserNodeStatus.node_id)
+            .limit(self.CHUNK_SIZE)
+            .subquery()
+        )
+
+        stmt = (
+            update(UserNodeStatus)
+            .where(
+                UserNodeStatus.user_id == chunk.c.user_id,
+                UserNodeStatus.node_id == chunk.c.node_id,
+            )
+            .values(
+                mastery_score=self._decay_expression(UserNodeStatus.mastery_score, now),
+                last_decayed_at=now,
+                updated_at=now,
+            )
+            .returning(
+                UserNodeStatus.user_id,
+                UserNodeStatus.node_id,
+                chunk.c.old_mastery,
+                UserNodeStatus.mastery_score,
+                UserNodeStatus.is_collapsed,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        result = await self.db.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    def _decay_expression(self, mastery, now: datetime):
+        """_calculate_decay 的 SQL 版本，在数据库端逐行计算"""
+        days_elapsed = func.floor(
+            func.extract('epoch', now - UserNodeStatus.last_study_at) / 86400.0
+        )
+        # 动态半衰期：掌握度越高，半衰期越长
+        effective_half_life = self.BASE_HALF_LIFE_DAYS * (1 + (mastery / 100.0) * 2.0)
+        decay_rate = math.log(2) / effective_half_life
+        return func.greatest(mastery * func.exp(-decay_rate * days_elapsed), self.MIN_MASTERY)
 
     def _calculate_decay(self, current_mastery: float, days_elapsed: int) -> float:
         """
@@ -105,6 +189,22 @@ class DecayService:
 
         return max(decayed_mastery, self.MIN_MASTERY)
 
+    def _project_matrix(self, mastery: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        _calculate_decay 的向量化版本
+
+        Args:
+            mastery: 各节点当前掌握度, shape (n,)
+            days: 衰减天数, shape (d,)
+
+        Returns:
+            shape (n, d) 的未来掌握度矩阵
+        """
+        stability_factor = 1 + (mastery / 100) * 2
+        decay_rate = math.log(2) / (self.BASE_HALF_LIFE_DAYS * stability_factor)
+        retention = np.exp(-np.outer(decay_rate, days))
+        return np.maximum(mastery[:, None] * retention, self.MIN_MASTERY)
+
     async def get_review_suggestions(self, user_id: UUID, limit: int = 5) -> List[Dict]:
         """
         获取复习建议
@@ -149,6 +249,57 @@ class DecayService:
 
         return suggestions
 
+    async def get_review_counts(
+        self,
+        user_ids: Sequence[UUID],
+        per_user: int = 5
+    ) -> List[Tuple[UUID, int, int]]:
+        """
+        批量统计待复习节点 (每日复习提醒用)
+
+        一条窗口查询：每个用户按掌握度升序取前 per_user 个到期节点
+        (与 get_review_suggestions 的选取一致)，再按用户聚合。
+
+        Returns:
+            [(user_id, 建议复习数, 其中紧急数), ...]，只包含有到期节点的用户
+        """
+        if not user_ids:
+            return []
+
+        # 模型时间字段均为 naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        ranked = (
+            select(
+                UserNodeStatus.user_id,
+                UserNodeStatus.mastery_score,
+                func.row_number().over(
+                    partition_by=UserNodeStatus.user_id,
+                    order_by=UserNodeStatus.mastery_score.asc()
+                ).label('rank')
+            )
+            .where(
+                and_(
+                    UserNodeStatus.user_id.in_(user_ids),
+                    UserNodeStatus.is_unlocked == True,
+                    UserNodeStatus.next_review_at <= now
+                )
+            )
+            .subquery()
+        )
+        query = (
+            select(
+                ranked.c.user_id,
+                func.count(),
+                func.count().filter(ranked.c.mastery_score < self.THRESHOLD_DIM)
+            )
+            .where(ranked.c.rank <= per_user)
+            .group_by(ranked.c.user_id)
+            .order_by(ranked.c.user_id)
+        )
+
+        result = await self.db.execute(query)
+        return [(user_id, total, urgent) for user_id, total, urgent in result.all()]
+
     async def pause_decay(self, user_id: UUID, node_id: UUID, pause: bool = True):
         """暂停/恢复特定节点的衰减"""
         query = select(UserNodeStatus).where(
@@ -163,6 +314,7 @@ class DecayService:
         if status:
             status.decay_paused = pause
             await self.db.commit()
+            await self.invalidate_projection(user_id)
 
     async def get_decay_stats(self, user_id: UUID) -> Dict[str, any]:
         """
@@ -214,6 +366,77 @@ class DecayService:
 
     # ========== 必杀技 B: 时光机功能 ==========
 
+    async def _get_projection(self, user_id: UUID) -> Dict[str, Any]:
+        """
+        获取用户的衰减预测矩阵
+
+        一次查询加载用户所有已解锁节点，计算 (节点 × 0..PROJECTION_DAYS 天) 的掌握度矩阵，
+        按用户缓存；spark / 暂停衰减 / 每日衰减时失效。拖动时光机滑块只需读取一列。
+        """
+        key = _projection_key(user_id)
+        projection = await cache_service.get(key)
+        if projection is not None:
+            return projection
+
+        query = (
+            select(
+                UserNodeStatus.node_id,
+                KnowledgeNode.name,
+                UserNodeStatus.mastery_score,
+                UserNodeStatus.decay_paused,
+            )
+            .join(KnowledgeNode, UserNodeStatus.node_id == KnowledgeNode.id)
+            .where(
+                and_(
+                    UserNodeStatus.user_id == user_id,
+                    UserNodeStatus.is_unlocked == True
+                )
+            )
+        )
+        result = await self.db.execute(query)
+        rows = result.all()
+
+        mastery = np.array([row.mastery_score for row in rows], dtype=np.float64)
+        paused = np.array([bool(row.decay_paused) for row in rows], dtype=bool)
+        days = np.arange(self.PROJECTION_DAYS + 1, dtype=np.float64)
+
+        matrix = self._project_matrix(mastery, days)
+        # 暂停衰减的节点保持当前掌握度
+        matrix[paused] = mastery[paused, None]
+
+        projection = {
+            'node_ids': [row.node_id for row in rows],
+            'node_names': [row.name for row in rows],
+            'mastery': mastery,
+            'paused': paused,
+            'matrix': matrix,
+        }
+        await cache_service.set(key, projection, ttl=settings.DECAY_PROJECTION_CACHE_TTL)
+        return projection
+
+    @staticmethod
+    async def invalidate_projection(user_id: UUID):
+        """用户掌握度变化后使时光机预测缓存失效"""
+        await cache_service.delete(_projection_key(user_id))
+
+    def _build_projections(
+        self,
+        projection: Dict[str, Any],
+        current: np.ndarray,
+        future: np.ndarray,
+        intervened: Optional[np.ndarray] = None
+    ) -> Dict[str, Dict[str, any]]:
+        projections = {}
+        for i, (node_id, node_name) in enumerate(zip(projection['node_ids'], projection['node_names'])):
+            projections[str(node_id)] = self._generate_visual_state(
+                node_id=str(node_id),
+                node_name=node_name,
+                current_mastery=float(current[i]),
+                future_mastery=float(future[i]),
+                is_intervened=bool(intervened[i]) if intervened is not None else False
+            )
+        return projections
+
     async def project_decay_future(
         self,
         user_id: UUID,
@@ -237,59 +460,17 @@ class DecayService:
                 }
             }
         """
-        now = datetime.now(timezone.utc)
-
-        # 查询用户所有已解锁的节点
-        query = (
-            select(UserNodeStatus, KnowledgeNode)
-            .join(KnowledgeNode, UserNodeStatus.node_id == KnowledgeNode.id)
-            .where(
-                and_(
-                    UserNodeStatus.user_id == user_id,
-                    UserNodeStatus.is_unlocked == True
-                )
-            )
-        )
+        projection = await self._get_projection(user_id)
+        mastery = projection['mastery']
 
-        result = await self.db.execute(query)
-        rows = result.all()
-
-        projections = {}
-
-        for status, node in rows:
-            current_mastery = status.mastery_score
-
-            # 计算从现在到未来的衰减
-            days_since_last_study = (now - status.last_study_at).days if status.last_study_at else 0
-            total_days_elapsed = days_since_last_study + days_ahead
-
-            # 预测未来掌握度（不考虑复习）
-            future_mastery = self._calculate_decay(
-                current_mastery=current_mastery,
-                days_elapsed=total_days_elapsed
-            )
-
-            # 恢复到未衰减前的基线再计算
-            # 简化：直接基于当前状态预测
-            if not status.decay_paused:
-                future_mastery = self._calculate_decay(
-                    current_mastery=current_mastery,
-                    days_elapsed=days_ahead
-                )
-            else:
-                future_mastery = current_mastery  # 暂停衰减
-
-            # 生成前端可视化属性
-            projection = self._generate_visual_state(
-                node_id=str(node.id),
-                node_name=node.name,
-                current_mastery=current_mastery,
-                future_mastery=future_mastery
-            )
-
-            projections[str(node.id)] = projection
+        if days_ahead <= self.PROJECTION_DAYS:
+            future = projection['matrix'][:, days_ahead]
+        else:
+            # 超出预计算范围时单独计算一列
+            future = self._project_matrix(mastery, np.array([float(days_ahead)]))[:, 0]
+            future = np.where(projection['paused'], mastery, future)
 
-        return projections
+        return self._build_projections(projection, mastery, future)
 
     async def simulate_intervention(
         self,
@@ -310,55 +491,16 @@ class DecayService:
         Returns:
             dict: 与 project_decay_future 相同格式的预测结果
         """
-        now = datetime.now(timezone.utc)
+        projection = await self._get_projection(user_id)
+        mastery = projection['mastery']
 
-        query = (
-            select(UserNodeStatus, KnowledgeNode)
-            .join(KnowledgeNode, UserNodeStatus.node_id == KnowledgeNode.id)
-            .where(
-                and_(
-                    UserNodeStatus.user_id == user_id,
-                    UserNodeStatus.is_unlocked == True
-                )
-            )
-        )
-
-        result = await self.db.execute(query)
-        rows = result.all()
-
-        projections = {}
-
-        for status, node in rows:
-            current_mastery = status.mastery_score
+        # 假设复习后掌握度提升，从提升后的掌握度开始衰减；未复习的节点正常衰减
+        targets = set(node_ids)
+        intervened = np.array([nid in targets for nid in projection['node_ids']], dtype=bool)
+        start = np.where(intervened, np.minimum(mastery + review_boost, 100.0), mastery)
+        future = self._project_matrix(start, np.array([float(days_ahead)]))[:, 0]
 
-            # 如果这个节点被复习
-            if node.id in node_ids:
-                # 假设复习后掌握度提升
-                boosted_mastery = min(current_mastery + review_boost, 100.0)
-
-                # 从提升后的掌握度开始衰减
-                future_mastery = self._calculate_decay(
-                    current_mastery=boosted_mastery,
-                    days_elapsed=days_ahead
-                )
-            else:
-                # 未复习，正常衰减
-                future_mastery = self._calculate_decay(
-                    current_mastery=current_mastery,
-                    days_elapsed=days_ahead
-                )
-
-            projection = self._generate_visual_state(
-                node_id=str(node.id),
-                node_name=node.name,
-                current_mastery=current_mastery,
-                future_mastery=future_mastery,
-                is_intervened=node.id in node_ids
-            )
-
-            projections[str(node.id)] = projection
-
-        return projections
+        return self._build_projections(projection, mastery, future, intervened)
 
     def _generate_visual_state(
         self,
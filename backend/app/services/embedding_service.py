@@ -1,12 +1,25 @@
 """
 向量嵌入服务 (Embedding Service)
 用于将文本转换为向量表示，支持语义搜索
+
+性能设计：
+- 长连接池：进程内复用同一个 httpx.AsyncClient
+- 请求合并：时间窗口内的并发 get_embedding 调用合并为一次 /v1/embeddings 请求
+- 向量缓存：按内容哈希的进程内 LRU + Redis 两级缓存，相同文本不重复请求提供商
 """
-from typing import List
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
 import httpx
+import numpy as np
+from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.config import settings
+from app.core.cache import cache_service
+from app.core.metrics import CACHE_HIT_COUNT
 
 
 class EmbeddingService:
@@ -19,6 +32,8 @@ class EmbeddingService:
     - OpenAI (备用)
     """
 
+    CACHE_PREFIX = "embedding:"
+
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         self.api_key = settings.LLM_API_KEY
@@ -26,31 +41,137 @@ class EmbeddingService:
         self.embedding_model = settings.EMBEDDING_MODEL
         self.embedding_dim = settings.EMBEDDING_DIM
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
+        self.max_batch_size = settings.EMBEDDING_MAX_BATCH_SIZE
+        self.batch_window = settings.EMBEDDING_BATCH_WINDOW_MS / 1000
+        self.cache_size = settings.EMBEDDING_CACHE_SIZE
+        self.cache_ttl = settings.EMBEDDING_CACHE_TTL
+
+        # 长连接池（按事件循环懒加载）
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 进程内 LRU: content_hash -> vector
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        # 微批处理队列: (text, future)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+
+    # ==========================================
+    # 连接池
+    # ==========================================
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取长连接客户端（跨事件循环时重建）"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(
+                    max_connections=settings.EMBEDDING_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.EMBEDDING_MAX_CONNECTIONS,
+                ),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def close(self):
+        """关闭连接池"""
+        if self._client and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    # ==========================================
+    # 缓存
+    # ==========================================
+
+    def _content_hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.embedding_model}:{text}".encode()).hexdigest()
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+        return vector
+
+    def _lru_put(self, key: str, vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+    async def _redis_get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """从 Redis 批量读取向量（FLOAT32 二进制）"""
+        if not keys or not cache_service.redis:
+            return {}
+        try:
+            blobs = await cache_service.redis.mget([f"{self.CACHE_PREFIX}{k}" for k in keys])
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return {}
+        return {
+            key: np.frombuffer(blob, dtype=np.float32).tolist()
+            for key, blob in zip(keys, blobs)
+            if blob
+        }
+
+    async def _redis_set_many(self, items: Dict[str, List[float]]):
+        """批量写入 Redis 向量缓存"""
+        if not items or not cache_service.redis:
+            return
+        try:
+            pipe = cache_service.redis.pipeline(transaction=False)
+            for key, vector in items.items():
+                pipe.set(
+                    f"{self.CACHE_PREFIX}{key}",
+                    np.asarray(vector, dtype=np.float32).tobytes(),
+                    ex=self.cache_ttl,
+                )
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    # ==========================================
+    # 公共接口
+    # ==========================================
+
     async def get_embedding(self, text: str) -> List[float]:
         """
         获取文本的向量表示
 
+        并发调用会在 EMBEDDING_BATCH_WINDOW_MS 窗口内合并为一次批量请求
+
         Args:
             text: 输入文本
 
         Returns:
             List[float]: 向量 (默认 1536 维)
         """
-        embeddings = await self.batch_embeddings([text])
-        return embeddings[0]
+        vector = self._lru_get(self._content_hash(text))
+        if vector is not None:
+            CACHE_HIT_COUNT.labels(cache_name="embedding", result="hit").inc()
+            return vector
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(loop, delay=0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, delay=self.batch_window)
+
+        return await future
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def batch_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         批量获取文本向量
 
+        先查 LRU 与 Redis 缓存，仅对未命中的去重文本请求提供商，
+        超过 EMBEDDING_MAX_BATCH_SIZE 时分块请求
+
         Args:
             texts: 文本列表
 
@@ -60,25 +181,105 @@ class EmbeddingService:
         if not texts:
             return []
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            # 使用 OpenAI 兼容的 API 格式
-            response = await client.post(
-                f"{self.base_url}/v1/embeddings" if "/v1/embeddings" not in self.base_url else self.base_url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json={
-                    "model": self.embedding_model,
-                    "input": texts
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
+        hashes = [self._content_hash(t) for t in texts]
+        resolved: Dict[str, List[float]] = {}
+
+        # 1. 进程内 LRU
+        for key in set(hashes):
+            vector = self._lru_get(key)
+            if vector is not None:
+                resolved[key] = vector
+
+        # 2. Redis
+        redis_keys = [k for k in dict.fromkeys(hashes) if k not in resolved]
+        from_redis = await self._redis_get_many(redis_keys)
+        for key, vector in from_redis.items():
+            self._lru_put(key, vector)
+        resolved.update(from_redis)
+
+        # 3. 提供商（按内容去重）
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in resolved and key not in missing:
+                missing[key] = text
+
+        CACHE_HIT_COUNT.labels(cache_name="embedding", result="hit").inc(len(texts) - len(missing))
+        if missing:
+            CACHE_HIT_COUNT.labels(cache_name="embedding", result="miss").inc(len(missing))
+
+            keys = list(missing.keys())
+            fetched: Dict[str, List[float]] = {}
+            for start in range(0, len(keys), self.max_batch_size):
+                chunk_keys = keys[start:start + self.max_batch_size]
+                vectors = await self._request_embeddings([missing[k] for k in chunk_keys])
+                fetched.update(zip(chunk_keys, vectors))
+
+            for key, vector in fetched.items():
+                self._lru_put(key, vector)
+            await self._redis_set_many(fetched)
+            resolved.update(fetched)
+
+        return [resolved[k] for k in hashes]
+
+    # ==========================================
+    # 微批处理
+    # ==========================================
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        task = loop.create_task(self._flush_pending())
+        # 持有任务引用，避免被 GC 提前回收
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_pending(self):
+        """将窗口内积累的 get_embedding 请求合并为一次批量请求"""
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        try:
+            vectors = await self.batch_embeddings([text for text, _ in pending])
+        except Exception as e:
+            logger.error(f"Batched embedding request failed ({len(pending)} texts): {e}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(pending, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10)
+    )
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """调用 OpenAI 兼容的 /v1/embeddings 接口"""
+        client = self._get_client()
+        response = await client.post(
+            f"{self.base_url}/v1/embeddings" if "/v1/embeddings" not in self.base_url else self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "model": self.embedding_model,
+                "input": texts
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
 
-            # 按索引顺序返回
-            embeddings = [None] * len(texts)
-            for item in data["data"]:
-                embeddings[item["index"]] = item["embedding"]
+        # 按索引顺序返回
+        embeddings = [None] * len(texts)
+        for item in data["data"]:
+            embeddings[item["index"]] = item["embedding"]
 
-            return embeddings
+        return embeddings
 
     async def _qwen_embedding(self, client: httpx.AsyncClient, text: str) -> List[float]:
         """通义千问 Embedding API"""
@@ -12,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.galaxy import KnowledgeNode, NodeExpansionQueue, NodeRelation, UserNodeStatus
 from app.core.llm_client import llm_client
 from app.services.embedding_service import embedding_service
+from app.services.chunk_index_service import chunk_indexer
 
 
 class ExpansionService:
@@ -305,6 +306,9 @@ relation_to_trigger 可选值: prerequisite (前置知识), related (相关), ap
             new_nodes.append(node)
 
         await self.db.commit()
+
+        # 新节点进入混合检索索引
+        await chunk_indexer.enqueue([node.id for node in new_nodes])
         return new_nodes
 
     async def _find_existing_node(self, name: str) -> Optional[KnowledgeNode]:
@@ -4,7 +4,7 @@
 """
 import asyncio
 from uuid import UUID
-from typing import Optional, List
+from typing import Optional, List, Dict, Iterable, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_, func, or_
 from sqlalchemy.orm import selectinload
@@ -15,7 +15,12 @@ from app.models.subject import Subject
 from app.services.embedding_service import embedding_service
 from app.services.expansion_service import ExpansionService
 from app.services.rerank_service import rerank_service
+from app.services.graph_reasoning_service import prerequisite_graph, PREREQUISITE
+from app.services.decay_service import DecayService
+from app.services.learning_summary_service import learning_summary_service
+from app.services.chunk_index_service import chunk_indexer
 from app.core.cache import cached, cache_service
+from app.db.vector_index import apply_ef_search
 from app.core.redis_search_client import redis_search_client
 from redis.commands.search.query import Query
 from app.config import settings
@@ -37,9 +42,15 @@ class GalaxyService:
     MEMORY_HALF_LIFE_DAYS = 7.0  # 记忆半衰期
     DECAY_THRESHOLD = 10.0  # 低于此值星星变暗
 
+    # 混合检索每路候选数 = limit * factor (限定科目时已预过滤，少取即可)
+    CANDIDATE_FACTOR = 10
+    SCOPED_CANDIDATE_FACTOR = 3
+
     def __init__(self, db: AsyncSession):
         self.db = db
         self.expansion_service = ExpansionService(db)
+        # 请求级 identity map: (user_id, node_id) -> UserNodeStatus | None
+        self._status_map: Dict[Tuple[UUID, UUID], Optional[UserNodeStatus]] = {}
 
     # ==========================================
     # 0. Node & Edge Management (Added for Agent)
@@ -78,6 +89,9 @@ class GalaxyService:
         
         await self.db.commit()
         await self.db.refresh(node)
+        await DecayService.invalidate_projection(user_id)
+        await learning_summary_service.apply_mastery_change(user_id, None, 0)
+        await chunk_indexer.enqueue([node.id])
         return node
 
     async def create_edge(
@@ -97,6 +111,10 @@ class GalaxyService:
         self.db.add(edge)
         await self.db.commit()
         await self.db.refresh(edge)
+
+        # 同步到进程级前置依赖图
+        if relation_type == PREREQUISITE and prerequisite_graph.loaded:
+            prerequisite_graph.add_relation(source_id, target_id)
         return edge
     
     async def keyword_search(
@@ -152,14 +170,19 @@ class GalaxyService:
         
         # 2. Parallel Retrieval (Path A & Path B)
         # We use asyncio.gather to trigger both searches simultaneously
-        vector_limit = limit * 10
-        keyword_limit = limit * 10
-        
+        # 限定科目时两路检索都在 RediSearch 端预过滤，候选已在范围内，无需大量超取
+        factor = self.SCOPED_CANDIDATE_FACTOR if subject_id else self.CANDIDATE_FACTOR
+        vector_limit = limit * factor
+        keyword_limit = limit * factor
+        scope_filter = redis_search_client.build_filter(subject_id=subject_id)
+
         # Path B Query Cleaning
         cleaned_query = " ".join([w for w in query.split() if len(w) > 1])
         if not cleaned_query:
             cleaned_query = "*"
-            
+        if scope_filter:
+            cleaned_query = scope_filter if cleaned_query == "*" else f"({cleaned_query}) {scope_filter}"
+
         bm25_q = (
             Query(cleaned_query)
             .paging(0, keyword_limit)
@@ -170,7 +193,8 @@ class GalaxyService:
         vector_task = redis_search_client.hybrid_search(
             text_query="*", 
             vector=query_embedding,
-            top_k=vector_limit
+            top_k=vector_limit,
+            subject_id=subject_id
         )
         keyword_task = redis_search_client.search(bm25_q)
         
@@ -188,14 +212,20 @@ class GalaxyService:
         # 4. Reranking
         candidates = [item for item, score in fused_results]
         
-        # Extract unique parent_ids to avoid fetching same node multiple times?
-        # But Reranker needs content.
-        
         if use_reranker and candidates:
-            # Rerank the chunks
-            final_chunks = await rerank_service.rerank(query, candidates, top_k=limit)
+            # Rerank the chunks (cross-encoder relevance in [0, 1])
+            ranked = await rerank_service.rerank_with_scores(query, candidates, top_k=limit)
         else:
-            final_chunks = candidates[:limit]
+            ranked = [(item, None) for item in candidates[:limit]]
+
+        # Fall back to RRF scores (normalised to the best candidate) when no reranker score
+        rrf_scores = {str(item.id): score for item, score in fused_results}
+        best_rrf = fused_results[0][1] if fused_results else 1.0
+        final_chunks = [item for item, _ in ranked]
+        chunk_scores = {
+            str(item.id): score if score is not None else rrf_scores.get(str(item.id), 0.0) / best_rrf
+            for item, score in ranked
+        }
             
         # 5. Fetch Nodes from DB
         # We need to map chunks back to KnowledgeNodes
@@ -216,6 +246,11 @@ class GalaxyService:
         nodes_map = {str(node.id): node for node in result.scalars().all()}
         
         # 6. Assemble Result
+        # 一次 IN 查询批量加载所有候选节点的用户状态
+        statuses = await self._get_user_statuses(user_id, [node.id for node in nodes_map.values()])
+
+        from app.schemas.galaxy import SectorCode, NodeBase
+
         search_results = []
         seen_parents = set()
         
@@ -227,14 +262,8 @@ class GalaxyService:
             seen_parents.add(pid)
             node = nodes_map[pid]
             
-            # Use rerank score if available? We don't have it easily from rerank_service (it returns items).
-            # We assign 1.0 or logic based on rank.
-            
-            user_status = await self._get_user_status(user_id, node.id)
-            
             # Format NodeBase
             sector_code_str = node.subject.sector_code if node.subject else 'VOID'
-            from app.schemas.galaxy import SectorCode, NodeBase, UserStatusInfo
             try:
                 sector_enum = SectorCode(sector_code_str)
             except ValueError:
@@ -251,30 +280,10 @@ class GalaxyService:
                 parent_name=node.parent.name if node.parent else None
             )
 
-            # Format UserStatus
-            user_status_info = None
-            if user_status:
-                visual_status = self._calculate_visual_status(user_status)
-                brightness = self._calculate_brightness(user_status)
-
-                user_status_info = UserStatusInfo(
-                    mastery_score=user_status.mastery_score,
-                    total_study_minutes=user_status.total_study_minutes,
-                    study_count=user_status.study_count,
-                    is_unlocked=user_status.is_unlocked,
-                    is_collapsed=user_status.is_collapsed,
-                    is_favorite=user_status.is_favorite,
-                    last_study_at=user_status.last_study_at,
-                    next_review_at=user_status.next_review_at,
-                    decay_paused=user_status.decay_paused,
-                    status=visual_status,
-                    brightness=brightness
-                )
-
             search_results.append(SearchResultItem(
                 node=node_base,
-                similarity=1.0, 
-                user_status=user_status_info
+                similarity=round(float(chunk_scores.get(str(chunk.id), 0.0)), 4),
+                user_status=self._build_user_status_info(statuses.get(node.id))
             ))
             
         return search_results
@@ -284,10 +293,12 @@ class GalaxyService:
         query: str,
         subject_id: Optional[int] = None,
         limit: int = 10,
-        threshold: float = 0.3
+        threshold: float = 0.3,
+        ef_search: Optional[int] = None
     ) -> List[KnowledgeNode]:
         """Internal semantic search that returns KnowledgeNode models"""
         query_embedding = await embedding_service.get_embedding(query)
+        await apply_ef_search(self.db, ef_search)
         
         search_query = (
             select(
@@ -433,7 +444,7 @@ class GalaxyService:
             SparkResult: 包含动画事件和拓展状态
         """
         # 1. 获取或创建用户节点状态
-        status = await self._get_or_create_status(user_id, node_id)
+        status, created = await self._get_or_create_status(user_id, node_id)
 
         # 2. 计算掌握度增量
         node = await self.db.get(KnowledgeNode, node_id)
@@ -504,6 +515,11 @@ class GalaxyService:
         # Pattern: Sparkle:view:get_galaxy_graph:{user_id}:*
         pattern = f"{settings.APP_NAME}:view:get_galaxy_graph:{user_id}:*"
         await cache_service.delete_pattern(pattern)
+        await DecayService.invalidate_projection(user_id)
+        # 新建的状态在提交后才计入摘要（old_mastery 为 None 表示新增节点）
+        await learning_summary_service.apply_mastery_change(
+            user_id, None if created else old_mastery, status.mastery_score
+        )
 
         return SparkResult(
             spark_event=spark_event,
@@ -520,7 +536,8 @@ class GalaxyService:
         query: str,
         subject_id: Optional[int] = None,
         limit: int = 10,
-        threshold: float = 0.3
+        threshold: float = 0.3,
+        ef_search: Optional[int] = None
     ) -> List[SearchResultItem]:
         """
         使用向量相似度搜索知识点
@@ -531,6 +548,7 @@ class GalaxyService:
             subject_id: 可选，限定科目
             limit: 返回数量限制
             threshold: 相似度阈值 (越小越严格)
+            ef_search: HNSW 查询候选数，默认 PGVECTOR_EF_SEARCH
 
         Returns:
             List[SearchResultItem]: 匹配的知识点列表
@@ -538,8 +556,8 @@ class GalaxyService:
         # 1. 获取查询向量
         query_embedding = await embedding_service.get_embedding(query)
 
-        # 2. 向量搜索 (使用 pgvector)
-        from pgvector.sqlalchemy import Vector
+        # 2. 向量搜索 (使用 pgvector HNSW 索引)
+        await apply_ef_search(self.db, ef_search)
 
         search_query = (
             select(
@@ -562,57 +580,35 @@ class GalaxyService:
         matches = result.all()
 
         # 3. 过滤并格式化结果
+        matches = [(node, distance) for node, distance in matches if distance <= threshold]
+        statuses = await self._get_user_statuses(user_id, [node.id for node, _ in matches])
+
+        from app.schemas.galaxy import NodeBase, SectorCode
+
         search_results = []
         for node, distance in matches:
-            if distance <= threshold:
-                user_status = await self._get_user_status(user_id, node.id)
-
-                from app.schemas.galaxy import NodeBase, UserStatusInfo
-
-                # 构建 NodeBase
-                sector_code_str = node.subject.sector_code if node.subject else 'VOID'
-                from app.schemas.galaxy import SectorCode
-                try:
-                    sector_enum = SectorCode(sector_code_str)
-                except ValueError:
-                    sector_enum = SectorCode.VOID
-
-                node_base = NodeBase(
-                    id=node.id,
-                    name=node.name,
-                    name_en=node.name_en,
-                    description=node.description,
-                    importance_level=node.importance_level,
-                    sector_code=sector_enum,
-                    is_seed=node.is_seed
-                )
+            # 构建 NodeBase
+            sector_code_str = node.subject.sector_code if node.subject else 'VOID'
+            try:
+                sector_enum = SectorCode(sector_code_str)
+            except ValueError:
+                sector_enum = SectorCode.VOID
+
+            node_base = NodeBase(
+                id=node.id,
+                name=node.name,
+                name_en=node.name_en,
+                description=node.description,
+                importance_level=node.importance_level,
+                sector_code=sector_enum,
+                is_seed=node.is_seed
+            )
 
-                # 构建 UserStatusInfo
-                user_status_info = None
-                if user_status:
-                    from app.schemas.galaxy import NodeStatus
-                    visual_status = self._calculate_visual_status(user_status)
-                    brightness = self._calculate_brightness(user_status)
-
-                    user_status_info = UserStatusInfo(
-                        mastery_score=user_status.mastery_score,
-                        total_study_minutes=user_status.total_study_minutes,
-                        study_count=user_status.study_count,
-                        is_unlocked=user_status.is_unlocked,
-                        is_collapsed=user_status.is_collapsed,
-                        is_favorite=user_status.is_favorite,
-                        last_study_at=user_status.last_study_at,
-                        next_review_at=user_status.next_review_at,
-                        decay_paused=user_status.decay_paused,
-                        status=visual_status,
-                        brightness=brightness
-                    )
-
-                search_results.append(SearchResultItem(
-                    node=node_base,
-                    similarity=1 - distance,  # 转换为相似度
-                    user_status=user_status_info
-                ))
+            search_results.append(SearchResultItem(
+                node=node_base,
+                similarity=1 - distance,  # 转换为相似度
+                user_status=self._build_user_status_info(statuses.get(node.id))
+            ))
 
         return search_results
 
@@ -622,7 +618,8 @@ class GalaxyService:
     async def auto_classify_task(
         self,
         task_title: str,
-        task_description: Optional[str] = None
+        task_description: Optional[str] = None,
+        ef_search: Optional[int] = None
     ) -> Optional[UUID]:
         """
         根据任务标题自动匹配知识点
@@ -630,6 +627,7 @@ class GalaxyService:
         Args:
             task_title: 任务标题
             task_description: 任务描述 (可选)
+            ef_search: HNSW 查询候选数，默认 PGVECTOR_EF_SEARCH
 
         Returns:
             Optional[UUID]: 匹配的知识节点 ID，无匹配返回 None
@@ -642,8 +640,7 @@ class GalaxyService:
         # 2. 尝试向量匹配
         try:
             embedding = await embedding_service.get_embedding(search_text)
-
-            from pgvector.sqlalchemy import Vector
+            await apply_ef_search(self.db, ef_search)
 
             query = (
                 select(KnowledgeNode.id)
@@ -715,9 +712,13 @@ class GalaxyService:
             best_candidate = None
             best_score = -1.0
 
+            target_statuses = await self._get_user_statuses(
+                user_id, [rel.target_node_id for rel in relations]
+            )
+
             for rel in relations:
                 # 检查目标节点状态
-                target_status = await self._get_user_status(user_id, rel.target_node_id)
+                target_status = target_statuses.get(rel.target_node_id)
                 
                 # 评分逻辑:
                 # 1. 如果未解锁: 优先 (探索新知)
@@ -755,9 +756,10 @@ class GalaxyService:
             )
             fallback_result = await self.db.execute(fallback_query)
             candidates = fallback_result.scalars().all()
+            candidate_statuses = await self._get_user_statuses(user_id, [node.id for node in candidates])
             
             for node in candidates:
-                st = await self._get_user_status(user_id, node.id)
+                st = candidate_statuses.get(node.id)
                 if not st or st.mastery_score < 90:
                     target_node_id = node.id
                     break
@@ -802,8 +804,13 @@ class GalaxyService:
 
         return datetime.utcnow() + timedelta(days=days)
 
-    async def _get_or_create_status(self, user_id: UUID, node_id: UUID) -> UserNodeStatus:
-        """获取或创建用户节点状态"""
+    async def _get_or_create_status(self, user_id: UUID, node_id: UUID) -> Tuple[UserNodeStatus, bool]:
+        """
+        获取或创建用户节点状态
+
+        Returns:
+            (status, 是否新建)；新建的状态尚未提交，调用方提交后再更新学习摘要
+        """
         query = select(UserNodeStatus).where(
             and_(
                 UserNodeStatus.user_id == user_id,
@@ -813,23 +820,75 @@ class GalaxyService:
         result = await self.db.execute(query)
         status = result.scalar_one_or_none()
 
-        if not status:
+        created = status is None
+        if created:
             status = UserNodeStatus(user_id=user_id, node_id=node_id)
             self.db.add(status)
             await self.db.flush()
 
-        return status
+        self._status_map[(user_id, node_id)] = status
+        return status, created
 
     async def _get_user_status(self, user_id: UUID, node_id: UUID) -> Optional[UserNodeStatus]:
         """获取用户节点状态"""
-        query = select(UserNodeStatus).where(
-            and_(
-                UserNodeStatus.user_id == user_id,
-                UserNodeStatus.node_id == node_id
+        statuses = await self._get_user_statuses(user_id, [node_id])
+        return statuses.get(node_id)
+
+    async def _get_user_statuses(
+        self,
+        user_id: UUID,
+        node_ids: Iterable[UUID]
+    ) -> Dict[UUID, UserNodeStatus]:
+        """
+        批量获取用户节点状态
+
+        未命中 identity map 的节点通过一次 IN 查询加载，
+        不存在的状态也会被记录，避免同一请求内重复查询
+
+        Returns:
+            Dict[node_id, UserNodeStatus]: 仅包含存在状态记录的节点
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        missing = [nid for nid in node_ids if (user_id, nid) not in self._status_map]
+
+        if missing:
+            query = select(UserNodeStatus).where(
+                and_(
+                    UserNodeStatus.user_id == user_id,
+                    UserNodeStatus.node_id.in_(missing)
+                )
             )
+            result = await self.db.execute(query)
+            loaded = {status.node_id: status for status in result.scalars().all()}
+            for nid in missing:
+                self._status_map[(user_id, nid)] = loaded.get(nid)
+
+        return {
+            nid: self._status_map[(user_id, nid)]
+            for nid in node_ids
+            if self._status_map.get((user_id, nid)) is not None
+        }
+
+    def _build_user_status_info(self, status: Optional[UserNodeStatus]):
+        """将 UserNodeStatus 转换为搜索结果中的 UserStatusInfo"""
+        if not status:
+            return None
+
+        from app.schemas.galaxy import UserStatusInfo
+
+        return UserStatusInfo(
+            mastery_score=status.mastery_score,
+            total_study_minutes=status.total_study_minutes,
+            study_count=status.study_count,
+            is_unlocked=status.is_unlocked,
+            is_collapsed=status.is_collapsed,
+            is_favorite=status.is_favorite,
+            last_study_at=status.last_study_at,
+            next_review_at=status.next_review_at,
+            decay_paused=status.decay_paused,
+            status=self._calculate_visual_status(status),
+            brightness=self._calculate_brightness(status)
         )
-        result = await self.db.execute(query)
-        return result.scalar_one_or_none()
 
     async def _calculate_user_stats(self, user_id: UUID) -> GalaxyUserStats:
         """计算用户统计数据"""
@@ -1,56 +1,253 @@
 """
 Graph Reasoning Service (Neuro-Symbolic AI)
 基于 NetworkX 的动态学习路径生成引擎
+
+前置依赖图在进程内只加载一次 (PrerequisiteGraph)，之后通过
+stream:graph_sync 中的 node_created / relation_created 事件增量更新，
+并按目标节点缓存拓扑序，使 generate_learning_path 无需扫描整表。
 """
 
+import asyncio
+import json
+import time
 import networkx as nx
 from typing import List, Dict, Any, Set, Optional
 from uuid import UUID
 from sqlalchemy import select
+from sqlalchemy.orm import load_only
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
+from app.config import settings
+from app.core.cache import cache_service
 from app.models.galaxy import KnowledgeNode, NodeRelation, UserNodeStatus
 
+PREREQUISITE = "PREREQUISITE"
+GRAPH_SYNC_STREAM = "stream:graph_sync"
 
-class GraphReasoningService:
-    def __init__(self, db: AsyncSession):
-        self.db = db
-        self.G: Optional[nx.DiGraph] = None
-    
-    async def _load_graph(self):
-        """
-        从数据库加载图结构到 NetworkX
-        注意：生产环境中应考虑缓存 (Redis/Pickle) 以避免每次请求都全量加载
-        """
-        if self.G is not None:
+
+class PrerequisiteGraph:
+    """
+    进程级、带版本号的前置依赖图
+
+    - 首次使用时全量加载节点与 PREREQUISITE 边
+    - 之后按 GRAPH_SYNC_INTERVAL 拉取 stream:graph_sync 的新事件增量更新
+    - 收到 graph_sync(full) 事件或超过 GRAPH_CACHE_MAX_AGE 时全量重建
+    - 祖先集合与拓扑序按目标节点缓存，边变更时失效
+    """
+
+    def __init__(
+        self,
+        sync_interval: float = settings.GRAPH_SYNC_INTERVAL,
+        max_age: float = settings.GRAPH_CACHE_MAX_AGE
+    ):
+        self.G: nx.DiGraph = nx.DiGraph()
+        self.version = 0
+        self.loaded = False
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+
+        self._loaded_at = 0.0
+        self._synced_at = 0.0
+        self._stream_id = "0-0"
+        self._needs_reload = False
+        self._lock = asyncio.Lock()
+
+        # 目标节点 -> 祖先集合 / 拓扑序（None 表示存在环）
+        self._ancestors: Dict[UUID, frozenset] = {}
+        self._orders: Dict[UUID, Optional[List[UUID]]] = {}
+
+    # ==========================================
+    # 加载与同步
+    # ==========================================
+
+    async def ensure_fresh(self, db: AsyncSession):
+        """确保图已加载且不落后于事件流"""
+        now = time.monotonic()
+        if (
+            self.loaded
+            and not self._needs_reload
+            and now - self._loaded_at < self.max_age
+            and now - self._synced_at < self.sync_interval
+        ):
             return
 
-        self.G = nx.DiGraph()
-        
-        # 1. 加载所有节点
-        nodes_result = await self.db.execute(select(KnowledgeNode))
-        nodes = nodes_result.scalars().all()
-        for node in nodes:
-            self.G.add_node(
-                node.id, 
-                name=node.name, 
-                description=node.description
+        async with self._lock:
+            now = time.monotonic()
+            if not self.loaded or now - self._loaded_at >= self.max_age:
+                await self.load(db)
+            elif now - self._synced_at >= self.sync_interval:
+                await self._apply_stream_events()
+                if self._needs_reload:
+                    await self.load(db)
+            self._synced_at = time.monotonic()
+
+    async def load(self, db: AsyncSession):
+        """从数据库全量构建图"""
+        # 先记录事件流位置，加载期间产生的事件会在下次同步时重放（幂等）
+        stream_id = await self._stream_tail_id()
+
+        G = nx.DiGraph()
+
+        # 1. 加载所有节点（只取图需要的列，避免加载 embedding）
+        nodes_result = await db.execute(
+            select(KnowledgeNode).options(
+                load_only(KnowledgeNode.id, KnowledgeNode.name, KnowledgeNode.description)
             )
-            
+        )
+        for node in nodes_result.scalars().all():
+            G.add_node(node.id, name=node.name, description=node.description)
+
         # 2. 加载 'PREREQUISITE' 类型的边
-        edges_result = await self.db.execute(
-            select(NodeRelation).where(NodeRelation.relation_type == "PREREQUISITE")
+        edges_result = await db.execute(
+            select(NodeRelation)
+            .options(load_only(NodeRelation.source_node_id, NodeRelation.target_node_id))
+            .where(NodeRelation.relation_type == PREREQUISITE)
         )
-        edges = edges_result.scalars().all()
-        
-        edge_list = []
-        for edge in edges:
-            # networkx edge format: (u, v, attr_dict)
-            edge_list.append((edge.source_node_id, edge.target_node_id))
-            
-        self.G.add_edges_from(edge_list)
-        logger.info(f"Graph loaded: {self.G.number_of_nodes()} nodes, {self.G.number_of_edges()} edges")
+        G.add_edges_from(
+            (edge.source_node_id, edge.target_node_id)
+            for edge in edges_result.scalars().all()
+        )
+
+        self.G = G
+        self._invalidate()
+        self.loaded = True
+        self._needs_reload = False
+        self._loaded_at = time.monotonic()
+        if stream_id:
+            self._stream_id = stream_id
+
+        logger.info(
+            f"Prerequisite graph loaded (v{self.version}): "
+            f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges"
+        )
+
+    async def _stream_tail_id(self) -> Optional[str]:
+        redis = cache_service.redis
+        if not redis:
+            return None
+        try:
+            entries = await redis.xrevrange(GRAPH_SYNC_STREAM, count=1)
+        except Exception as e:
+            logger.warning(f"Failed to read graph sync stream position: {e}")
+            return None
+        if not entries:
+            return "0-0"
+        msg_id = entries[0][0]
+        return msg_id.decode() if isinstance(msg_id, bytes) else msg_id
+
+    async def _apply_stream_events(self, batch_size: int = 500):
+        """拉取并应用自上次同步以来的事件"""
+        redis = cache_service.redis
+        if not redis:
+            return
+
+        while True:
+            try:
+                messages = await redis.xread({GRAPH_SYNC_STREAM: self._stream_id}, count=batch_size)
+            except Exception as e:
+                logger.warning(f"Failed to read graph sync stream: {e}")
+                return
+
+            entries = messages[0][1] if messages else []
+            for msg_id, fields in entries:
+                self._stream_id = msg_id.decode() if isinstance(msg_id, bytes) else msg_id
+                try:
+                    self.apply_event(fields)
+                except Exception as e:
+                    logger.warning(f"Skipping malformed graph sync event {self._stream_id}: {e}")
+
+            if len(entries) < batch_size:
+                return
+
+    # ==========================================
+    # 增量更新
+    # ==========================================
+
+    def apply_event(self, fields: Dict[Any, Any]):
+        """应用一条 stream:graph_sync 事件"""
+        fields = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in fields.items()
+        }
+        msg_type = fields.get("type")
+
+        if msg_type == "graph_sync":
+            if fields.get("mode") == "full":
+                self._needs_reload = True
+            return
+
+        data = json.loads(fields.get("data", "{}"))
+        if msg_type == "node_created":
+            self.add_node(UUID(data["id"]), data.get("name"), data.get("description"))
+        elif msg_type == "relation_created":
+            if data.get("type") == PREREQUISITE:
+                self.add_relation(UUID(data["source"]), UUID(data["target"]))
+
+    def add_node(self, node_id: UUID, name: Optional[str], description: Optional[str] = None):
+        """新增节点（不影响已有节点的祖先关系，无需失效缓存）"""
+        self.G.add_node(node_id, name=name, description=description)
+        self.version += 1
+
+    def add_relation(self, source_id: UUID, target_id: UUID):
+        """新增前置依赖边"""
+        if self.G.has_edge(source_id, target_id):
+            return
+        self.G.add_edge(source_id, target_id)
+        self._invalidate()
+
+    def _invalidate(self):
+        self.version += 1
+        self._ancestors.clear()
+        self._orders.clear()
+
+    # ==========================================
+    # 查询
+    # ==========================================
+
+    def ancestors(self, node_id: UUID) -> frozenset:
+        """目标节点的全部前置依赖（缓存）"""
+        cached = self._ancestors.get(node_id)
+        if cached is None:
+            cached = frozenset(nx.ancestors(self.G, node_id))
+            self._ancestors[node_id] = cached
+        return cached
+
+    def learning_order(self, node_id: UUID) -> Optional[List[UUID]]:
+        """
+        目标节点及其祖先的拓扑序（缓存）
+
+        Returns:
+            拓扑序节点 ID 列表；存在环时返回 None
+        """
+        if node_id in self._orders:
+            return self._orders[node_id]
+
+        subgraph = self.G.subgraph(self.ancestors(node_id) | {node_id})
+        try:
+            order = list(nx.topological_sort(subgraph))
+        except nx.NetworkXUnfeasible:
+            order = None
+        self._orders[node_id] = order
+        return order
+
+
+# 进程级单例
+prerequisite_graph = PrerequisiteGraph()
+
+
+class GraphReasoningService:
+    def __init__(self, db: AsyncSession, graph: Optional[PrerequisiteGraph] = None):
+        self.db = db
+        self.graph = graph or prerequisite_graph
+
+    @property
+    def G(self) -> nx.DiGraph:
+        return self.graph.G
+    
+    async def _load_graph(self):
+        """确保进程级前置依赖图已加载并同步到最新版本"""
+        await self.graph.ensure_fresh(self.db)
 
     async def generate_learning_path(
         self, 
@@ -63,7 +260,7 @@ class GraphReasoningService:
         Algorithm:
         1. 获取目标节点的所有祖先 (Ancestors)
         2. 构建子图
-        3. 拓扑排序
+        3. 拓扑排序 (1-3 由进程级图按目标节点缓存)
         4. 剔除用户已掌握的节点 (Pruning)
         """
         await self._load_graph()
@@ -72,24 +269,14 @@ class GraphReasoningService:
             logger.warning(f"Target node {target_node_id} not found in graph")
             return []
 
-        # 1. 获取所有前置依赖 (Ancestors)
+        # 1-3. 前置依赖 (Ancestors) 子图的拓扑排序，按目标节点缓存
         try:
-            ancestors = nx.ancestors(self.G, target_node_id)
+            path_nodes_ids = self.graph.learning_order(target_node_id)
         except Exception as e:
             logger.error(f"Error finding ancestors: {e}")
             return []
-            
-        # 包含目标节点本身
-        subgraph_nodes = ancestors | {target_node_id}
-        
-        # 2. 提取子图
-        subgraph = self.G.subgraph(subgraph_nodes)
-        
-        # 3. 拓扑排序 (Topological Sort) - 线性化 DAG
-        try:
-            # topological_sort 返回的是生成器，转为 list
-            path_nodes_ids = list(nx.topological_sort(subgraph))
-        except nx.NetworkXUnfeasible:
+
+        if path_nodes_ids is None:
             logger.error("Cycle detected in prerequisite graph! Cannot perform topological sort.")
             # Fallback: Just return the subgraph nodes (unordered) or handle error
             return [{"error": "Cyclic dependency detected"}]
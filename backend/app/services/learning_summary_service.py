@@ -0,0 +1,212 @@
+"""
+用户学习状态摘要 (Learning Summary)
+
+为聊天上下文预计算每个用户的知识星图统计与画像摘要，存放在 Redis Hash 中：
+- spark / 新建节点 / 每日衰减改变掌握度时按分档增量更新计数
+- 缓存缺失时用一条聚合查询重建，Redis 不可用时直接返回聚合结果
+- 画像摘要在每日指标重新计算后失效，下次读取时重新生成
+"""
+
+from collections import defaultdict
+from typing import Dict, Any, Iterable, Optional, Tuple
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.cache import cache_service
+from app.models.galaxy import UserNodeStatus
+from app.services.analytics_service import AnalyticsService
+
+# 掌握度分档 (mastery_score 0-100)
+MASTERED_THRESHOLD = 80.0
+LEARNING_THRESHOLD = 30.0
+
+COUNT_FIELDS = ("total_nodes", "mastered_nodes", "learning_nodes")
+ANALYTICS_FIELD = "analytics_summary"
+
+# 仅在摘要已存在时累加，避免在缺失的 Hash 上写出不完整的计数
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 1, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+end
+return 0
+"""
+
+
+def _bucket(mastery: Optional[float]) -> Optional[str]:
+    if mastery is None:
+        return None
+    if mastery >= MASTERED_THRESHOLD:
+        return "mastered_nodes"
+    if mastery >= LEARNING_THRESHOLD:
+        return "learning_nodes"
+    return None
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class LearningSummaryService:
+    """按用户维护的学习状态摘要"""
+
+    def __init__(self, ttl: int = settings.LEARNING_SUMMARY_TTL):
+        # TTL 兜底修正增量更新可能产生的漂移
+        self.ttl = ttl
+
+    def _key(self, user_id: UUID) -> str:
+        return f"{settings.APP_NAME}:learning_summary:{user_id}"
+
+    # ==========================================
+    # 读取
+    # ==========================================
+
+    async def get_summary(self, db: AsyncSession, user_id: UUID) -> Dict[str, Any]:
+        """
+        获取用户学习状态摘要
+
+        Returns:
+            {"knowledge_stats": {total_nodes, mastered_nodes, learning_nodes},
+             "analytics_summary": str}
+        """
+        redis = cache_service.redis
+        cached: Dict[str, str] = {}
+        if redis:
+            try:
+                raw = await redis.hgetall(self._key(user_id))
+                cached = {_decode(k): _decode(v) for k, v in raw.items()}
+            except Exception as e:
+                logger.warning(f"Failed to read learning summary for {user_id}: {e}")
+                redis = None
+
+        updates: Dict[str, Any] = {}
+        if all(field in cached for field in COUNT_FIELDS):
+            stats = {field: int(cached[field]) for field in COUNT_FIELDS}
+        else:
+            stats = await self._aggregate_stats(db, user_id)
+            updates.update(stats)
+
+        analytics_summary = cached.get(ANALYTICS_FIELD)
+        if analytics_summary is None:
+            analytics_summary = await AnalyticsService(db).get_user_profile_summary(user_id)
+            updates[ANALYTICS_FIELD] = analytics_summary
+
+        if redis and updates:
+            try:
+                key = self._key(user_id)
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.hset(key, mapping=updates)
+                    if "total_nodes" in updates:
+                        pipe.expire(key, self.ttl)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to store learning summary for {user_id}: {e}")
+
+        return {"knowledge_stats": stats, "analytics_summary": analytics_summary}
+
+    async def _aggregate_stats(self, db: AsyncSession, user_id: UUID) -> Dict[str, int]:
+        """数据库端聚合计数（缓存缺失时）"""
+        mastery = UserNodeStatus.mastery_score
+        stmt = select(
+            func.count(),
+            func.count().filter(mastery >= MASTERED_THRESHOLD),
+            func.count().filter(and_(mastery >= LEARNING_THRESHOLD, mastery < MASTERED_THRESHOLD)),
+        ).where(UserNodeStatus.user_id == user_id)
+        result = await db.execute(stmt)
+        total, mastered, learning = result.one()
+        return {
+            "total_nodes": total or 0,
+            "mastered_nodes": mastered or 0,
+            "learning_nodes": learning or 0,
+        }
+
+    # ==========================================
+    # 增量维护
+    # ==========================================
+
+    @staticmethod
+    def _deltas(old_mastery: Optional[float], new_mastery: float) -> Dict[str, int]:
+        """
+        一次掌握度变化对各计数的影响
+
+        old_mastery 为 None 表示新建的节点状态
+        """
+        deltas: Dict[str, int] = defaultdict(int)
+        if old_mastery is None:
+            deltas["total_nodes"] += 1
+        old_bucket, new_bucket = _bucket(old_mastery), _bucket(new_mastery)
+        if old_bucket != new_bucket:
+            if old_bucket:
+                deltas[old_bucket] -= 1
+            if new_bucket:
+                deltas[new_bucket] += 1
+        return deltas
+
+    async def apply_mastery_change(
+        self,
+        user_id: UUID,
+        old_mastery: Optional[float],
+        new_mastery: float
+    ):
+        """单个节点掌握度变化后更新摘要"""
+        await self.apply_mastery_changes([(user_id, old_mastery, new_mastery)])
+
+    async def apply_mastery_changes(
+        self,
+        changes: Iterable[Tuple[UUID, Optional[float], float]]
+    ):
+        """批量更新摘要（每日衰减按块调用），每个用户一次脚本调用"""
+        redis = cache_service.redis
+        if not redis:
+            return
+
+        per_user: Dict[UUID, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for user_id, old_mastery, new_mastery in changes:
+            for field, delta in self._deltas(old_mastery, new_mastery).items():
+                per_user[user_id][field] += delta
+
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                queued = False
+                for user_id, deltas in per_user.items():
+                    args = [x for field, delta in deltas.items() if delta for x in (field, delta)]
+                    if args:
+                        pipe.eval(_INCR_IF_EXISTS, 1, self._key(user_id), *args)
+                        queued = True
+                if queued:
+                    await pipe.execute()
+        except Exception as e:
+            # 更新失败时删除摘要，下次读取从数据库重建
+            logger.warning(f"Failed to update learning summaries: {e}")
+            await self._safe_delete(*(self._key(uid) for uid in per_user))
+
+    async def invalidate_analytics(self, user_id: UUID):
+        """每日指标重新计算后，画像摘要需要重新生成"""
+        redis = cache_service.redis
+        if not redis:
+            return
+        try:
+            await redis.hdel(self._key(user_id), ANALYTICS_FIELD)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate analytics summary for {user_id}: {e}")
+
+    async def invalidate(self, user_id: UUID):
+        await self._safe_delete(self._key(user_id))
+
+    async def _safe_delete(self, *keys: str):
+        redis = cache_service.redis
+        if not redis or not keys:
+            return
+        try:
+            await redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Failed to delete learning summaries: {e}")
+
+
+learning_summary_service = LearningSummaryService()
@@ -0,0 +1,248 @@
+"""
+夜间批处理任务 (Nightly Batch Jobs)
+
+按 user_id 键集分页把活跃用户切成块，逐块处理：
+- 每块完成后把游标写入 Redis 检查点，任务中途失败或进程重启后，
+  当天重跑从检查点继续；整轮完成后标记 done，当天重复触发直接跳过
+- 整块失败（块内所有用户都失败，通常是数据库等系统性故障）时按退避重试，
+  仍失败则中止本轮：检查点停在失败块之前、不写 done，重跑时从该块继续
+- 每块使用独立的短会话，不再在一个长会话里遍历全部用户
+- 逐块输出进度日志，并导出耗时 / 进度 / 失败数指标
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import select
+
+from app.config import settings
+from app.core.cache import cache_service
+from app.core.metrics import SCHEDULED_JOB_DURATION, SCHEDULED_JOB_PROGRESS, SCHEDULED_JOB_ERRORS
+from app.db.session import AsyncSessionLocal
+from app.models.user import User
+from app.schemas.notification import NotificationCreate
+from app.services.cognitive_service import CognitiveService
+from app.services.decay_service import DecayService
+from app.services.notification_service import NotificationService
+
+CHECKPOINT_KEY = "job:checkpoint:{}:{}"  # job name, UTC 日期
+CHECKPOINT_TTL = 2 * 86400
+CHECKPOINT_DONE = b"done"
+
+
+class JobCheckpoint:
+    """
+    Redis 检查点：记录某任务当天最后一个完成块的 user_id
+    Redis 不可用时退化为无检查点（整轮重跑），不影响任务本身
+    """
+
+    def __init__(self, job_name: str, run_date: Optional[str] = None):
+        run_date = run_date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        self.key = CHECKPOINT_KEY.format(job_name, run_date)
+
+    async def load(self) -> Optional[bytes]:
+        if not cache_service.redis:
+            return None
+        try:
+            return await cache_service.redis.get(self.key)
+        except Exception as e:
+            logger.warning(f"Failed to load checkpoint {self.key}: {e}")
+            return None
+
+    async def save(self, value: bytes):
+        if not cache_service.redis:
+            return
+        try:
+            await cache_service.redis.set(self.key, value, ex=CHECKPOINT_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to save checkpoint {self.key}: {e}")
+
+
+class BatchJob(ABC):
+    """
+    分块、可断点续跑的用户批处理任务基类
+    子类实现 process_chunk(user_ids)，返回本块失败的用户数
+    """
+
+    name = "batch_job"
+    CHUNK_RETRIES = 2  # 整块失败后的重试次数
+    CHUNK_RETRY_DELAY = 5.0  # 首次重试前的等待（秒），之后翻倍
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.NIGHTLY_JOB_CHUNK_SIZE
+        self.checkpoint = JobCheckpoint(self.name)
+
+    @abstractmethod
+    async def process_chunk(self, user_ids: List[UUID]) -> int:
+        """处理一块用户，返回失败的用户数"""
+        pass
+
+    def is_available(self) -> bool:
+        """任务依赖是否就绪；不可用时整轮跳过（子类按需覆盖）"""
+        return True
+
+    async def _next_chunk(self, cursor: Optional[UUID]) -> List[UUID]:
+        query = select(User.id).where(User.is_active == True).order_by(User.id).limit(self.chunk_size)
+        if cursor is not None:
+            query = query.where(User.id > cursor)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            return list(result.scalars().all())
+
+    async def _process_with_retry(self, user_ids: List[UUID]) -> int:
+        """处理一块；整块失败时按退避重试，返回最后一次的失败用户数"""
+        delay = self.CHUNK_RETRY_DELAY
+        for attempt in range(self.CHUNK_RETRIES + 1):
+            errors = await self.process_chunk(user_ids)
+            if errors < len(user_ids) or attempt == self.CHUNK_RETRIES:
+                return errors
+            logger.warning(
+                f"[{self.name}] chunk ending at user {user_ids[-1]} failed entirely, "
+                f"retrying in {delay:.0f}s ({attempt + 1}/{self.CHUNK_RETRIES})"
+            )
+            await asyncio.sleep(delay)
+            delay *= 2
+        return errors
+
+    async def run(self) -> Dict[str, float]:
+        """
+        执行任务
+
+        Returns:
+            dict: {processed, errors, chunks, duration, skipped, aborted}
+        """
+        stats = {"processed": 0, "errors": 0, "chunks": 0, "duration": 0.0, "skipped": False, "aborted": False}
+
+        if not self.is_available():
+            stats["skipped"] = True
+            return stats
+
+        saved = await self.checkpoint.load()
+        if saved == CHECKPOINT_DONE:
+            logger.info(f"[{self.name}] Already completed today, skipping")
+            stats["skipped"] = True
+            return stats
+        cursor = UUID(saved.decode()) if saved else None
+        if cursor is not None:
+            logger.info(f"[{self.name}] Resuming after user {cursor}")
+
+        started = time.perf_counter()
+        SCHEDULED_JOB_PROGRESS.labels(job=self.name).set(0)
+
+        while True:
+            user_ids = await self._next_chunk(cursor)
+            if not user_ids:
+                break
+
+            errors = await self._process_with_retry(user_ids)
+            stats["errors"] += errors
+            if errors:
+                SCHEDULED_JOB_ERRORS.labels(job=self.name).inc(errors)
+            if errors >= len(user_ids):
+                # 不推进检查点、不写 done：重跑时从失败块重新开始，之后的块本轮不处理，避免重复处理
+                logger.error(
+                    f"[{self.name}] chunk after user {cursor} still failing after "
+                    f"{self.CHUNK_RETRIES} retries, aborting run"
+                )
+                stats["aborted"] = True
+                break
+
+            cursor = user_ids[-1]
+            await self.checkpoint.save(str(cursor).encode())
+
+            stats["chunks"] += 1
+            stats["processed"] += len(user_ids)
+            SCHEDULED_JOB_PROGRESS.labels(job=self.name).set(stats["processed"])
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"[{self.name}] chunk {stats['chunks']}: processed={stats['processed']} "
+                f"errors={stats['errors']} elapsed={elapsed:.1f}s ({stats['processed'] / elapsed:.0f} users/s)"
+            )
+            if len(user_ids) < self.chunk_size:
+                break
+
+        if not stats["aborted"]:
+            await self.checkpoint.save(CHECKPOINT_DONE)
+        stats["duration"] = time.perf_counter() - started
+        SCHEDULED_JOB_DURATION.labels(job=self.name).observe(stats["duration"])
+        return stats
+
+
+class ImplicitMiningJob(BatchJob):
+    """
+    每日隐式行为挖掘
+    块内用户并发处理（上限 IMPLICIT_MINING_CONCURRENCY），每个用户独立会话，单个用户失败不影响其他用户
+    """
+
+    name = "implicit_mining"
+
+    def __init__(self, chunk_size: Optional[int] = None, concurrency: Optional[int] = None):
+        super().__init__(chunk_size)
+        self.semaphore = asyncio.Semaphore(concurrency or settings.IMPLICIT_MINING_CONCURRENCY)
+        self.fragments = 0
+
+    def is_available(self) -> bool:
+        # 挖掘逻辑尚未在 CognitiveService 中实现时，跳过整轮并只告警一次，
+        # 而不是为每个活跃用户打开会话后各记一条 AttributeError
+        if not hasattr(CognitiveService, "mining_implicit_behaviors"):
+            logger.warning(f"[{self.name}] CognitiveService.mining_implicit_behaviors is not implemented, skipping")
+            return False
+        return True
+
+    async def _mine_user(self, user_id: UUID) -> bool:
+        async with self.semaphore:
+            try:
+                async with AsyncSessionLocal() as db:
+                    fragments = await CognitiveService(db).mining_implicit_behaviors(user_id)
+                self.fragments += len(fragments)
+                return True
+            except Exception as e:
+                logger.error(f"[{self.name}] Failed for user {user_id}: {e}")
+                return False
+
+    async def process_chunk(self, user_ids: List[UUID]) -> int:
+        results = await asyncio.gather(*(self._mine_user(user_id) for user_id in user_ids))
+        return results.count(False)
+
+
+class ReviewReminderJob(BatchJob):
+    """
+    复习提醒
+    每块一条窗口查询统计各用户的待复习节点，一次批量写入通知
+    """
+
+    name = "review_reminders"
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        super().__init__(chunk_size)
+        self.sent = 0
+
+    @staticmethod
+    def _build_notification(total: int, urgent: int) -> NotificationCreate:
+        return NotificationCreate(
+            title="知识复习提醒",
+            content=f"您有 {total} 个知识点需要复习" +
+                    (f"，其中 {urgent} 个紧急" if urgent > 0 else ""),
+            type="review_reminder",
+            data={"suggestion_count": total, "urgent_count": urgent}
+        )
+
+    async def process_chunk(self, user_ids: Sequence[UUID]) -> int:
+        try:
+            async with AsyncSessionLocal() as db:
+                counts = await DecayService(db).get_review_counts(user_ids)
+                if counts:
+                    self.sent += await NotificationService.create_many(db, [
+                        (user_id, self._build_notification(total, urgent))
+                        for user_id, total, urgent in counts
+                    ])
+            return 0
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed for chunk ending at user {user_ids[-1]}: {e}")
+            return len(user_ids)
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
@@ -22,6 +22,22 @@ class NotificationService:
         await db.refresh(db_obj)
         return db_obj
 
+    @staticmethod
+    async def create_many(db: AsyncSession, notifications: List[Tuple[UUID, NotificationCreate]]) -> int:
+        """批量创建通知（一次提交），返回创建数量"""
+        db.add_all([
+            Notification(
+                user_id=user_id,
+                title=obj_in.title,
+                content=obj_in.content,
+                type=obj_in.type,
+                data=obj_in.data
+            )
+            for user_id, obj_in in notifications
+        ])
+        await db.commit()
+        return len(notifications)
+
     @staticmethod
     async def get_user_notifications(
         db: AsyncSession, 
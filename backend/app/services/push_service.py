@@ -1,13 +1,19 @@
-import json
+import asyncio
+import hashlib
+import time
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Sequence, Set, Tuple
 from uuid import UUID
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, func, update
+from sqlalchemy.orm import contains_eager
 from loguru import logger
 
+from app.config import settings
+from app.core.metrics import PUSH_CYCLE_USERS, PUSH_CYCLE_DURATION, PUSH_CYCLE_THROUGHPUT
+from app.db.session import AsyncSessionLocal
 from app.models.user import User, PushPreference
 from app.models.notification import PushHistory
 from app.schemas.notification import NotificationCreate
@@ -18,154 +24,273 @@ from app.services.push_strategies import (
     SprintStrategy,
     MemoryStrategy,
     InactivityStrategy,
-    CuriosityStrategy
+    CuriosityStrategy,
+    PushStrategy
 )
 
+# Minimum interval between two pushes to the same user
+PUSH_COOLDOWN = timedelta(hours=2)
+
+
 class PushService:
-    def __init__(self, db: AsyncSession):
+    """
+    Smart push engine.
+
+    Users are streamed in keyset-paginated batches (ordered by user_id); each batch is
+    filtered and evaluated with set-based queries, push content is generated on a bounded
+    concurrent pool, and pushes are then recorded one by one on this session.
+    """
+
+    # Only one push cycle may run per process; a late cycle is skipped rather than stacked
+    _cycle_lock = asyncio.Lock()
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        batch_size: Optional[int] = None,
+        content_concurrency: Optional[int] = None
+    ):
         self.db = db
+        self.batch_size = batch_size or settings.PUSH_BATCH_SIZE
+        self.content_concurrency = content_concurrency or settings.PUSH_CONTENT_CONCURRENCY
         self.sprint_strategy = SprintStrategy()
         self.memory_strategy = MemoryStrategy()
         self.inactivity_strategy = InactivityStrategy()
         self.curiosity_strategy = CuriosityStrategy()
+        # Priority: Sprint > Curiosity > Memory > Inactivity
+        self.strategies: List[Tuple[str, PushStrategy]] = [
+            ("sprint", self.sprint_strategy),
+            ("curiosity", self.curiosity_strategy),
+            ("memory", self.memory_strategy),
+            ("inactivity", self.inactivity_strategy),
+        ]
 
-    async def process_all_users(self):
+    async def process_all_users(self) -> Optional[Dict[str, int]]:
         """
         Main entry point: Process push logic for all eligible users.
+        Returns cycle stats, or None if another cycle is still running.
+        """
+        if self._cycle_lock.locked():
+            logger.warning("Previous push cycle is still running, skipping this one.")
+            return None
+
+        async with self._cycle_lock:
+            logger.info("Starting smart push cycle...")
+            stats = {"processed": 0, "sent": 0, "errors": 0}
+            started = time.perf_counter()
+            cursor: Optional[UUID] = None
+
+            while True:
+                users = await self._fetch_user_batch(cursor)
+                if not users:
+                    break
+                cursor = users[-1].id
+
+                try:
+                    batch_stats = await self.process_user_batch(users)
+                except Exception as e:
+                    logger.error(f"Error processing push batch ending at user {cursor}: {e}")
+                    await self.db.rollback()
+                    batch_stats = {"sent": 0, "errors": len(users)}
+
+                skipped = len(users) - batch_stats["sent"] - batch_stats["errors"]
+                PUSH_CYCLE_USERS.labels(result="sent").inc(batch_stats["sent"])
+                PUSH_CYCLE_USERS.labels(result="error").inc(batch_stats["errors"])
+                PUSH_CYCLE_USERS.labels(result="skipped").inc(skipped)
+                stats["processed"] += len(users)
+                stats["sent"] += batch_stats["sent"]
+                stats["errors"] += batch_stats["errors"]
+
+                # Objects of this batch are no longer needed; keep the identity map small
+                self.db.expunge_all()
+                if len(users) < self.batch_size:
+                    break
+
+            elapsed = time.perf_counter() - started
+            PUSH_CYCLE_DURATION.observe(elapsed)
+            PUSH_CYCLE_THROUGHPUT.set(stats["processed"] / elapsed if elapsed > 0 else 0)
+            logger.info(
+                f"Smart push cycle finished: processed={stats['processed']}, sent={stats['sent']}, "
+                f"errors={stats['errors']}, elapsed={elapsed:.2f}s"
+            )
+            return stats
+
+    async def _fetch_user_batch(self, cursor: Optional[UUID]) -> List[User]:
+        """
+        Next batch of active users with push preferences, keyset-paginated on User.id.
         """
-        logger.info("Starting daily push processing...")
-        
-        # 1. Get all active users with push preferences
-        # Note: In a real large-scale system, we would paginate or use a job queue.
         query = (
             select(User)
             .join(PushPreference, User.id == PushPreference.user_id)
+            .options(contains_eager(User.push_preference))
             .where(User.is_active == True)
+            .order_by(User.id)
+            .limit(self.batch_size)
         )
+        if cursor is not None:
+            query = query.where(User.id > cursor)
+
         result = await self.db.execute(query)
-        users = result.scalars().all()
+        return list(result.scalars().all())
 
-        for user in users:
+    async def process_user_batch(self, users: Sequence[User]) -> Dict[str, int]:
+        """
+        Process push logic for a batch of users.
+        Returns {"sent": n, "errors": n}.
+        """
+        stats = {"sent": 0, "errors": 0}
+
+        # 1. Check Timezone & Active Slots (pure Python, no queries)
+        candidates = [u for u in users if u.push_preference and self._is_active_time(u.push_preference)]
+
+        # 2. Check Frequency Caps
+        if candidates:
+            capped = await self._capped_user_ids(candidates)
+            candidates = [u for u in candidates if u.id not in capped]
+
+        # 3. Strategy Evaluation
+        triggers = await self.evaluate_strategies([u.id for u in candidates])
+        if not triggers:
+            return stats
+
+        # 4. Generate Content (bounded concurrency)
+        triggered = [u for u in candidates if u.id in triggers]
+        semaphore = asyncio.Semaphore(self.content_concurrency)
+        prepared = await asyncio.gather(
+            *(self._prepare_push(user, *triggers[user.id], semaphore) for user in triggered),
+            return_exceptions=True
+        )
+
+        # 5. Send & Record (sequential: the session is not safe for concurrent use).
+        # Work on captured ids: a rollback expires every loaded instance in the session.
+        for user_id, result in zip([u.id for u in triggered], prepared):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating push for user {user_id}: {result}")
+                stats["errors"] += 1
+                continue
+            if result is None:
+                continue
+
+            content_dict, trigger_data = result
             try:
-                await self.process_user_push(user)
+                await self._send_push(user_id, triggers[user_id][0], content_dict, trigger_data)
+                stats["sent"] += 1
             except Exception as e:
-                logger.error(f"Error processing push for user {user.id}: {e}")
+                logger.error(f"Error sending push to user {user_id}: {e}")
+                await self.db.rollback()
+                stats["errors"] += 1
+
+        return stats
 
     async def process_user_push(self, user: User) -> bool:
         """
         Process push logic for a single user.
         Returns True if a push was sent.
         """
-        # Ensure user has preferences loaded
-        if not user.push_preference:
-            # Should be loaded by join, but double check
-            return False
+        stats = await self.process_user_batch([user])
+        return stats["sent"] > 0
 
-        prefs: PushPreference = user.push_preference
-
-        # 1. Check Timezone & Active Slots
-        if not self._is_active_time(prefs):
-            logger.debug(f"User {user.id} is not in active time slot.")
-            return False
-
-        # 2. Check Frequency Caps
-        if await self._check_frequency_cap(user, prefs):
-            logger.debug(f"User {user.id} reached frequency cap.")
-            return False
+    async def evaluate_strategies(self, user_ids: Sequence[UUID]) -> Dict[UUID, Tuple[str, Dict[str, Any]]]:
+        """
+        Pick at most one strategy per user with one query per strategy for the whole batch.
+        Strategies run in priority order and each only looks at users not already
+        claimed by a higher-priority one.
 
-        # 3. Strategy Evaluation (Priority: Sprint > Curiosity > Memory > Inactivity)
-        trigger_strategy = None
-        trigger_data = {}
-        trigger_type = ""
+        Returns {user_id: (trigger_type, trigger_data)}.
+        """
+        triggers: Dict[UUID, Tuple[str, Dict[str, Any]]] = {}
 
-        # Check Sprint Strategy
-        if await self.sprint_strategy.should_trigger(user, self.db):
-            trigger_strategy = self.sprint_strategy
-            trigger_type = "sprint"
-        
-        # Check Curiosity Strategy
-        elif prefs.enable_curiosity and await self.curiosity_strategy.should_trigger(user, self.db):
-            trigger_strategy = self.curiosity_strategy
-            trigger_type = "curiosity"
-
-        # Check Memory Strategy
-        elif await self.memory_strategy.should_trigger(user, self.db):
-            trigger_strategy = self.memory_strategy
-            trigger_type = "memory"
-            
-        # Check Inactivity Strategy
-        elif await self.inactivity_strategy.should_trigger(user, self.db):
-            trigger_strategy = self.inactivity_strategy
-            trigger_type = "inactivity"
+        for trigger_type, strategy in self.strategies:
+            pending = [uid for uid in user_ids if uid not in triggers]
+            if not pending:
+                break
+            for user_id, data in (await strategy.evaluate_many(pending, self.db)).items():
+                triggers.setdefault(user_id, (trigger_type, data))
 
-        if not trigger_strategy:
-            return False
+        return triggers
 
-        # 4. Generate Content
-        # For curiosity, we might generate capsule inside get_trigger_data or separate
-        if trigger_type == "curiosity":
-            # Generate capsule first
-            capsule = await curiosity_capsule_service.generate_daily_capsule(user.id, self.db)
-            if capsule:
+    async def _prepare_push(
+        self,
+        user: User,
+        trigger_type: str,
+        trigger_data: Dict[str, Any],
+        semaphore: asyncio.Semaphore
+    ) -> Optional[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """
+        Generate push content for one user.
+        Returns (content_dict, trigger_data), or None if no content could be generated.
+        """
+        async with semaphore:
+            if trigger_type == "curiosity":
+                # Capsule generation reads and writes the DB: use its own session so it can run concurrently
+                async with AsyncSessionLocal() as session:
+                    capsule = await curiosity_capsule_service.generate_daily_capsule(user.id, session)
+                if not capsule:
+                    return None
                 trigger_data = {"capsule_id": str(capsule.id), "title": capsule.title, "preview": capsule.content[:50]}
                 content_dict = {
                     "title": f"✨ 好奇心胶囊: {capsule.title}",
                     "body": f"发现一个新知识点！{capsule.content[:30]}..."
                 }
             else:
-                return False
-        else:
-            trigger_data = await trigger_strategy.get_trigger_data(user, self.db)
-            content_dict = await self._generate_push_content(user, prefs, trigger_type, trigger_data)
-        
-        if not content_dict:
-            logger.warning("Failed to generate push content.")
-            return False
+                content_dict = await self._generate_push_content(user, user.push_preference, trigger_type, trigger_data)
 
-        # 5. Send & Record
-        await self._send_push(user, trigger_type, content_dict, trigger_data)
-        
-        return True
+        if not content_dict:
+            logger.warning(f"Failed to generate push content for user {user.id}.")
+            return None
+        return content_dict, trigger_data
 
-    async def _check_frequency_cap(self, user: User, prefs: PushPreference) -> bool:
+    async def _capped_user_ids(self, users: Sequence[User]) -> Set[UUID]:
         """
-        Check if user reached daily cap or is in cooldown.
-        Returns True if BLOCKED (capped), False if ALLOWED.
+        Users that reached their daily cap or are in cooldown.
+        Users sharing the same local day start (i.e. timezone) are counted with one grouped query.
         """
         now = datetime.now(timezone.utc)
+        capped: Set[UUID] = set()
+        by_day_start: Dict[datetime, List[User]] = {}
 
-        # Cooldown check (e.g., at least 2 hours between pushes)
-        if prefs.last_push_time:
-            last_time = prefs.last_push_time
-            if last_time.tzinfo is None:
-                last_time = last_time.replace(tzinfo=timezone.utc)
-            
-            if (now - last_time) < timedelta(hours=2):
-                return True
+        for user in users:
+            prefs = user.push_preference
+
+            # Cooldown check (at least 2 hours between pushes)
+            if prefs.last_push_time:
+                last_time = prefs.last_push_time
+                if last_time.tzinfo is None:
+                    last_time = last_time.replace(tzinfo=timezone.utc)
+                if (now - last_time) < PUSH_COOLDOWN:
+                    capped.add(user.id)
+                    continue
+
+            by_day_start.setdefault(self._utc_start_of_local_day(prefs, now), []).append(user)
 
         # Daily Cap Check
-        # Convert now to user's local time to determine "today"
+        for day_start, group in by_day_start.items():
+            query = (
+                select(PushHistory.user_id, func.count())
+                .where(
+                    PushHistory.user_id.in_([u.id for u in group]),
+                    PushHistory.created_at >= day_start
+                )
+                .group_by(PushHistory.user_id)
+            )
+            result = await self.db.execute(query)
+            counts = dict(result.all())
+            capped.update(u.id for u in group if counts.get(u.id, 0) >= u.push_preference.daily_cap)
+
+        return capped
+
+    @staticmethod
+    def _utc_start_of_local_day(prefs: PushPreference, now: datetime) -> datetime:
+        """
+        Start of the user's local "today", as naive UTC (PushHistory.created_at is naive UTC).
+        """
         try:
             tz = ZoneInfo(prefs.timezone or "Asia/Shanghai")
-            local_now = now.astimezone(tz)
         except Exception:
             tz = ZoneInfo("Asia/Shanghai")
-            local_now = now.astimezone(tz)
-        
-        # Start of local day in UTC
-        local_start_of_day = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
-        utc_start_of_day = local_start_of_day.astimezone(timezone.utc)
-
-        query = select(func.count()).select_from(PushHistory).where(
-            and_(
-                PushHistory.user_id == user.id,
-                PushHistory.created_at >= utc_start_of_day
-            )
-        )
-        result = await self.db.execute(query)
-        daily_count = result.scalar() or 0
-        
-        return daily_count >= prefs.daily_cap
+
+        local_start_of_day = now.astimezone(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        return local_start_of_day.astimezone(timezone.utc).replace(tzinfo=None)
 
     def _is_active_time(self, prefs: PushPreference) -> bool:
         """
@@ -236,7 +361,7 @@ class PushService:
             context_data=data
         )
 
-    async def _send_push(self, user: User, trigger_type: str, content: Dict[str, str], data: Dict):
+    async def _send_push(self, user_id: UUID, trigger_type: str, content: Dict[str, str], data: Dict):
         """
         Create Notification and History records.
         """
@@ -250,15 +375,14 @@ class PushService:
             type=trigger_type,
             data=data
         )
-        await NotificationService.create(self.db, user.id, notif_create)
+        await NotificationService.create(self.db, user_id, notif_create)
         
         # 2. Create PushHistory (Analytics)
-        import hashlib
         # Hash body content
         content_hash = hashlib.md5(body.encode('utf-8')).hexdigest()
         
         history = PushHistory(
-            user_id=user.id,
+            user_id=user_id,
             trigger_type=trigger_type,
             content_hash=content_hash,
             status="sent"
@@ -266,7 +390,11 @@ class PushService:
         self.db.add(history)
         
         # 3. Update User Preferences (Last push time)
-        user.push_preference.last_push_time = datetime.now(timezone.utc)
+        await self.db.execute(
+            update(PushPreference)
+            .where(PushPreference.user_id == user_id)
+            .values(last_push_time=datetime.utcnow())
+        )
         
         await self.db.commit()
-        logger.info(f"Push sent to user {user.id} [{trigger_type}]: {title} - {body}")
+        logger.info(f"Push sent to user {user_id} [{trigger_type}]: {title} - {body}")
@@ -1,4 +1,4 @@
-from app.services.push_strategies.strategy import SprintStrategy, MemoryStrategy, InactivityStrategy
+from app.services.push_strategies.strategy import PushStrategy, SprintStrategy, MemoryStrategy, InactivityStrategy
 from app.services.push_strategies.curiosity import CuriosityStrategy
 
-__all__ = ["SprintStrategy", "MemoryStrategy", "InactivityStrategy", "CuriosityStrategy"]
+__all__ = ["PushStrategy", "SprintStrategy", "MemoryStrategy", "InactivityStrategy", "CuriosityStrategy"]
\ No newline at end of file
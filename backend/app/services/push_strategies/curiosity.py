@@ -1,43 +1,34 @@
 """
 Curiosity Push Strategy
 """
-from typing import Dict, Any
+from typing import Dict, Any, Sequence
+from uuid import UUID
+from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.user import User
+from app.models.user import PushPreference
 from app.services.push_strategies.strategy import PushStrategy
 
 class CuriosityStrategy(PushStrategy):
     """
     Push strategy for daily curiosity capsules.
     """
-    async def should_trigger(self, user: User, db: AsyncSession) -> bool:
+    async def evaluate_many(self, user_ids: Sequence[UUID], db: AsyncSession) -> Dict[UUID, Dict[str, Any]]:
         """
-        Trigger if user has curiosity preference enabled and no unread capsule.
-        """
-        # Note: We rely on the main PushService to check frequency caps and active time.
-        # Here we just check if we SHOULD send a curiosity push logically.
-        
-        # 1. Check preference (already checked in caller usually, but safe to re-check)
-        if not user.push_preference or not user.push_preference.enable_curiosity:
-            return False
-            
-        # 2. Check if already has an unread capsule from today?
-        # If user has an unread capsule, maybe we don't want to spam, 
-        # OR we want to remind them.
-        # Let's assume we trigger if we generate a NEW one.
-        # For simplicity in this strategy: Always True if enabled, 
-        # and let the service generation logic decide if it actually creates content.
-        
-        # A more complex logic: check if user already engaged with curiosity content today.
-        
-        return True
+        Trigger for every user with curiosity pushes enabled.
 
-    async def get_trigger_data(self, user: User, db: AsyncSession) -> Dict[str, Any]:
-        """
-        Return context data for content generation.
+        Frequency caps and active time are checked by PushService; whether a capsule
+        is actually produced is decided when the service generates it.
         """
-        # The content generation happens in the service, 
-        # here we return empty or minimal context.
-        return {
-            "type": "curiosity_capsule"
-        }
+        if not user_ids:
+            return {}
+
+        query = select(PushPreference.user_id).where(
+            and_(
+                PushPreference.user_id.in_(user_ids),
+                PushPreference.enable_curiosity == True
+            )
+        )
+        result = await db.execute(query)
+
+        # The content generation happens in the service, here we return minimal context.
+        return {user_id: {"type": "curiosity_capsule"} for user_id in result.scalars().all()}
@@ -1,47 +1,66 @@
+import math
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Sequence
+from uuid import UUID
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
 
 from app.models.user import User
-from app.models.plan import Plan, PlanType
+from app.models.plan import Plan
 from app.models.galaxy import UserNodeStatus, KnowledgeNode
 from app.services.decay_service import DecayService
 
 class PushStrategy(ABC):
     """
     Abstract base class for push notification strategies.
+
+    Strategies are evaluated in bulk: evaluate_many() answers for a whole batch of
+    users with one aggregated query. Strategies hold no per-user state, so a single
+    instance can be shared across users, batches and concurrent cycles.
     """
-    
+
     @abstractmethod
+    async def evaluate_many(self, user_ids: Sequence[UUID], db: AsyncSession) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Evaluate the strategy for a batch of users.
+
+        Args:
+            user_ids: Users to evaluate.
+            db: Database session.
+
+        Returns:
+            {user_id: trigger_data} for the users that should be pushed;
+            users that do not trigger are omitted.
+        """
+        pass
+
     async def should_trigger(self, user: User, db: AsyncSession, context: Dict[str, Any] = None) -> bool:
         """
         Determine if the push notification should be triggered for the given user.
-        
+
         Args:
             user: The user object.
             db: Database session.
             context: Additional context data.
-            
+
         Returns:
             True if the push should be triggered, False otherwise.
         """
-        pass
+        return user.id in await self.evaluate_many([user.id], db)
 
-    @abstractmethod
     async def get_trigger_data(self, user: User, db: AsyncSession) -> Dict[str, Any]:
         """
         Get data required for generating the push content.
-        
+
         Args:
             user: The user object.
             db: Database session.
-            
+
         Returns:
-            Dictionary containing data for content generation.
+            Dictionary containing data for content generation (empty if not triggered).
         """
-        pass
+        return (await self.evaluate_many([user.id], db)).get(user.id, {})
 
 
 class MemoryStrategy(PushStrategy):
@@ -49,103 +68,66 @@ class MemoryStrategy(PushStrategy):
     记忆临界点策略 (Memory Retention Strategy)
     Trigger: When retention < 30% and importance > 4.
     """
-    
-    def __init__(self):
-        self.trigger_nodes = [] # Cache found nodes to avoid re-querying in get_trigger_data
 
-    async def should_trigger(self, user: User, db: AsyncSession, context: Dict[str, Any] = None) -> bool:
+    RETENTION_THRESHOLD = 0.3
+    MAX_NODES = 2
+
+    async def evaluate_many(self, user_ids: Sequence[UUID], db: AsyncSession) -> Dict[UUID, Dict[str, Any]]:
         """
-        Check if user has important nodes with low retention.
-        Retention is calculated via DecayService logic (implicitly via mastery_score/time).
-        However, the prompt specifies checking "retention < 0.3".
-        Since retention is a calculated value at runtime, we can use the formula from DecayService
-        or approximate using mastery_score if DecayService stores decayed mastery.
-        
-        DecayService:
-        Retention = e^(-t/S)
-        New Mastery = Current Mastery * Retention
-        
-        If the prompt strictly means "current calculated retention < 0.3", we need to calculate it.
-        Let's assume we find nodes where calculated retention is low.
-        
-        Requirement: retention < 0.3 AND importance > 4.
+        Find the most urgent 1-2 important nodes with low retention for every user.
+
+        Retention uses the DecayService formula, computed in SQL:
+            Retention = e^(-ln2 / half_life * days_elapsed)
+            half_life = BASE_HALF_LIFE_DAYS * (1 + mastery / 100 * 2)
+        A row_number() window keeps the lowest-retention nodes per user.
         """
-        decay_service = DecayService(db)
-        
-        # We need to join UserNodeStatus with KnowledgeNode to check importance
-        query = (
-            select(UserNodeStatus, KnowledgeNode)
+        if not user_ids:
+            return {}
+
+        now = datetime.utcnow()  # last_study_at is stored as naive UTC
+        days_elapsed = func.floor(
+            func.extract('epoch', now - UserNodeStatus.last_study_at) / 86400.0
+        )
+        effective_half_life = DecayService.BASE_HALF_LIFE_DAYS * (1 + (UserNodeStatus.mastery_score / 100.0) * 2.0)
+        retention = func.exp(-math.log(2) / effective_half_life * days_elapsed)
+
+        candidates = (
+            select(
+                UserNodeStatus.user_id,
+                KnowledgeNode.name,
+                retention.label("retention"),
+                func.row_number().over(
+                    partition_by=UserNodeStatus.user_id,
+                    order_by=retention
+                ).label("rank")
+            )
             .join(KnowledgeNode, UserNodeStatus.node_id == KnowledgeNode.id)
             .where(
                 and_(
-                    UserNodeStatus.user_id == user.id,
+                    UserNodeStatus.user_id.in_(user_ids),
                     UserNodeStatus.is_unlocked == True,
                     UserNodeStatus.decay_paused == False,
+                    UserNodeStatus.last_study_at != None,
                     KnowledgeNode.importance_level > 4,  # High importance
-                    UserNodeStatus.mastery_score > decay_service.MIN_MASTERY # meaningful nodes
+                    UserNodeStatus.mastery_score > DecayService.MIN_MASTERY,  # meaningful nodes
+                    retention < self.RETENTION_THRESHOLD
                 )
             )
+            .subquery()
+        )
+        query = (
+            select(candidates.c.user_id, candidates.c.name, candidates.c.retention)
+            .where(candidates.c.rank <= self.MAX_NODES)
+            .order_by(candidates.c.user_id, candidates.c.rank)
         )
-        
         result = await db.execute(query)
-        rows = result.all()
-        
-        self.trigger_nodes = []
-        now = datetime.now(timezone.utc)
-        
-        for status, node in rows:
-            if not status.last_study_at:
-                continue
-                
-            days_elapsed = (now - status.last_study_at).days
-            
-            # Re-implement retention calculation logic from DecayService._calculate_decay
-            # or simply use the fact that if mastery is low enough relative to initial?
-            # But DecayService updates mastery daily.
-            # So `mastery_score` IS the current decayed mastery (approximately).
-            # The prompt says "retention < 0.3". Retention is a factor (0-1).
-            # This implies we calculate: Retention = e^(-t/S).
-            
-            # Using logic from DecayService:
-            stability_factor = 1 + (status.mastery_score / 100) * 2
-            effective_half_life = decay_service.BASE_HALF_LIFE_DAYS * stability_factor
-            
-            import math
-            if effective_half_life > 0:
-                decay_rate = math.log(2) / effective_half_life
-                retention = math.exp(-decay_rate * days_elapsed)
-            else:
-                retention = 0.0
-
-            if retention < 0.3:
-                self.trigger_nodes.append({
-                    "node_name": node.name,
-                    "retention": retention,
-                    "mastery": status.mastery_score
-                })
-                
-            if len(self.trigger_nodes) >= 2:
-                break
-                
-        return len(self.trigger_nodes) > 0
 
-    async def get_trigger_data(self, user: User, db: AsyncSession) -> Dict[str, Any]:
-        """
-        Return the most urgent 1-2 knowledge nodes and current retention rate.
-        """
-        # If should_trigger was called in the same request context, self.trigger_nodes might be populated.
-        # But for safety (statelessness), we should probably re-query or assume the caller manages state.
-        # Given this is a service method, let's re-run the query if empty, or optimization is needed.
-        # For this implementation, I'll allow re-running query if list is empty to be stateless safe.
-        
-        if not self.trigger_nodes:
-            await self.should_trigger(user, db)
-            
-        return {
-            "type": "memory",
-            "nodes": [n["node_name"] for n in self.trigger_nodes],
-            "retention_rate": min([n["retention"] for n in self.trigger_nodes]) if self.trigger_nodes else 0.0
-        }
+        triggered: Dict[UUID, Dict[str, Any]] = {}
+        for user_id, node_name, node_retention in result.all():
+            data = triggered.setdefault(user_id, {"type": "memory", "nodes": [], "retention_rate": 1.0})
+            data["nodes"].append(node_name)
+            data["retention_rate"] = min(data["retention_rate"], float(node_retention))
+        return triggered
 
 
 class SprintStrategy(PushStrategy):
@@ -154,90 +136,74 @@ class SprintStrategy(PushStrategy):
     Trigger: User has a Plan with deadline in < 72 hours.
     """
 
-    async def should_trigger(self, user: User, db: AsyncSession, context: Dict[str, Any] = None) -> bool:
+    async def evaluate_many(self, user_ids: Sequence[UUID], db: AsyncSession) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Pick the nearest active, not yet expired plan due within 72 hours per user (DISTINCT ON).
+        """
+        if not user_ids:
+            return {}
+
         now = datetime.now(timezone.utc)
-        deadline_threshold = now + timedelta(hours=72)
-        
+        today = now.date()
         # Plan.target_date is Date, so we compare with date component
-        # We look for Active plans
-        query = select(Plan).where(
-            and_(
-                Plan.user_id == user.id,
-                Plan.is_active == True,
-                Plan.target_date != None,
-                Plan.target_date <= deadline_threshold.date(),
-                Plan.target_date >= now.date() # Not expired
+        deadline_threshold = (now + timedelta(hours=72)).date()
+
+        query = (
+            select(Plan.user_id, Plan.name, Plan.target_date)
+            .where(
+                and_(
+                    Plan.user_id.in_(user_ids),
+                    Plan.is_active == True,
+                    Plan.target_date != None,
+                    Plan.target_date <= deadline_threshold,
+                    Plan.target_date >= today  # Not expired
+                )
             )
+            .distinct(Plan.user_id)
+            .order_by(Plan.user_id, Plan.target_date)
         )
-        
         result = await db.execute(query)
-        self.urgent_plans = result.scalars().all()
-        
-        return len(self.urgent_plans) > 0
-
-    async def get_trigger_data(self, user: User, db: AsyncSession) -> Dict[str, Any]:
-        if not hasattr(self, 'urgent_plans') or not self.urgent_plans:
-            await self.should_trigger(user, db)
-            
-        if not self.urgent_plans:
-            return {}
 
-        plan = self.urgent_plans[0] # Take the first one
-        
-        # Calculate remaining hours
-        # Assuming target_date is end of that day (23:59:59) for safety or just 00:00
-        # Let's treat target_date as date object.
-        now = datetime.now(timezone.utc)
-        # Naive conversion for Plan.target_date (Date) to datetime
-        # Plan.target_date is likely naive date. 
-        # We need to be careful with timezones.
-        # Let's assume target date is in user's timezone or UTC.
-        # For simplicity, calculate days difference * 24.
-        
-        days_diff = (plan.target_date - now.date()).days
-        hours_remaining = max(0, days_diff * 24) 
-        # Refine: if it's today, hours remaining is until end of day? 
-        # Or just use raw hours if possible. 
-        # Given simple Date field, hours is approximation.
-        
+        # target_date has no time component: hours remaining is approximated by whole days
         return {
-            "type": "sprint",
-            "plan_name": plan.name,
-            "hours_remaining": hours_remaining
+            user_id: {
+                "type": "sprint",
+                "plan_name": name,
+                "hours_remaining": max(0, (target_date - today).days * 24)
+            }
+            for user_id, name, target_date in result.all()
         }
 
 
 class InactivityStrategy(PushStrategy):
     """
     长期未活跃唤醒 (Inactivity Wake-up Strategy)
-    Trigger: User.last_active_at > 24 hours.
+    Trigger: User inactive for more than 24 hours.
     """
 
-    async def should_trigger(self, user: User, db: AsyncSession, context: Dict[str, Any] = None) -> bool:
-        # Check for last_active_at, fallback to updated_at, then created_at
-        last_active = getattr(user, "last_active_at", None)
-        if not last_active:
-            # Fallback logic: check updated_at or notifications/tasks?
-            # Using updated_at from BaseModel
-            last_active = user.updated_at
-        
-        if not last_active:
-            last_active = user.created_at
-
-        if not last_active:
-            return False
-
-        # Ensure timezone awareness
-        if last_active.tzinfo is None:
-            last_active = last_active.replace(tzinfo=timezone.utc)
-            
-        now = datetime.now(timezone.utc)
-        diff = now - last_active
-        
-        return diff > timedelta(hours=24)
+    INACTIVE_AFTER = timedelta(hours=24)
+
+    async def evaluate_many(self, user_ids: Sequence[UUID], db: AsyncSession) -> Dict[UUID, Dict[str, Any]]:
+        """
+        Users whose last activity (updated_at, falling back to created_at) is older than 24 hours.
+        """
+        if not user_ids:
+            return {}
+
+        now = datetime.utcnow()  # User timestamps are stored as naive UTC
+        last_active = func.coalesce(User.updated_at, User.created_at)
+        query = select(User.id, last_active).where(
+            and_(
+                User.id.in_(user_ids),
+                last_active < now - self.INACTIVE_AFTER
+            )
+        )
+        result = await db.execute(query)
 
-    async def get_trigger_data(self, user: User, db: AsyncSession) -> Dict[str, Any]:
         return {
-            "type": "inactivity",
-            "last_active_hours_ago": 24 # Simplified
+            user_id: {
+                "type": "inactivity",
+                "last_active_hours_ago": int((now - active_at).total_seconds() // 3600)
+            }
+            for user_id, active_at in result.all()
         }
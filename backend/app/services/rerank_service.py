@@ -1,6 +1,10 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
+import hashlib
+import os
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from loguru import logger
 from app.config import settings
 
@@ -9,13 +13,41 @@ class RerankService:
     Rerank Service for RAG v2.0
     Supports:
     - RRF (Reciprocal Rank Fusion)
-    - Cross-Encoder Reranking (Local Model)
+    - Cross-Encoder Reranking (Local Model, PyTorch or ONNX Runtime backend)
+
+    Pairs from concurrent rerank calls are collected for RERANK_BATCH_WINDOW_MS
+    and scored in one batched inference call; scores are cached per
+    (query, chunk) in an in-process LRU so repeated searches skip inference.
     """
 
     def __init__(self):
         self.model = None
+        self.backend = settings.RERANK_BACKEND
+        self.max_batch_size = settings.RERANK_MAX_BATCH_SIZE
+        self.batch_window = settings.RERANK_BATCH_WINDOW_MS / 1000
+        self.cache_size = settings.RERANK_CACHE_SIZE
+
+        # A single inference thread: batches are already large, and a second
+        # concurrent predict would only compete for the same cores
         self.executor = ThreadPoolExecutor(max_workers=1)
         self._load_model_task = None
+
+        # PyTorch backend: activation passed to CrossEncoder.predict so it
+        # returns raw logits regardless of the model's default activation
+        self._logit_activation = None
+
+        # ONNX backend
+        self._session = None
+        self._tokenizer = None
+
+        # Score LRU: (query_hash, chunk_key) -> score
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+        # Micro-batch queue: (cache_key, [query, text], future)
+        self._pending: List[Tuple[Tuple[str, str], List[str], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+
         # Start loading model in background if loop is running
         try:
             loop = asyncio.get_running_loop()
@@ -35,18 +67,81 @@ class RerankService:
     async def _load_model(self):
         """Load Cross-Encoder model in background"""
         try:
-            logger.info("⏳ Loading Reranker model (cross-encoder/ms-marco-MiniLM-L-6-v2)...")
+            logger.info(f"⏳ Loading Reranker model ({settings.RERANK_MODEL}, backend={self.backend})...")
             # Run in executor to avoid blocking loop
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(self.executor, self._init_transformer)
+            await loop.run_in_executor(self.executor, self._init_model)
             logger.success("✅ Reranker model loaded.")
         except Exception as e:
             logger.error(f"❌ Failed to load Reranker model: {e}")
 
+    def _init_model(self):
+        if self.backend == "onnx":
+            try:
+                self._init_onnx()
+                return
+            except ImportError as e:
+                logger.warning(f"ONNX Runtime not available ({e}), falling back to PyTorch reranker")
+                self.backend = "torch"
+        self._init_transformer()
+
     def _init_transformer(self):
+        import torch
         from sentence_transformers import CrossEncoder
+        torch.set_num_threads(settings.RERANK_INTRA_OP_THREADS)
+        self._logit_activation = torch.nn.Identity()
         # Use a lightweight model for speed/cpu
-        self.model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', max_length=512)
+        self.model = CrossEncoder(settings.RERANK_MODEL, max_length=512)
+
+    def _init_onnx(self):
+        """Load an exported (optionally int8-quantized) MiniLM cross-encoder"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = settings.RERANK_ONNX_PATH
+        model_file = os.path.join(path, "model.onnx") if os.path.isdir(path) else path
+        tokenizer_source = path if os.path.isdir(path) else settings.RERANK_MODEL
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = settings.RERANK_INTRA_OP_THREADS
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self._session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_source)
+        self.model = self._session
+
+    @staticmethod
+    def _sigmoid(logits: np.ndarray) -> np.ndarray:
+        """Map cross-encoder logits to relevance in [0, 1] (same for both backends)"""
+        return (1.0 / (1.0 + np.exp(-np.asarray(logits, dtype=np.float32).reshape(-1)))).astype(np.float32)
+
+    def _predict(self, pairs: List[List[str]]) -> np.ndarray:
+        """Score pairs in batches of RERANK_MAX_BATCH_SIZE (runs in the executor)"""
+        if self.backend != "onnx":
+            logits = self.model.predict(
+                pairs,
+                batch_size=self.max_batch_size,
+                show_progress_bar=False,
+                activation_fct=self._logit_activation,
+            )
+            return self._sigmoid(logits)
+
+        input_names = {i.name for i in self._session.get_inputs()}
+        scores = []
+        for start in range(0, len(pairs), self.max_batch_size):
+            batch = pairs[start:start + self.max_batch_size]
+            encoded = self._tokenizer(
+                [q for q, _ in batch],
+                [d for _, d in batch],
+                padding=True,
+                truncation=True,
+                max_length=512,
+                return_tensors="np",
+            )
+            feed = {name: value.astype(np.int64) for name, value in encoded.items() if name in input_names}
+            scores.append(self._sigmoid(self._session.run(None, feed)[0]))
+        return np.concatenate(scores)
 
     def reciprocal_rank_fusion(self, search_results_list: List[List[Any]], k: int = 60) -> List[tuple]:
         """
@@ -57,7 +152,7 @@ class RerankService:
         """
         scores = {} # item_id -> score
         items = {} # item_id -> item object
-        
+
         for results in search_results_list:
             for rank, item in enumerate(results):
                 # We assume item has an 'id' attribute or key
@@ -66,64 +161,164 @@ class RerankService:
                     item_id = str(item.get("id"))
                 else:
                     item_id = str(item.id)
-                    
+
                 if item_id not in scores:
                     scores[item_id] = 0.0
                     items[item_id] = item
-                
+
                 scores[item_id] += 1.0 / (k + rank + 1)
-        
+
         # Sort by score desc
         sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
         return [(items[item_id], score) for item_id, score in sorted_results]
 
+    # ==========================================
+    # Score cache
+    # ==========================================
+
+    @staticmethod
+    def _candidate_text(c: Any) -> str:
+        # Handle dict or object
+        if isinstance(c, dict):
+            return c.get('content', '') or c.get('description', '') or c.get('name', '')
+        return getattr(c, 'content', '') or getattr(c, 'description', '') or getattr(c, 'name', '')
+
+    @staticmethod
+    def _cache_key(query_hash: str, c: Any, text: str) -> Tuple[str, str]:
+        chunk_id = c.get('id') if isinstance(c, dict) else getattr(c, 'id', None)
+        # The text digest keeps scores valid when a chunk is re-indexed with new content
+        text_hash = hashlib.sha1(text.encode()).hexdigest()[:16]
+        return query_hash, f"{chunk_id}:{text_hash}"
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        score = self._scores.get(key)
+        if score is not None:
+            self._scores.move_to_end(key)
+        return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float):
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        while len(self._scores) > self.cache_size:
+            self._scores.popitem(last=False)
+
+    # ==========================================
+    # Reranking
+    # ==========================================
+
     async def rerank(self, query: str, candidates: List[Any], top_k: int = 5) -> List[Any]:
         """
         Rerank candidates based on query using local Cross-Encoder.
         """
+        return [item for item, _ in await self.rerank_with_scores(query, candidates, top_k)]
+
+    async def rerank_with_scores(
+        self,
+        query: str,
+        candidates: List[Any],
+        top_k: int = 5
+    ) -> List[Tuple[Any, Optional[float]]]:
+        """
+        Rerank candidates and return (item, score) pairs, best first.
+        Scores are cross-encoder relevance in [0, 1]; None when the model is
+        unavailable and the original order is kept.
+        """
         if not candidates:
             return []
-            
+
         if not self.model:
             # If model not ready or failed, return original top_k
             logger.warning("Reranker model not ready, returning original order.")
-            return candidates[:top_k]
+            return [(c, None) for c in candidates[:top_k]]
 
         try:
-            # Prepare pairs [query, doc_text]
-            # Handle dict or object
-            pairs = []
-            valid_candidates = []
-            
-            for c in candidates:
-                text = ""
-                if isinstance(c, dict):
-                    text = c.get('content', '') or c.get('description', '') or c.get('name', '')
-                else:
-                    text = getattr(c, 'content', '') or getattr(c, 'description', '') or getattr(c, 'name', '')
-                
-                if text:
-                    pairs.append([query, text])
-                    valid_candidates.append(c)
-            
-            if not pairs:
-                return candidates[:top_k]
-
-            # Run inference in executor
+            query_hash = hashlib.sha1(query.encode()).hexdigest()
             loop = asyncio.get_running_loop()
-            scores = await loop.run_in_executor(self.executor, lambda: self.model.predict(pairs))
-            
-            # Combine candidates with scores
-            scored_candidates = list(zip(valid_candidates, scores))
-            
+
+            scored = []
+            waiting = []
+            for c in candidates:
+                text = self._candidate_text(c)
+                if not text:
+                    continue
+                key = self._cache_key(query_hash, c, text)
+                score = self._cache_get(key)
+                if score is not None:
+                    scored.append((c, score))
+                    continue
+
+                future = loop.create_future()
+                self._pending.append((key, [query, text], future))
+                waiting.append((c, future))
+
+            if waiting:
+                if len(self._pending) >= self.max_batch_size:
+                    self._schedule_flush(loop, delay=0)
+                elif self._flush_handle is None:
+                    self._schedule_flush(loop, delay=self.batch_window)
+
+                scores = await asyncio.gather(*(future for _, future in waiting))
+                scored.extend((c, score) for (c, _), score in zip(waiting, scores))
+
+            if not scored:
+                return [(c, None) for c in candidates[:top_k]]
+
             # Sort by score desc
-            scored_candidates.sort(key=lambda x: x[1], reverse=True)
-            
+            scored.sort(key=lambda x: x[1], reverse=True)
+
             # Return top_k items
-            return [item for item, score in scored_candidates[:top_k]]
-            
+            return scored[:top_k]
+
         except Exception as e:
             logger.error(f"Error during reranking: {e}")
-            return candidates[:top_k]
+            return [(c, None) for c in candidates[:top_k]]
+
+    # ==========================================
+    # Micro-batching
+    # ==========================================
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        task = loop.create_task(self._flush_pending())
+        # Keep a reference so the task is not garbage collected early
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_pending(self):
+        """Score all pairs queued within the window in one inference call"""
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # Identical (query, chunk) pairs from concurrent requests are scored once
+        unique: Dict[Tuple[str, str], List[str]] = {}
+        for key, pair, _ in pending:
+            unique.setdefault(key, pair)
+
+        try:
+            loop = asyncio.get_running_loop()
+            keys = list(unique)
+            pairs = [unique[k] for k in keys]
+            scores = await loop.run_in_executor(self.executor, self._predict, pairs)
+        except Exception as e:
+            logger.error(f"Batched rerank failed ({len(pending)} pairs): {e}")
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        results = {}
+        for key, score in zip(keys, scores):
+            results[key] = float(score)
+            self._cache_put(key, float(score))
+
+        for key, _, future in pending:
+            if not future.done():
+                future.set_result(results[key])
 
 rerank_service = RerankService()
@@ -2,6 +2,10 @@
 Redis Semantic Cache Service - 语义缓存服务
 
 用于缓存 GraphRAG 查询结果，基于语义相似度检索缓存
+
+两种查找模式：
+- exact: 标准化查询文本的 SHA256 精确匹配
+- semantic: 查询向量写入 RediSearch 向量索引，get 时做 KNN 检索并按相似度阈值判定命中
 """
 
 import json
@@ -11,13 +15,25 @@ from datetime import datetime, timedelta
 from loguru import logger
 import numpy as np
 
+from app.config import settings
+from app.core.metrics import CACHE_HIT_COUNT, SEMANTIC_CACHE_SIMILARITY
+
 try:
     from redis import Redis
+    from redis.commands.search.field import TagField, VectorField
+    from redis.commands.search.index_definition import IndexDefinition, IndexType
+    from redis.commands.search.query import Query
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
     logger.warning("Redis not available, semantic cache disabled")
 
+# 相似度分布统计的桶边界（用于调优阈值）
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.95, 0.96, 0.98, 0.99, 1.0)
+
+# 全局作用域下使用的 user_id 标签值
+GLOBAL_SCOPE_TAG = "global"
+
 
 class SemanticCacheService:
     """
@@ -25,24 +41,51 @@ class SemanticCacheService:
 
     功能：
     - 基于查询文本的语义哈希缓存
+    - 向量相似度检索（semantic 模式，RediSearch KNN）
+    - 按用户或全局作用域隔离缓存
     - TTL 管理（根据内容类型设置不同过期时间）
-    - 缓存命中率统计
+    - 缓存命中率与相似度分布统计
     - LRU 驱逐策略
     """
 
+    MODE_EXACT = "exact"
+    MODE_SEMANTIC = "semantic"
+
+    SCOPE_USER = "user"
+    SCOPE_GLOBAL = "global"
+
     def __init__(
         self,
         redis_client: Optional[Redis] = None,
         default_ttl: int = 3600,  # 1小时
         max_cache_size: int = 10000,
+        mode: str = MODE_EXACT,
+        scope: str = SCOPE_USER,
+        embedding_service=None,
+        similarity_threshold: float = 0.95,
+        embedding_dim: int = settings.EMBEDDING_DIM,
     ):
         self.redis = redis_client
         self.default_ttl = default_ttl
         self.max_cache_size = max_cache_size
+        self.mode = mode
+        self.scope = scope
+        self.embedding_service = embedding_service
+        self.similarity_threshold = similarity_threshold
+        self.embedding_dim = embedding_dim
+
+        if self.mode == self.MODE_SEMANTIC and self.embedding_service is None:
+            logger.warning("Semantic cache mode requires an embedding service, falling back to exact mode")
+            self.mode = self.MODE_EXACT
 
         # 缓存键前缀
         self.CACHE_PREFIX = "semantic_cache:"
         self.STATS_KEY = "semantic_cache:stats"
+        self.SIMILARITY_KEY = "semantic_cache:similarity"
+        self.VECTOR_PREFIX = "semantic_cache:vec:"
+        self.INDEX_NAME = "idx:semantic_cache"
+
+        self._index_ready = False
 
         # 初始化统计
         if self.redis and REDIS_AVAILABLE:
@@ -80,11 +123,181 @@ class SemanticCacheService:
 
         return f"{self.CACHE_PREFIX}{hash_key}"
 
+    # ==========================================
+    # 向量模式 (semantic) 辅助方法
+    # ==========================================
+
+    def _scope_tag(self, user_id: Optional[str]) -> str:
+        """根据作用域返回写入/过滤用的 user_id 标签值"""
+        if self.scope == self.SCOPE_GLOBAL or not user_id:
+            return GLOBAL_SCOPE_TAG
+        return str(user_id)
+
+    def _generate_vector_key(self, query: str, user_id: Optional[str] = None) -> str:
+        """生成向量条目键（同一作用域内相同的标准化查询映射到同一个键）"""
+        normalized_query = query.strip().lower()
+        cache_input = f"{normalized_query}:{self._scope_tag(user_id)}"
+        hash_key = hashlib.sha256(cache_input.encode()).hexdigest()
+        return f"{self.VECTOR_PREFIX}{hash_key}"
+
+    @staticmethod
+    def _escape_tag(value: str) -> str:
+        """转义 RediSearch TAG 查询中的特殊字符（UUID 中的 '-' 等）"""
+        special = set(",.<>{}[]\"':;!@#$%^&*()-+=~| /")
+        return "".join(f"\\{c}" if c in special else c for c in value)
+
+    def _ensure_vector_index(self) -> bool:
+        """确保向量索引存在（HASH 文档，COSINE 距离）"""
+        if self._index_ready:
+            return True
+
+        try:
+            self.redis.ft(self.INDEX_NAME).info()
+            self._index_ready = True
+            return True
+        except Exception:
+            pass
+
+        try:
+            schema = (
+                TagField("user_id"),
+                VectorField(
+                    "embedding",
+                    "HNSW",
+                    {
+                        "TYPE": "FLOAT32",
+                        "DIM": self.embedding_dim,
+                        "DISTANCE_METRIC": "COSINE",
+                    },
+                ),
+            )
+            definition = IndexDefinition(prefix=[self.VECTOR_PREFIX], index_type=IndexType.HASH)
+            self.redis.ft(self.INDEX_NAME).create_index(schema, definition=definition)
+            logger.info(f"Semantic cache vector index '{self.INDEX_NAME}' created")
+            self._index_ready = True
+            return True
+        except Exception as e:
+            logger.error(f"Failed to create semantic cache index: {e}")
+            return False
+
+    async def _embed(self, query: str) -> Optional[bytes]:
+        """将查询文本向量化为 FLOAT32 二进制"""
+        try:
+            vector = await self.embedding_service.get_embedding(query.strip())
+            return np.asarray(vector, dtype=np.float32).tobytes()
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            return None
+
+    def _record_similarity(self, similarity: float, hit: bool):
+        """记录最近邻相似度分布，用于对照检索成本调优阈值"""
+        result = "hit" if hit else "miss"
+        SEMANTIC_CACHE_SIMILARITY.labels(result=result).observe(similarity)
+
+        bucket = next((b for b in SIMILARITY_BUCKETS if similarity <= b), SIMILARITY_BUCKETS[-1])
+        try:
+            self.redis.hincrby(self.SIMILARITY_KEY, f"{result}:le_{bucket}", 1)
+        except Exception as e:
+            logger.debug(f"Failed to record similarity bucket: {e}")
+
+    def _record_lookup(self, hit: bool):
+        """记录命中/未命中"""
+        result = "hit" if hit else "miss"
+        CACHE_HIT_COUNT.labels(cache_name="semantic_cache", result=result).inc()
+        self.redis.hincrby(self.STATS_KEY, "total_hits" if hit else "total_misses", 1)
+
+    async def _semantic_get(
+        self,
+        query: str,
+        user_id: Optional[str],
+        similarity_threshold: float
+    ) -> Optional[Dict[str, Any]]:
+        """向量模式查找：先按键精确命中，再做作用域内 KNN 检索"""
+        # 1. 完全相同的查询直接命中，无需向量化
+        payload = self.redis.hget(self._generate_vector_key(query, user_id), "payload")
+        if payload:
+            self._record_lookup(hit=True)
+            self._record_similarity(1.0, hit=True)
+            logger.debug(f"Cache HIT (exact): query='{query[:30]}...'")
+            return json.loads(payload).get("data")
+
+        if not self._ensure_vector_index():
+            self._record_lookup(hit=False)
+            return None
+
+        vector_blob = await self._embed(query)
+        if vector_blob is None:
+            self._record_lookup(hit=False)
+            return None
+
+        # 2. 作用域内 KNN 最近邻
+        tag = self._escape_tag(self._scope_tag(user_id))
+        q = (
+            Query(f"(@user_id:{{{tag}}})=>[KNN 1 @embedding $vec AS distance]")
+            .sort_by("distance")
+            .paging(0, 1)
+            .return_fields("payload", "query", "distance")
+            .dialect(2)
+        )
+        results = self.redis.ft(self.INDEX_NAME).search(q, {"vec": vector_blob})
+
+        if not results or not results.docs:
+            self._record_lookup(hit=False)
+            logger.debug(f"Cache MISS (empty index): query='{query[:30]}...'")
+            return None
+
+        doc = results.docs[0]
+        # COSINE 距离 = 1 - 余弦相似度
+        similarity = 1.0 - float(doc.distance)
+        hit = similarity >= similarity_threshold
+
+        self._record_lookup(hit=hit)
+        self._record_similarity(similarity, hit=hit)
+
+        if not hit:
+            logger.debug(
+                f"Cache MISS: query='{query[:30]}...', nearest_similarity={similarity:.4f}"
+            )
+            return None
+
+        logger.debug(
+            f"Cache HIT (semantic): query='{query[:30]}...', "
+            f"similarity={similarity:.4f}"
+        )
+        return json.loads(doc.payload).get("data")
+
+    async def _semantic_set(
+        self,
+        query: str,
+        cache_value: Dict[str, Any],
+        user_id: Optional[str],
+        ttl: int
+    ) -> bool:
+        """向量模式写入：查询向量与缓存负载存放在同一个 HASH 中"""
+        if not self._ensure_vector_index():
+            return False
+
+        vector_blob = await self._embed(query)
+        if vector_blob is None:
+            return False
+
+        vector_key = self._generate_vector_key(query, user_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(vector_key, mapping={
+            "payload": json.dumps(cache_value),
+            "query": query,
+            "user_id": self._scope_tag(user_id),
+            "embedding": vector_blob,
+        })
+        pipe.expire(vector_key, ttl)
+        pipe.execute()
+        return True
+
     async def get(
         self,
         query: str,
         user_id: Optional[str] = None,
-        similarity_threshold: float = 0.95
+        similarity_threshold: Optional[float] = None
     ) -> Optional[Dict[str, Any]]:
         """
         从缓存获取查询结果
@@ -92,7 +305,7 @@ class SemanticCacheService:
         Args:
             query: 查询文本
             user_id: 用户ID（可选，用于个性化缓存）
-            similarity_threshold: 相似度阈值（暂未实现向量相似度，使用精确匹配）
+            similarity_threshold: 相似度阈值（仅 semantic 模式生效，None 使用实例默认值）
 
         Returns:
             缓存的结果，如果未命中则返回 None
@@ -101,12 +314,20 @@ class SemanticCacheService:
             return None
 
         try:
+            if self.mode == self.MODE_SEMANTIC:
+                threshold = (
+                    similarity_threshold
+                    if similarity_threshold is not None
+                    else self.similarity_threshold
+                )
+                return await self._semantic_get(query, user_id, threshold)
+
             cache_key = self._generate_cache_key(query, user_id)
             cached_data = self.redis.get(cache_key)
 
             if cached_data:
                 # 命中
-                self.redis.hincrby(self.STATS_KEY, "total_hits", 1)
+                self._record_lookup(hit=True)
                 result = json.loads(cached_data)
 
                 logger.debug(
@@ -117,7 +338,7 @@ class SemanticCacheService:
                 return result.get("data")
             else:
                 # 未命中
-                self.redis.hincrby(self.STATS_KEY, "total_misses", 1)
+                self._record_lookup(hit=False)
                 logger.debug(f"Cache MISS: query='{query[:30]}...'")
                 return None
 
@@ -148,8 +369,6 @@ class SemanticCacheService:
             return False
 
         try:
-            cache_key = self._generate_cache_key(query, user_id)
-
             # 包装数据，添加元信息
             cache_value = {
                 "data": data,
@@ -158,12 +377,16 @@ class SemanticCacheService:
                 "cached_at": datetime.utcnow().isoformat(),
             }
 
-            # 序列化并存储
-            self.redis.setex(
-                cache_key,
-                ttl or self.default_ttl,
-                json.dumps(cache_value)
-            )
+            if self.mode == self.MODE_SEMANTIC:
+                if not await self._semantic_set(query, cache_value, user_id, ttl or self.default_ttl):
+                    return False
+            else:
+                # 序列化并存储
+                self.redis.setex(
+                    self._generate_cache_key(query, user_id),
+                    ttl or self.default_ttl,
+                    json.dumps(cache_value)
+                )
 
             # 更新统计
             self.redis.hincrby(self.STATS_KEY, "total_sets", 1)
@@ -193,7 +416,10 @@ class SemanticCacheService:
             return False
 
         try:
-            cache_key = self._generate_cache_key(query, user_id)
+            if self.mode == self.MODE_SEMANTIC:
+                cache_key = self._generate_vector_key(query, user_id)
+            else:
+                cache_key = self._generate_cache_key(query, user_id)
             deleted = self.redis.delete(cache_key)
             logger.info(f"Cache INVALIDATE: query='{query[:30]}...', deleted={deleted}")
             return deleted > 0
@@ -255,6 +481,11 @@ class SemanticCacheService:
 
             stats["hit_rate_percent"] = round(hit_rate, 2)
             stats["total_requests"] = total_requests
+            stats["mode"] = self.mode
+
+            if self.mode == self.MODE_SEMANTIC:
+                stats["similarity_threshold"] = self.similarity_threshold
+                stats["similarity_distribution"] = self._get_similarity_distribution()
 
             return stats
 
@@ -262,6 +493,16 @@ class SemanticCacheService:
             logger.error(f"Cache STATS error: {e}")
             return {"error": str(e)}
 
+    def _get_similarity_distribution(self) -> Dict[str, Dict[str, int]]:
+        """按命中/未命中汇总最近邻相似度分桶计数"""
+        raw = self.redis.hgetall(self.SIMILARITY_KEY)
+        distribution: Dict[str, Dict[str, int]] = {"hit": {}, "miss": {}}
+        for field, count in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            result, _, bucket = field.partition(":")
+            distribution.setdefault(result, {})[bucket] = int(count)
+        return distribution
+
     async def get_cache_size(self) -> int:
         """获取当前缓存大小（键数量）"""
         if not self.redis or not REDIS_AVAILABLE:
@@ -277,10 +518,27 @@ class SemanticCacheService:
 
 
 # 便捷函数：创建服务实例
-def create_semantic_cache(redis_client: Redis) -> SemanticCacheService:
-    """创建语义缓存服务实例"""
+def create_semantic_cache(
+    redis_client: Redis,
+    embedding_service=None,
+    scope: str = SemanticCacheService.SCOPE_USER,
+    similarity_threshold: float = 0.95,
+) -> SemanticCacheService:
+    """
+    创建语义缓存服务实例
+
+    传入 embedding_service 时启用向量相似度模式，否则使用精确匹配
+    """
     return SemanticCacheService(
         redis_client=redis_client,
         default_ttl=3600,  # 1小时
-        max_cache_size=10000
+        max_cache_size=10000,
+        mode=(
+            SemanticCacheService.MODE_SEMANTIC
+            if embedding_service is not None
+            else SemanticCacheService.MODE_EXACT
+        ),
+        scope=scope,
+        embedding_service=embedding_service,
+        similarity_threshold=similarity_threshold,
     )
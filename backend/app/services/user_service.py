@@ -18,6 +18,7 @@ from sqlalchemy import select
 from app.models.user import User, PushPreference
 from app.schemas.user import UserContext, UserPreferences
 from app.core.metrics import CACHE_HIT_COUNT
+from app.core.auth_cache import auth_user_cache
 
 
 class UserService:
@@ -420,6 +421,9 @@ class UserService:
             当用户资料更新时，需要立即清除相关缓存，
             避免返回过期数据
         """
+        # 认证用户缓存（进程内 + 共享 Redis）不依赖本服务的 redis 客户端，始终失效
+        await auth_user_cache.invalidate(user_id)
+
         if not self.redis:
             logger.warning("Redis not available, skipping cache invalidation")
             return False
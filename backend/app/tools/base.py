@@ -3,6 +3,9 @@ from typing import Any, Dict, Optional, Type
 from pydantic import BaseModel
 from enum import Enum
 
+# 只读 / 不访问数据库的工具默认的单次执行超时（秒）
+DEFAULT_TOOL_TIMEOUT = 30.0
+
 class ToolCategory(str, Enum):
     """工具分类"""
     TASK = "task"
@@ -30,6 +33,10 @@ class BaseTool(ABC):
     category: ToolCategory              # 工具分类
     parameters_schema: Type[BaseModel]  # 参数 Schema（Pydantic Model）
     requires_confirmation: bool = False # 是否需要用户确认（高风险操作）
+    read_only: bool = False             # 只读工具可与同轮其他调用并发执行
+    uses_db: bool = True                # 是否使用 db_session
+    timeout: Optional[float] = None     # 单次执行超时（秒），None 按 effective_timeout 取默认值
+    max_concurrency: Optional[int] = None  # 进程内该工具的并发上限，None 使用默认值
     
     @abstractmethod
     async def execute(
@@ -50,6 +57,19 @@ class BaseTool(ABC):
             ToolResult: 统一格式的执行结果
         """
         pass
+
+    @property
+    def effective_timeout(self) -> Optional[float]:
+        """
+        实际使用的超时：显式配置的 timeout 优先；否则只读或不访问数据库的工具默认
+        DEFAULT_TOOL_TIMEOUT 秒，写数据库的工具不限时——它们运行在调用方共享的会话上，
+        flush 中途被取消会让会话不可用，本轮后续的串行调用也会随之失败
+        """
+        if self.timeout is not None:
+            return self.timeout
+        if self.read_only or not self.uses_db:
+            return DEFAULT_TOOL_TIMEOUT
+        return None
     
     def to_openai_schema(self) -> Dict[str, Any]:
         """
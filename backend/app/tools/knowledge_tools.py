@@ -86,6 +86,7 @@ class QueryKnowledgeTool(BaseTool):
     category = ToolCategory.QUERY
     parameters_schema = QueryKnowledgeParams
     requires_confirmation = False
+    read_only = True
     
     async def execute(
         self, 
@@ -32,6 +32,8 @@ class CheckSystemStatusTool(BaseTool):
     category = ToolCategory.QUERY
     parameters_schema = CheckSystemStatusParams
     requires_confirmation = False
+    read_only = True
+    uses_db = False
 
     async def execute(self, params: CheckSystemStatusParams, user_id: str, db_session: Any) -> ToolResult:
         metrics = {}
@@ -105,6 +107,8 @@ class QueryErrorLogsTool(BaseTool):
     category = ToolCategory.QUERY
     parameters_schema = QueryErrorLogsParams
     requires_confirmation = False
+    read_only = True
+    uses_db = False
 
     async def execute(self, params: QueryErrorLogsParams, user_id: str, db_session: Any) -> ToolResult:
         loki_url = "http://sparkle_loki:3100"
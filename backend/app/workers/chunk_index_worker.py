@@ -0,0 +1,152 @@
+"""
+知识块增量索引 Worker
+消费 stream:chunk_index 中的节点变更事件，批量更新 RediSearch 索引
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Optional
+
+from app.core.cache import cache_service
+from app.services.chunk_index_service import (
+    chunk_indexer,
+    CHUNK_INDEX_STREAM,
+    EVENT_DELETED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class ChunkIndexWorker:
+    """
+    知识块索引后台 Worker
+
+    每次最多读取 batch_size 条事件，合并同一节点的重复事件后一次索引，处理成功才 XACK。
+
+    每个 API 进程一个消费者（主机名:pid），各自有独立的 PEL。失败的消息以及已退出进程
+    遗留的消息留在 PEL 中，空闲超过 reclaim_idle_ms 后由任一存活消费者通过
+    XAUTOCLAIM 认领并重新处理（每 reclaim_interval 秒检查一次），不必等待重启。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        block_ms: int = 5000,
+        reclaim_idle_ms: int = 300_000,
+        reclaim_interval: float = 60.0,
+        consumer_name: Optional[str] = None
+    ):
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.reclaim_interval = reclaim_interval
+        self.group_name = "chunk_index_group"
+        self.consumer_name = consumer_name or f"{socket.gethostname()}:{os.getpid()}"
+        self.running = False
+
+    async def start(self):
+        """启动 Worker"""
+        redis = cache_service.redis
+        if not redis:
+            logger.error("ChunkIndexWorker: Redis 未初始化")
+            return
+
+        try:
+            await redis.xgroup_create(CHUNK_INDEX_STREAM, self.group_name, id="0", mkstream=True)
+        except Exception:
+            pass  # 消费组已存在
+
+        self.running = True
+        logger.info(f"ChunkIndexWorker started as consumer {self.consumer_name}")
+
+        last_reclaim = 0.0
+        while self.running:
+            try:
+                if time.monotonic() - last_reclaim >= self.reclaim_interval:
+                    last_reclaim = time.monotonic()
+                    await self._reclaim(redis)
+
+                messages = await redis.xreadgroup(
+                    self.group_name,
+                    self.consumer_name,
+                    {CHUNK_INDEX_STREAM: ">"},
+                    count=self.batch_size,
+                    block=self.block_ms
+                )
+                entries = messages[0][1] if messages else []
+                if entries:
+                    await self._process(redis, entries)
+            except Exception as e:
+                logger.error(f"Error in ChunkIndexWorker: {e}", exc_info=True)
+                # 失败的消息留在 PEL，不阻塞新消息；空闲超时后由 _reclaim 重试
+                await asyncio.sleep(self.block_ms / 1000)
+
+    async def _reclaim(self, redis):
+        """认领并处理空闲超过 reclaim_idle_ms 的待确认消息（包括失败的和已退出消费者的）"""
+        start_id = "0-0"
+        while self.running:
+            result = await redis.xautoclaim(
+                CHUNK_INDEX_STREAM,
+                self.group_name,
+                self.consumer_name,
+                min_idle_time=self.reclaim_idle_ms,
+                start_id=start_id,
+                count=self.batch_size
+            )
+            start_id, entries = _decode(result[0]), result[1]
+            # 已从 stream 删除的条目认领时为 None
+            entries = [(msg_id, fields) for msg_id, fields in entries if fields is not None]
+            if entries:
+                logger.info(f"ChunkIndexWorker reclaimed {len(entries)} pending events")
+                await self._process(redis, entries)
+            if start_id == "0-0":
+                break
+
+    async def stop(self):
+        """停止 Worker"""
+        self.running = False
+        logger.info("ChunkIndexWorker stopped")
+
+    async def _process(self, redis, entries):
+        """合并事件并索引"""
+        upserted, deleted = [], []
+        for _, fields in entries:
+            fields = {_decode(k): _decode(v) for k, v in fields.items()}
+            node_id = fields.get("node_id")
+            if not node_id:
+                continue
+            (deleted if fields.get("type") == EVENT_DELETED else upserted).append(node_id)
+
+        # 同一批内先更新后删除的节点以删除为准
+        upserted = [nid for nid in dict.fromkeys(upserted) if nid not in set(deleted)]
+        if upserted:
+            stats = await chunk_indexer.index_node_ids(upserted)
+            logger.info(f"Chunk index updated: {stats}")
+        if deleted:
+            await chunk_indexer.remove_nodes(set(deleted))
+
+        await redis.xack(CHUNK_INDEX_STREAM, self.group_name, *[msg_id for msg_id, _ in entries])
+
+
+# 全局 Worker 实例
+chunk_index_worker: Optional[ChunkIndexWorker] = None
+
+
+async def start_chunk_index_worker():
+    """启动知识块索引 Worker"""
+    global chunk_index_worker
+    chunk_index_worker = ChunkIndexWorker()
+    asyncio.create_task(chunk_index_worker.start())
+
+
+async def stop_chunk_index_worker():
+    """停止知识块索引 Worker"""
+    global chunk_index_worker
+    if chunk_index_worker:
+        await chunk_index_worker.stop()
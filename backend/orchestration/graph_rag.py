@@ -5,14 +5,21 @@ GraphRAG 检索器
 """
 
 import asyncio
+import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
 import json
 import uuid
 from datetime import datetime
 
+from app.config import settings
 from app.core.age_client import get_age_client
+from app.db.session import AsyncSessionLocal
+from app.models.galaxy import KnowledgeNode
 from app.services.knowledge_service import KnowledgeService
 from app.services.llm_service import llm_service
 
@@ -37,7 +44,10 @@ class RetrievalTrace:
     user_interest_nodes: List[str]
 
     # 性能指标
+    # timing 包含各阶段耗时、"{stage}_start"（相对检索开始的启动偏移）、
+    # "critical_path"（关键路径耗时）与 "parallel_savings"（并发节省的时间）
     timing: Dict[str, float] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
 
 
 @dataclass
@@ -54,18 +64,206 @@ class GraphRAGResult:
     trace: Optional[RetrievalTrace] = None
 
 
+class EntityDictionary:
+    """
+    进程级知识点词典（字典树）
+
+    - 由 KnowledgeNode 的名称与关键词构建，关键词映射回所属节点名称
+    - 按 ENTITY_DICT_REFRESH_INTERVAL 从数据库重建
+    - 对查询做最长匹配扫描，命中即可跳过 LLM 实体识别
+    - 识别结果按规范化后的查询缓存（LRU + TTL），词典重建时清空
+    """
+
+    _END = "\0"
+    MIN_TERM_LENGTH = 2  # 过滤单字词条，避免中文单字误匹配
+    LOAD_RETRY_INTERVAL = 30.0  # 加载失败后的重试间隔（秒）
+
+    def __init__(
+        self,
+        refresh_interval: float = settings.ENTITY_DICT_REFRESH_INTERVAL,
+        cache_size: int = settings.ENTITY_CACHE_SIZE,
+        cache_ttl: float = settings.ENTITY_CACHE_TTL
+    ):
+        self.refresh_interval = refresh_interval
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+
+        self._trie: Dict[str, Any] = {}
+        self.term_count = 0
+        self.loaded = False
+        self._loaded_at = 0.0
+        self._failed_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+        # 规范化查询 -> (写入时间, 实体列表)
+        self._cache: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+
+    # ==========================================
+    # 构建
+    # ==========================================
+
+    def _is_fresh(self) -> bool:
+        now = time.monotonic()
+        if self.loaded and now - self._loaded_at < self.refresh_interval:
+            return True
+        # 最近一次加载失败时退避，不在每个请求上重新全表加载
+        return now - self._failed_at < self.LOAD_RETRY_INTERVAL
+
+    async def ensure_fresh(self):
+        """确保词典已加载且未过期"""
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            if self._is_fresh():
+                return
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(KnowledgeNode).options(
+                            load_only(KnowledgeNode.name, KnowledgeNode.keywords)
+                        )
+                    )
+                    self.build((node.name, node.keywords) for node in result.scalars().all())
+            except Exception as e:
+                # 加载失败时保留旧词典（如有），LOAD_RETRY_INTERVAL 秒后重试
+                logger.warning(f"实体词典加载失败: {e}")
+                self._failed_at = time.monotonic()
+
+    def build(self, entries):
+        """
+        从 (节点名称, 关键词列表) 构建字典树
+
+        Args:
+            entries: 可迭代的 (name, keywords) 二元组
+        """
+        trie: Dict[str, Any] = {}
+        count = 0
+        for name, keywords in entries:
+            if not name:
+                continue
+            terms = [name] + [k for k in (keywords or []) if isinstance(k, str)]
+            for term in terms:
+                term = term.strip().lower()
+                if len(term) < self.MIN_TERM_LENGTH:
+                    continue
+                node = trie
+                for char in term:
+                    node = node.setdefault(char, {})
+                if self._END not in node:
+                    count += 1
+                node.setdefault(self._END, name)
+
+        self._trie = trie
+        self.term_count = count
+        self.loaded = True
+        self._loaded_at = time.monotonic()
+        self._cache.clear()
+        logger.info(f"实体词典已加载: {count} 个词条")
+
+    # ==========================================
+    # 匹配
+    # ==========================================
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isascii() and char.isalnum()
+
+    def _at_boundary(self, text: str, pos: int) -> bool:
+        """pos 处不在一个 ASCII 单词内部（中文等非 ASCII 字符两侧总是边界）"""
+        return (
+            pos == 0 or pos == len(text)
+            or not self._is_word_char(text[pos - 1]) or not self._is_word_char(text[pos])
+        )
+
+    def match(self, query: str) -> List[str]:
+        """
+        最长匹配扫描查询文本
+
+        ASCII 词条要求单词边界，例如 "ai" 不会匹配 "maintain" 中的片段
+
+        Returns:
+            按出现顺序去重后的节点名称
+        """
+        text = query.lower()
+        entities: List[str] = []
+        i = 0
+        while i < len(text):
+            if not self._at_boundary(text, i):
+                i += 1
+                continue
+            node = self._trie
+            matched_name, matched_end = None, i
+            j = i
+            while j < len(text) and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if self._END in node and self._at_boundary(text, j):
+                    matched_name, matched_end = node[self._END], j
+
+            if matched_name is None:
+                i += 1
+                continue
+            if matched_name not in entities:
+                entities.append(matched_name)
+            i = matched_end
+
+        return entities
+
+    # ==========================================
+    # 查询缓存
+    # ==========================================
+
+    @staticmethod
+    def _cache_key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get_cached(self, query: str) -> Optional[List[str]]:
+        key = self._cache_key(query)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        stored_at, entities = entry
+        if time.monotonic() - stored_at > self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return list(entities)
+
+    def cache(self, query: str, entities: List[str]):
+        key = self._cache_key(query)
+        self._cache[key] = (time.monotonic(), list(entities))
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+# 进程级单例
+entity_dictionary = EntityDictionary()
+
+
 class GraphRAGRetriever:
     """GraphRAG 检索器"""
 
-    def __init__(self, knowledge_service: KnowledgeService):
+    def __init__(
+        self,
+        knowledge_service: KnowledgeService,
+        graph_concurrency: int = 4,
+        dictionary: Optional[EntityDictionary] = None
+    ):
         self.age_client = get_age_client()
         self.knowledge_service = knowledge_service
+        self.dictionary = dictionary or entity_dictionary
         self.max_depth = 2
         self.min_strength = 0.3
+        # 每个实体的图扩展并发上限（受 AGE 连接池大小约束）
+        self.graph_concurrency = graph_concurrency
 
     async def extract_entities(self, query: str) -> List[str]:
         """
-        使用 LLM 从查询中提取实体
+        从查询中提取实体
+
+        依次尝试查询缓存、本地知识点词典，均未命中时才调用 LLM。
 
         Args:
             query: 用户查询
@@ -73,6 +271,28 @@ class GraphRAGRetriever:
         Returns:
             实体名称列表
         """
+        cached = self.dictionary.get_cached(query)
+        if cached is not None:
+            logger.debug(f"实体缓存命中: {cached}")
+            return cached
+
+        await self.dictionary.ensure_fresh()
+        entities = self.dictionary.match(query)
+        if entities:
+            logger.debug(f"词典提取实体: {entities}")
+        else:
+            try:
+                entities = await self._llm_extract(query)
+            except Exception as e:
+                logger.warning(f"实体提取失败: {e}")
+                # 降级：简单关键词提取（不缓存，下次重试 LLM）
+                return await self._simple_extract(query)
+
+        self.dictionary.cache(query, entities)
+        return entities
+
+    async def _llm_extract(self, query: str) -> List[str]:
+        """使用 LLM 从查询中提取实体（失败时抛出异常）"""
         prompt = f"""
         从以下查询中提取知识实体名称，返回 JSON 数组。
         只提取明确的知识点、概念或领域名称。
@@ -89,22 +309,17 @@ class GraphRAGRetriever:
         返回格式 (JSON):
         """
 
-        try:
-            response = await llm_service.chat(prompt)
-            # 清理响应
-            response = response.strip()
-            if response.startswith('```'):
-                response = response.split('```')[1].strip()
-            if response.startswith('json'):
-                response = response[4:].strip()
-
-            entities = json.loads(response)
-            logger.debug(f"提取实体: {entities}")
-            return entities
-        except Exception as e:
-            logger.warning(f"实体提取失败: {e}")
-            # 降级：简单关键词提取
-            return await self._simple_extract(query)
+        response = await llm_service.chat(prompt)
+        # 清理响应
+        response = response.strip()
+        if response.startswith('```'):
+            response = response.split('```')[1].strip()
+        if response.startswith('json'):
+            response = response[4:].strip()
+
+        entities = json.loads(response)
+        logger.debug(f"LLM 提取实体: {entities}")
+        return entities
 
     async def _simple_extract(self, query: str) -> List[str]:
         """简单关键词提取（降级）"""
@@ -163,56 +378,74 @@ class GraphRAGRetriever:
         if not entities:
             return [], []
 
+        # 每个实体一条 Cypher（保留每实体 LIMIT 10 语义），有界并发执行
+        semaphore = asyncio.Semaphore(self.graph_concurrency)
+        per_entity = await asyncio.gather(*(
+            self._expand_entity(entity, depth, semaphore) for entity in entities
+        ))
+
         results = []
         relationships = []  # 新增：收集关系信息
+        for entity_results, entity_relationships in per_entity:
+            results.extend(entity_results)
+            relationships.extend(entity_relationships)
 
-        for entity in entities:
-            try:
-                # 查找实体及其关联知识
-                cypher = f"""
-                MATCH (start:KnowledgeNode {{name: $entity}})
-                -[r*1..{depth}]-(related)
-                WHERE ALL(edge IN r WHERE edge.strength > $min_strength)
-                RETURN
-                    start.id as start_id,
-                    start.name as start_name,
-                    related.id as id,
-                    related.name as name,
-                    related.description as description,
-                    type(r[0]) as relation_type,
-                    r[0].strength as strength,
-                    related.sector as sector
-                ORDER BY r[0].strength DESC
-                LIMIT 10
-                """
+        logger.debug(f"图检索: {len(results)} 条结果, {len(relationships)} 个关系")
+        return results, relationships
 
+    async def _expand_entity(
+        self,
+        entity: str,
+        depth: int,
+        semaphore: asyncio.Semaphore
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """单个实体的图扩展"""
+        relationships = []
+        try:
+            # 查找实体及其关联知识
+            cypher = f"""
+            MATCH (start:KnowledgeNode {{name: $entity}})
+            -[r*1..{depth}]-(related)
+            WHERE ALL(edge IN r WHERE edge.strength > $min_strength)
+            RETURN
+                start.id as start_id,
+                start.name as start_name,
+                related.id as id,
+                related.name as name,
+                related.description as description,
+                type(r[0]) as relation_type,
+                r[0].strength as strength,
+                related.sector as sector
+            ORDER BY r[0].strength DESC
+            LIMIT 10
+            """
+
+            async with semaphore:
                 result = await self.age_client.execute_cypher(
                     cypher,
                     {"entity": entity, "min_strength": self.min_strength}
                 )
 
-                # 添加元数据并收集关系
-                for item in result:
-                    item["source"] = "graph"
-                    item["query_entity"] = entity
-
-                    # 收集关系信息（用于可视化）
-                    relationships.append({
-                        "from_id": item.get("start_id"),
-                        "from_name": item.get("start_name", entity),
-                        "to_id": item.get("id"),
-                        "to_name": item.get("name"),
-                        "relation_type": item.get("relation_type"),
-                        "strength": item.get("strength")
-                    })
-
-                results.extend(result)
+            # 添加元数据并收集关系
+            for item in result:
+                item["source"] = "graph"
+                item["query_entity"] = entity
+
+                # 收集关系信息（用于可视化）
+                relationships.append({
+                    "from_id": item.get("start_id"),
+                    "from_name": item.get("start_name", entity),
+                    "to_id": item.get("id"),
+                    "to_name": item.get("name"),
+                    "relation_type": item.get("relation_type"),
+                    "strength": item.get("strength")
+                })
 
-            except Exception as e:
-                logger.warning(f"图检索失败 for {entity}: {e}")
+            return result, relationships
 
-        logger.debug(f"图检索: {len(results)} 条结果, {len(relationships)} 个关系")
-        return results, relationships
+        except Exception as e:
+            logger.warning(f"图检索失败 for {entity}: {e}")
+            return [], []
 
     async def get_user_interests(self, user_id: str) -> List[str]:
         """
@@ -316,32 +549,50 @@ class GraphRAGRetriever:
         Returns:
             GraphRAGResult
         """
-        import time
         logger.info(f"GraphRAG 检索: query='{query}', user='{user_id}'")
 
         # 性能追踪
         timing = {}
         start_time = time.time()
 
-        # 1. 实体识别
-        t0 = time.time()
-        entities = await self.extract_entities(query)
-        timing["entity_extraction"] = time.time() - t0
-
-        # 2. 向量检索 (语义相似)
-        t0 = time.time()
-        vector_results = await self.vector_search(query, top_k=5)
-        timing["vector_search"] = time.time() - t0
-
-        # 3. 图检索 (结构关联)
-        t0 = time.time()
-        graph_results, relationships = await self.graph_search(entities, depth)
-        timing["graph_search"] = time.time() - t0
+        async def _timed(stage: str, coro):
+            """执行阶段并记录启动偏移与耗时，返回 (结果, 完成偏移)"""
+            started = time.time()
+            timing[f"{stage}_start"] = started - start_time
+            value = await coro
+            finished = time.time()
+            timing[stage] = finished - started
+            return value, finished - start_time
+
+        async def _entities_then_graph():
+            # 1. 实体识别 -> 3. 图检索 (结构关联)，二者存在依赖，串行执行
+            found, _ = await _timed("entity_extraction", self.extract_entities(query))
+            (graph_out, graph_finished) = await _timed("graph_search", self.graph_search(found, depth))
+            return found, graph_out, graph_finished
+
+        # 2. 向量检索与 4. 用户个性化不依赖实体，与实体识别同时启动
+        (
+            (entities, (graph_results, relationships), graph_finished),
+            (vector_results, vector_finished),
+            (user_interests, interests_finished),
+        ) = await asyncio.gather(
+            _entities_then_graph(),
+            _timed("vector_search", self.vector_search(query, top_k=5)),
+            _timed("user_interests", self.get_user_interests(user_id)),
+        )
 
-        # 4. 用户个性化
-        t0 = time.time()
-        user_interests = await self.get_user_interests(user_id)
-        timing["user_interests"] = time.time() - t0
+        # 关键路径：最晚完成的检索分支
+        branches = {
+            ("entity_extraction", "graph_search"): graph_finished,
+            ("vector_search",): vector_finished,
+            ("user_interests",): interests_finished,
+        }
+        critical_path = list(max(branches, key=branches.get))
+        timing["critical_path"] = branches[tuple(critical_path)]
+        timing["parallel_savings"] = max(
+            0.0,
+            sum(timing[stage] for branch in branches for stage in branch) - timing["critical_path"]
+        )
 
         # 5. 融合与去重
         t0 = time.time()
@@ -360,7 +611,8 @@ class GraphRAGRetriever:
             "entities": entities,
             "user_interests": user_interests,
             "query": query,
-            "timing": timing
+            "timing": timing,
+            "critical_path": critical_path
         }
 
         # 7. 构建检索追踪信息（用于前端可视化）
@@ -383,7 +635,8 @@ class GraphRAGRetriever:
                 vector_search_results=vector_results,
                 graph_search_results=graph_results,
                 user_interest_nodes=user_interests,
-                timing=timing
+                timing=timing,
+                critical_path=critical_path
             )
 
         result = GraphRAGResult(
@@ -399,7 +652,8 @@ class GraphRAGRetriever:
         logger.info(
             f"GraphRAG 完成: vector={len(vector_results)}, "
             f"graph={len(graph_results)}, fused={len(unique_results)}, "
-            f"total_time={timing['total']:.3f}s"
+            f"total_time={timing['total']:.3f}s, "
+            f"critical_path={'->'.join(critical_path)}"
         )
 
         return result
@@ -0,0 +1,96 @@
+import asyncio
+import sys
+import os
+import json
+import time
+import uuid
+import argparse
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from sqlalchemy import select, delete, func
+
+from app.models.chat import TokenUsage
+from app.models.user import User
+from app.services.billing_worker import BillingWorker, BILLING_QUEUE
+
+# Configure logging
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+
+async def run(args):
+    """
+    Throughput benchmark: enqueue N synthetic usage records into queue:billing,
+    drain them with BillingWorker and report records/sec.
+    Benchmark rows are tagged with a request_id prefix and deleted afterwards.
+    """
+    worker = BillingWorker(
+        batch_size=args.batch_size,
+        flush_interval=1,
+        concurrency=args.concurrency,
+        worker_name=f"bench-{os.getpid()}"
+    )
+    prefix = f"bench_{uuid.uuid4().hex[:8]}_"
+
+    async with worker.async_session_factory() as session:
+        user_id = (await session.execute(select(User.id).limit(1))).scalar()
+    if not user_id:
+        print("No user found in database. Please run seed data first.")
+        return
+
+    # 1. Enqueue
+    now = time.time()
+    for start in range(0, args.records, 1000):
+        async with worker.redis.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + 1000, args.records)):
+                pipe.rpush(BILLING_QUEUE, json.dumps({
+                    "user_id": str(user_id),
+                    "session_id": "bench",
+                    "request_id": f"{prefix}{i}",
+                    "prompt_tokens": 100,
+                    "completion_tokens": 50,
+                    "total_tokens": 150,
+                    "model": "gpt-4",
+                    "cost": 0.006,
+                    "timestamp": now
+                }))
+            await pipe.execute()
+
+    # 2. Drain
+    started = time.perf_counter()
+    task = asyncio.create_task(worker.start())
+    while worker.processed < args.records:
+        if task.done():
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    async with worker.async_session_factory() as session:
+        persisted = (await session.execute(
+            select(func.count()).select_from(TokenUsage).where(TokenUsage.request_id.like(f"{prefix}%"))
+        )).scalar()
+        if not args.keep:
+            await session.execute(delete(TokenUsage).where(TokenUsage.request_id.like(f"{prefix}%")))
+            await session.commit()
+
+    worker.stop()
+    await task
+
+    print(f"records={args.records} batch_size={args.batch_size} concurrency={args.concurrency}")
+    print(f"persisted={persisted} elapsed={elapsed:.2f}s throughput={worker.processed / elapsed:.0f} records/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BillingWorker throughput benchmark")
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--keep", action="store_true", help="keep benchmark rows in token_usage")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(run(args))
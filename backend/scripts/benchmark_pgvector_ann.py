@@ -0,0 +1,130 @@
+import asyncio
+import sys
+import os
+import time
+import argparse
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from loguru import logger
+
+from app.config import settings
+from app.db.vector_index import hnsw_index_sql
+
+# Configure logging
+logger.remove()
+logger.add(sys.stderr, level="INFO")
+
+TABLE = "bench_knowledge_vectors"
+INDEX = f"ix_{TABLE}_hnsw"
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Clustered, L2-normalised vectors: closer to real embeddings than uniform noise,
+    where every neighbour is almost equidistant and ANN recall is meaningless.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def load_corpus(conn, vectors: np.ndarray, batch: int = 5000):
+    await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await conn.execute(
+        f"CREATE UNLOGGED TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({vectors.shape[1]}))"
+    )
+    for start in range(0, len(vectors), batch):
+        records = [(start + i, v) for i, v in enumerate(vectors[start:start + batch])]
+        await conn.copy_records_to_table(TABLE, records=records, columns=["id", "embedding"])
+    await conn.execute(f"ANALYZE {TABLE}")
+
+
+async def timed_knn(conn, query: np.ndarray, k: int):
+    started = time.perf_counter()
+    rows = await conn.fetch(
+        f"SELECT id FROM {TABLE} ORDER BY embedding <=> $1 LIMIT {k}", query
+    )
+    return [r["id"] for r in rows], (time.perf_counter() - started) * 1000
+
+
+async def run(args):
+    dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(dsn)
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    await register_vector(conn)
+
+    logger.info(f"📦 Generating {args.rows} x {args.dim} synthetic vectors...")
+    corpus = synthetic_corpus(args.rows, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, args.rows, args.queries)
+    queries = corpus[picks] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    try:
+        logger.info("⏳ Loading corpus...")
+        await load_corpus(conn, corpus)
+
+        # 1. Exact ground truth (sequential scan, no index yet)
+        truth, exact_latency = [], []
+        for q in queries:
+            ids, ms = await timed_knn(conn, q, args.k)
+            truth.append(set(ids))
+            exact_latency.append(ms)
+
+        # 2. Build HNSW
+        logger.info(f"🏗️ Building HNSW (m={args.m}, ef_construction={args.ef_construction})...")
+        await conn.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+        started = time.perf_counter()
+        await conn.execute(hnsw_index_sql(
+            INDEX, TABLE, m=args.m, ef_construction=args.ef_construction, concurrently=False
+        ))
+        build_seconds = time.perf_counter() - started
+        size = await conn.fetchval(f"SELECT pg_size_pretty(pg_relation_size('{INDEX}'))")
+
+        # 3. ANN at each ef_search
+        print(f"\nrows={args.rows} dim={args.dim} k={args.k} queries={args.queries}")
+        print(f"HNSW m={args.m} ef_construction={args.ef_construction} build={build_seconds:.1f}s size={size}")
+        print(f"{'mode':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'exact':<16}{1.0:>10.3f}{np.percentile(exact_latency, 50):>10.2f}{np.percentile(exact_latency, 95):>10.2f}")
+
+        for ef in args.ef_search:
+            await conn.execute(f"SET hnsw.ef_search = {int(ef)}")
+            recalls, latency = [], []
+            for q, expected in zip(queries, truth):
+                ids, ms = await timed_knn(conn, q, args.k)
+                recalls.append(len(expected.intersection(ids)) / args.k)
+                latency.append(ms)
+            print(
+                f"{f'hnsw ef={ef}':<16}{np.mean(recalls):>10.3f}"
+                f"{np.percentile(latency, 50):>10.2f}{np.percentile(latency, 95):>10.2f}"
+            )
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark: exact vs HNSW pgvector search")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 80, 160])
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark table afterwards")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(run(args))
@@ -0,0 +1,174 @@
+import asyncio
+import sys
+import os
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from sqlalchemy import select, delete, insert
+
+from app.db.session import AsyncSessionLocal
+from app.models.user import User, PushPreference
+from app.models.plan import Plan, PlanType
+from app.models.galaxy import KnowledgeNode, UserNodeStatus
+from app.services.push_service import PushService
+
+# Configure logging
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+CHUNK = 5000
+
+
+async def seed(session, prefix: str, args) -> list:
+    """
+    Synthetic population: every user has push preferences and a few studied nodes;
+    a fraction has an upcoming sprint plan, curiosity enabled or stale activity.
+    """
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    today = now.date()
+
+    node_ids = [uuid.uuid4() for _ in range(args.nodes)]
+    await session.execute(insert(KnowledgeNode), [
+        {"id": nid, "name": f"{prefix}node_{i}", "importance_level": rng.choice([3, 5, 5])}
+        for i, nid in enumerate(node_ids)
+    ])
+
+    user_ids = [uuid.uuid4() for _ in range(args.users)]
+    for start in range(0, args.users, CHUNK):
+        chunk = list(enumerate(user_ids[start:start + CHUNK], start))
+        await session.execute(insert(User), [
+            {
+                "id": uid,
+                "username": f"{prefix}{i}",
+                "email": f"{prefix}{i}@bench.local",
+                "hashed_password": "x",
+                "updated_at": now - timedelta(hours=rng.choice([1, 6, 30, 72])),
+            }
+            for i, uid in chunk
+        ])
+        await session.execute(insert(PushPreference), [
+            {"user_id": uid, "enable_curiosity": rng.random() < args.curiosity_ratio}
+            for _, uid in chunk
+        ])
+        plans = [
+            {
+                "user_id": uid,
+                "name": f"{prefix}plan",
+                "type": PlanType.SPRINT,
+                "target_date": today + timedelta(days=rng.randint(0, 6)),
+            }
+            for _, uid in chunk if rng.random() < args.sprint_ratio
+        ]
+        if plans:
+            await session.execute(insert(Plan), plans)
+        await session.execute(insert(UserNodeStatus), [
+            {
+                "user_id": uid,
+                "node_id": nid,
+                "mastery_score": rng.uniform(10, 90),
+                "is_unlocked": True,
+                "last_study_at": now - timedelta(days=rng.randint(0, 60)),
+            }
+            for _, uid in chunk
+            for nid in rng.sample(node_ids, args.nodes_per_user)
+        ])
+        await session.commit()
+
+    return user_ids
+
+
+async def cleanup(session, prefix: str):
+    bench_users = select(User.id).where(User.username.like(f"{prefix}%"))
+    await session.execute(delete(UserNodeStatus).where(UserNodeStatus.user_id.in_(bench_users)))
+    await session.execute(delete(Plan).where(Plan.user_id.in_(bench_users)))
+    await session.execute(delete(PushPreference).where(PushPreference.user_id.in_(bench_users)))
+    await session.execute(delete(User).where(User.username.like(f"{prefix}%")))
+    await session.execute(delete(KnowledgeNode).where(KnowledgeNode.name.like(f"{prefix}%")))
+    await session.commit()
+
+
+async def evaluate_per_user(service: PushService, user_ids: list) -> dict:
+    """Old cycle shape: should_trigger per strategy until one fires, then get_trigger_data."""
+    triggers = {}
+    for uid in user_ids:
+        user = SimpleNamespace(id=uid)
+        for trigger_type, strategy in service.strategies:
+            if await strategy.should_trigger(user, service.db):
+                triggers[uid] = (trigger_type, await strategy.get_trigger_data(user, service.db))
+                break
+    return triggers
+
+
+async def evaluate_batched(service: PushService, user_ids: list, batch_size: int) -> dict:
+    triggers = {}
+    for start in range(0, len(user_ids), batch_size):
+        triggers.update(await service.evaluate_strategies(user_ids[start:start + batch_size]))
+    return triggers
+
+
+async def run(args):
+    """
+    Strategy evaluation benchmark: per-user vs batched evaluate_many on N synthetic users.
+    Per-user evaluation issues several queries per user, so it runs on a sample and its
+    rate is reported in users/sec; batched evaluation runs on the whole population.
+    Benchmark rows are tagged with a name prefix and deleted afterwards.
+    """
+    prefix = f"bench_push_{uuid.uuid4().hex[:8]}_"
+
+    async with AsyncSessionLocal() as session:
+        started = time.perf_counter()
+        user_ids = await seed(session, prefix, args)
+        print(f"seeded users={args.users} in {time.perf_counter() - started:.1f}s")
+
+        try:
+            service = PushService(session)
+            sample = sorted(random.Random(args.seed).sample(user_ids, min(args.per_user_sample, len(user_ids))))
+
+            started = time.perf_counter()
+            per_user = await evaluate_per_user(service, sample)
+            per_user_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            batched = await evaluate_batched(service, sorted(user_ids), args.batch_size)
+            batched_elapsed = time.perf_counter() - started
+
+            mismatches = sum(1 for uid in sample if per_user.get(uid, (None,))[0] != batched.get(uid, (None,))[0])
+            per_user_rate = len(sample) / per_user_elapsed
+            batched_rate = len(user_ids) / batched_elapsed
+
+            print(f"per-user: users={len(sample)} elapsed={per_user_elapsed:.2f}s throughput={per_user_rate:.0f} users/s")
+            print(f"batched:  users={len(user_ids)} batch_size={args.batch_size} "
+                  f"elapsed={batched_elapsed:.2f}s throughput={batched_rate:.0f} users/s")
+            print(f"speedup={batched_rate / per_user_rate:.1f}x triggered={len(batched)} "
+                  f"mismatches_in_sample={mismatches}")
+        finally:
+            if not args.keep:
+                await session.rollback()
+                await cleanup(session, prefix)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Push strategy evaluation benchmark (per-user vs batched)")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--per-user-sample", type=int, default=2000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--nodes-per-user", type=int, default=5)
+    parser.add_argument("--sprint-ratio", type=float, default=0.05)
+    parser.add_argument("--curiosity-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep benchmark rows afterwards")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(run(args))
@@ -11,8 +11,10 @@ from app.services.billing_worker import BillingWorker
 async def main():
     logger.info("Starting Token Billing Worker...")
     worker = BillingWorker(
-        batch_size=int(os.getenv("BILLING_BATCH_SIZE", "10")),
-        flush_interval=int(os.getenv("BILLING_FLUSH_INTERVAL", "5"))
+        batch_size=int(os.getenv("BILLING_BATCH_SIZE", "500")),
+        flush_interval=int(os.getenv("BILLING_FLUSH_INTERVAL", "1")),
+        concurrency=int(os.getenv("BILLING_CONCURRENCY", "1")),
+        worker_name=os.getenv("BILLING_WORKER_NAME")
     )
     
     try:
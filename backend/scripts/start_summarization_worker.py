@@ -34,6 +34,12 @@ async def main():
         default=10,
         help="批量处理的任务数"
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        help="同时进行的 LLM 总结调用数上限"
+    )
     parser.add_argument(
         "--max-retries",
         type=int,
@@ -46,6 +52,7 @@ async def main():
     logger.info(f"Starting SummarizationWorker: {args.worker_id}")
     logger.info(f"Redis URL: {args.redis_url}")
     logger.info(f"Batch size: {args.batch_size}")
+    logger.info(f"Max concurrency: {args.max_concurrency}")
     logger.info(f"Max retries: {args.max_retries}")
 
     # 创建 Redis 客户端
@@ -64,6 +71,7 @@ async def main():
         redis_client=redis_client,
         batch_size=args.batch_size,
         max_retries=args.max_retries,
+        max_concurrency=args.max_concurrency,
         worker_id=args.worker_id
     )
 
@@ -1,107 +1,50 @@
 import asyncio
 import sys
 import os
-import json
-import logging
+import argparse
 
 # Add parent directory to path to import app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import select
-from redis.asyncio import Redis
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from loguru import logger
 
-from app.db.session import AsyncSessionLocal
-from app.models.galaxy import KnowledgeNode
-from app.services.embedding_service import embedding_service
-from app.config import settings
+from app.core.redis_search_client import redis_search_client
+from app.services.chunk_index_service import chunk_indexer
 
 # Configure logging
 logger.remove()
 logger.add(sys.stderr, level="INFO")
 
-async def sync_data():
-    """Sync KnowledgeNodes from Postgres to Redis with Chunking"""
-    logger.info("🚀 Starting PG -> Redis Sync...")
+async def sync_data(batch_size: int, restart: bool):
+    """
+    Reconcile KnowledgeNodes from Postgres into the Redis chunk index.
+
+    Unchanged chunks are skipped by content hash, so rerunning is cheap;
+    an interrupted run resumes from the last committed node unless --restart.
+    """
+    logger.info("🚀 Starting PG -> Redis reconciliation...")
 
-    # 1. Connect to Redis
-    redis = Redis.from_url(settings.REDIS_URL, password=settings.REDIS_PASSWORD, decode_responses=True)
     try:
-        await redis.ping()
+        await redis_search_client.redis.ping()
         logger.info("✅ Redis connected.")
     except Exception as e:
         logger.error(f"❌ Redis connection failed: {e}")
         return
 
-    # 2. Connect to Postgres & Fetch Nodes
-    logger.info("📦 Fetching KnowledgeNodes from DB...")
-    async with AsyncSessionLocal() as session:
-        stmt = select(KnowledgeNode).where(KnowledgeNode.description.isnot(None))
-        result = await session.execute(stmt)
-        nodes = result.scalars().all()
-    
-    logger.info(f"📊 Found {len(nodes)} nodes with descriptions.")
+    stats = await chunk_indexer.reconcile(batch_size=batch_size, restart=restart)
 
-    # 3. Setup Splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=400, # Approx 100-200 tokens
-        chunk_overlap=50,
-        separators=["\n\n", "\n", "。", ".", " ", ""]
+    logger.success(
+        f"✅ Sync complete! nodes={stats['nodes']}, written={stats['written']}, "
+        f"unchanged={stats['skipped']}, deleted={stats['deleted']}"
     )
-
-    # 4. Process Nodes
-    pipeline = redis.pipeline()
-    count = 0
-    
-    for node in nodes:
-        if not node.description:
-            continue
-            
-        chunks = text_splitter.split_text(node.description)
-        
-        # Batch embedding if possible, but embedding_service handles batching?
-        # embedding_service.batch_embeddings takes a list of strings.
-        try:
-            embeddings = await embedding_service.batch_embeddings(chunks)
-        except Exception as e:
-            logger.error(f"⚠️ Failed to embed node {node.id}: {e}")
-            # Fallback to dummy embedding for testing
-            logger.warning("Using dummy embeddings for testing...")
-            embeddings = [[0.0] * 1536 for _ in chunks]
-
-        for i, (chunk_text, vector) in enumerate(zip(chunks, embeddings)):
-            key = f"sparkle:chunk:{node.id}:{i}"
-            
-            # Prepare document
-            doc = {
-                "id": key,
-                "parent_id": str(node.id),
-                "parent_name": node.name,
-                "content": chunk_text,
-                "keywords": f"{node.name} {node.keywords if node.keywords else ''}",
-                "subject_id": node.subject_id if node.subject_id else 0,
-                "importance": node.importance_level,
-                "vector": vector
-            }
-            
-            # Redis JSON.SET
-            pipeline.json().set(key, "$", doc)
-            count += 1
-            
-            if count % 100 == 0:
-                await pipeline.execute()
-                pipeline = redis.pipeline()
-                logger.info(f"🔄 Synced {count} chunks...")
-
-    # Execute remaining
-    if count % 100 != 0:
-        await pipeline.execute()
-
-    logger.success(f"✅ Sync complete! Total chunks indexed: {count}")
-    await redis.close()
+    await redis_search_client.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile the RediSearch chunk index with Postgres")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved cursor and scan from the beginning")
+    args = parser.parse_args()
+
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(sync_data())
+    asyncio.run(sync_data(args.batch_size, args.restart))
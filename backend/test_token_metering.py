@@ -74,8 +74,7 @@ async def test_token_metering_flow():
     result = await redis_client.blpop("queue:billing", timeout=2)
     if result:
         _, data = result
-        worker._batch.append(json.loads(data))
-        await worker._flush_to_db()
+        await worker._flush_to_db([json.loads(data)])
         logger.info("Flushed to DB successfully.")
     else:
         logger.error("No data found in queue:billing!")
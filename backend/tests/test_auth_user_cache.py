@@ -0,0 +1,146 @@
+"""
+认证用户缓存测试
+测试进程内 / Redis 两级命中、过期与容量上限、失效以及 get_current_user 回源
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import inspect
+
+from app.api import deps
+from app.api.v1 import focus
+from app.core import auth_cache
+from app.core.auth_cache import AuthUserCache, AUTH_USER_KEY
+from app.models.user import User, UserStatus, AvatarStatus
+
+
+def _user(**overrides):
+    values = dict(
+        id=uuid.uuid4(), username="alice", email="alice@example.com", nickname="A",
+        avatar_url=None, avatar_status=AvatarStatus.APPROVED, pending_avatar_url=None,
+        flame_level=3, flame_brightness=0.7, depth_preference=0.5, curiosity_preference=0.4,
+        is_active=True, is_superuser=False, status=UserStatus.ONLINE,
+        created_at=datetime(2026, 1, 1, 8, 0), updated_at=datetime(2026, 1, 2, 8, 0),
+        hashed_password="secret-hash",
+    )
+    values.update(overrides)
+    return User(**values)
+
+
+def _redis(raw=None):
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=raw)
+    redis.set = AsyncMock()
+    redis.delete = AsyncMock()
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_local_hit_rebuilds_detached_user_without_sensitive_fields():
+    cache = AuthUserCache(local_ttl=30, local_size=10)
+    user = _user()
+    redis = _redis()
+
+    with patch.object(auth_cache.cache_service, "redis", redis):
+        await cache.put(user)
+        first = await cache.get(str(user.id))
+        second = await cache.get(str(user.id))
+
+    redis.get.assert_not_awaited()  # L1 命中不访问 Redis
+    assert first is not second  # 每次请求一个新对象
+    assert first.id == user.id and first.status == UserStatus.ONLINE
+    assert first.created_at == user.created_at and first.is_superuser is False
+    assert inspect(first).detached
+    stored = json.loads(redis.set.await_args.args[1])
+    assert "hashed_password" not in stored
+    assert redis.set.await_args.kwargs["ex"] == cache.redis_ttl
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_populates_local_cache():
+    user = _user()
+    raw = json.dumps(auth_cache._serialize(user)).encode()
+    cache = AuthUserCache(local_ttl=30, local_size=10)
+    redis = _redis(raw)
+
+    with patch.object(auth_cache.cache_service, "redis", redis):
+        assert (await cache.get(user.id)).username == "alice"
+        assert (await cache.get(user.id)).username == "alice"
+
+    redis.get.assert_awaited_once_with(AUTH_USER_KEY.format(user.id))
+
+
+@pytest.mark.asyncio
+async def test_local_entries_expire_and_are_bounded():
+    cache = AuthUserCache(local_ttl=30, local_size=2)
+    users = [_user(username=f"u{i}", email=f"u{i}@example.com") for i in range(3)]
+
+    with patch.object(auth_cache.cache_service, "redis", None):
+        for user in users:
+            await cache.put(user)
+        assert await cache.get(users[0].id) is None  # 超出容量被淘汰
+        assert (await cache.get(users[2].id)).username == "u2"
+
+        with patch.object(auth_cache.time, "monotonic", return_value=auth_cache.time.monotonic() + 31):
+            assert await cache.get(users[2].id) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_clears_local_and_redis():
+    cache = AuthUserCache(local_ttl=30, local_size=10)
+    user = _user()
+    redis = _redis()
+
+    with patch.object(auth_cache.cache_service, "redis", redis):
+        await cache.put(user)
+        await cache.invalidate(user.id)
+        assert await cache.get(user.id) is None
+
+    redis.delete.assert_awaited_once_with(AUTH_USER_KEY.format(user.id))
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_only_hits_db_on_cache_miss():
+    user = _user()
+    db = MagicMock()
+    db.get = AsyncMock(return_value=user)
+    session_cm = MagicMock()
+    session_cm.__aenter__ = AsyncMock(return_value=db)
+    session_cm.__aexit__ = AsyncMock(return_value=False)
+    cache = AuthUserCache(local_ttl=30, local_size=10)
+
+    with patch.object(deps, "auth_user_cache", cache), \
+         patch.object(deps, "AsyncSessionLocal", MagicMock(return_value=session_cm)), \
+         patch.object(auth_cache.cache_service, "redis", None):
+        assert await deps.get_current_user(str(user.id)) is user
+        cached = await deps.get_current_user(str(user.id))
+
+    db.get.assert_awaited_once()
+    assert cached.id == user.id and cached.email == user.email
+
+
+@pytest.mark.asyncio
+async def test_completed_focus_session_invalidates_cached_flame():
+    user = _user()
+    db = MagicMock()
+    db.commit = AsyncMock()
+    log_session = AsyncMock(return_value={
+        "session": MagicMock(id=uuid.uuid4()),
+        "rewards": {"flame_earned": 25, "leveled_up": False, "new_level": 3},
+    })
+    data = focus.FocusSessionLog(
+        start_time=datetime(2026, 1, 1, 8, 0), end_time=datetime(2026, 1, 1, 8, 25),
+        duration_minutes=25, focus_type="pomodoro", status="completed",
+    )
+    invalidate = AsyncMock()
+
+    with patch.object(focus.focus_service, "log_session", log_session), \
+         patch.object(focus.auth_user_cache, "invalidate", invalidate):
+        await focus.log_focus_session(data, current_user=user, db=db)
+
+    db.commit.assert_awaited_once()
+    invalidate.assert_awaited_once_with(user.id)
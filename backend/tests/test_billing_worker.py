@@ -0,0 +1,100 @@
+"""
+BillingWorker 可靠消费测试
+测试提交成功后才确认处理中列表，以及停止时保留未提交记录
+"""
+
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.exc import DataError
+
+from app.services.billing_worker import BillingWorker
+
+
+def _record(request_id):
+    return json.dumps({
+        "user_id": "00000000-0000-0000-0000-000000000001",
+        "session_id": "s1",
+        "request_id": request_id,
+        "prompt_tokens": 10,
+        "completion_tokens": 5,
+        "total_tokens": 15,
+        "model": "gpt-4",
+        "cost": None,
+        "timestamp": 1700000000.0,
+    }).encode()
+
+
+@pytest.fixture
+def worker():
+    with patch("app.services.billing_worker.redis.from_url") as from_url, \
+            patch("app.services.billing_worker.create_async_engine"):
+        from_url.return_value.delete = AsyncMock()
+        w = BillingWorker(worker_name="test")
+        w.is_running = True
+        yield w
+
+
+@pytest.mark.asyncio
+async def test_processing_list_acked_after_commit(worker):
+    worker._flush_to_db = AsyncMock()
+
+    await worker._flush_until_done("queue:billing:processing:test:0", [_record("r1"), b"not-json", _record("r2")])
+
+    rows = worker._flush_to_db.await_args[0][0]
+    assert [r["request_id"] for r in rows] == ["r1", "r2"]
+    worker.redis.delete.assert_awaited_once_with("queue:billing:processing:test:0")
+    assert worker.processed == 2
+
+
+@pytest.mark.asyncio
+async def test_records_kept_when_stopping_after_failure(worker):
+    worker._flush_to_db = AsyncMock(side_effect=ConnectionError("db down"))
+    worker.is_running = False
+
+    await worker._flush_until_done("queue:billing:processing:test:0", [_record("r1")])
+
+    worker.redis.delete.assert_not_awaited()
+    assert worker.processed == 0
+
+
+@pytest.mark.asyncio
+async def test_unmappable_records_are_dropped_and_batch_acked(worker):
+    missing_model = json.loads(_record("r2"))
+    del missing_model["model"]
+    bad_user = json.loads(_record("r3")) | {"user_id": "not-a-uuid"}
+    long_session = json.loads(_record("r4")) | {"session_id": "s" * 101}
+    worker._flush_to_db = AsyncMock()
+
+    await worker._flush_until_done("queue:billing:processing:test:0", [
+        _record("r1"), json.dumps(missing_model).encode(), json.dumps(bad_user).encode(), b"[1, 2]",
+        json.dumps(long_session).encode(),
+    ])
+
+    # 只写入可转换的记录，整批照常确认，不会卡在重试里
+    rows = worker._flush_to_db.await_args[0][0]
+    assert [r["request_id"] for r in rows] == ["r1"]
+    worker.redis.delete.assert_awaited_once_with("queue:billing:processing:test:0")
+
+
+def test_row_mapping_uses_created_at():
+    row = BillingWorker._to_row(json.loads(_record("r1")))
+    assert row["created_at"].year == 2023
+    assert row["cost"] == 0.0
+    assert "timestamp" not in row
+
+
+@pytest.mark.asyncio
+async def test_data_error_falls_back_to_per_row_inserts(worker):
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=DataError("INSERT", {}, Exception("value too long")))
+    session.begin.return_value = MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False))
+    worker.async_session_factory = MagicMock(return_value=MagicMock(
+        __aenter__=AsyncMock(return_value=session), __aexit__=AsyncMock(return_value=False)
+    ))
+    worker._retry_individually = AsyncMock()
+
+    await worker._flush_to_db([BillingWorker._to_row(json.loads(_record("r1")))])
+
+    # 列类型错误不再让整批无限重试，而是逐条写入并丢弃出错的记录
+    worker._retry_individually.assert_awaited_once()
@@ -0,0 +1,78 @@
+"""
+ChunkIndexer 增量索引测试
+测试内容哈希跳过未变化的块、批量向量化与过期块清理
+"""
+
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.chunk_index_service import ChunkIndexer, CHUNK_META_PREFIX, _doc_hash
+
+
+def _node(description, name="傅里叶变换"):
+    return SimpleNamespace(
+        id=uuid.uuid4(), name=name, description=description,
+        keywords=["信号"], subject_id=2, importance_level=3,
+    )
+
+
+def _make_redis(manifest_results):
+    redis = MagicMock()
+    pipes = []
+
+    def make_pipe(*args, **kwargs):
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=manifest_results if not pipes else [])
+        ctx = MagicMock()
+        ctx.__aenter__ = AsyncMock(return_value=pipe)
+        ctx.__aexit__ = AsyncMock(return_value=False)
+        pipes.append(pipe)
+        return ctx
+
+    redis.pipeline.side_effect = make_pipe
+    return redis, pipes
+
+
+@pytest.fixture
+def indexer():
+    return ChunkIndexer()
+
+
+@pytest.mark.asyncio
+async def test_unchanged_chunks_are_skipped_and_stale_deleted(indexer):
+    node = _node("第一段内容。")
+    doc = indexer.build_documents(node)[0]
+    # 已索引 2 块，其中第 0 块内容未变
+    redis, pipes = _make_redis([{"0": _doc_hash(doc), "1": "old"}])
+
+    with patch("app.services.chunk_index_service.redis_search_client", MagicMock(redis=redis)), \
+            patch("app.services.chunk_index_service.embedding_service") as embedding:
+        embedding.batch_embeddings = AsyncMock(return_value=[])
+        stats = await indexer.index_nodes([node])
+
+    assert stats == {"nodes": 1, "written": 0, "skipped": 1, "deleted": 1}
+    embedding.batch_embeddings.assert_not_awaited()
+    write_pipe = pipes[1]
+    write_pipe.delete.assert_called_once_with(f"sparkle:chunk:{node.id}:1")
+    write_pipe.hdel.assert_called_once_with(f"{CHUNK_META_PREFIX}{node.id}", "1")
+
+
+@pytest.mark.asyncio
+async def test_changed_chunks_embedded_in_one_batch(indexer):
+    nodes = [_node("内容 A"), _node("内容 B")]
+    redis, pipes = _make_redis([{}, {}])
+
+    with patch("app.services.chunk_index_service.redis_search_client", MagicMock(redis=redis)), \
+            patch("app.services.chunk_index_service.embedding_service") as embedding:
+        embedding.batch_embeddings = AsyncMock(return_value=[[0.1], [0.2]])
+        stats = await indexer.index_nodes(nodes)
+
+    assert stats["written"] == 2
+    embedding.batch_embeddings.assert_awaited_once_with(["内容 A", "内容 B"])
+    json_set = pipes[1].json.return_value.set
+    assert json_set.call_count == 2
+    key, path, doc = json_set.call_args_list[0][0]
+    assert key == f"sparkle:chunk:{nodes[0].id}:0"
+    assert doc["vector"] == [0.1] and doc["subject_id"] == 2
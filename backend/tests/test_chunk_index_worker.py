@@ -0,0 +1,50 @@
+"""
+ChunkIndexWorker 测试
+测试每进程独立的消费者名，以及通过 XAUTOCLAIM 认领空闲待确认消息并重新处理
+"""
+
+import os
+import socket
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.workers import chunk_index_worker as worker_module
+from app.workers.chunk_index_worker import ChunkIndexWorker
+from app.services.chunk_index_service import CHUNK_INDEX_STREAM, EVENT_DELETED
+
+
+def test_consumer_name_is_unique_per_process():
+    worker = ChunkIndexWorker()
+
+    assert worker.consumer_name == f"{socket.gethostname()}:{os.getpid()}"
+    assert ChunkIndexWorker(consumer_name="api-2:7").consumer_name == "api-2:7"
+
+
+@pytest.mark.asyncio
+async def test_reclaim_processes_and_acks_idle_pending_entries():
+    worker = ChunkIndexWorker(batch_size=2, reclaim_idle_ms=1000)
+    worker.running = True
+    redis = MagicMock()
+    redis.xack = AsyncMock()
+    redis.xautoclaim = AsyncMock(side_effect=[
+        [b"5-0", [(b"1-0", {b"node_id": b"n1", b"type": b"upserted"}),
+                  (b"2-0", None)], []],
+        [b"0-0", [(b"3-0", {b"node_id": b"n2", b"type": EVENT_DELETED.encode()})], []],
+    ])
+    indexer = MagicMock()
+    indexer.index_node_ids = AsyncMock(return_value={})
+    indexer.remove_nodes = AsyncMock()
+
+    with patch.object(worker_module, "chunk_indexer", indexer):
+        await worker._reclaim(redis)
+
+    # 从头扫描 PEL，按游标翻页直到回到 0-0
+    first, second = redis.xautoclaim.await_args_list
+    assert first.args == (CHUNK_INDEX_STREAM, worker.group_name, worker.consumer_name)
+    assert first.kwargs["min_idle_time"] == 1000 and first.kwargs["start_id"] == "0-0"
+    assert second.kwargs["start_id"] == "5-0"
+    indexer.index_node_ids.assert_awaited_once_with(["n1"])
+    indexer.remove_nodes.assert_awaited_once_with({"n2"})
+    # 已从 stream 删除的条目不处理
+    assert [c.args[2:] for c in redis.xack.await_args_list] == [(b"1-0",), (b"3-0",)]
@@ -19,7 +19,8 @@ import pytest
 import redis.asyncio as redis
 
 from app.orchestration.context_pruner import ContextPruner
-from app.orchestration.summarization_worker import SummarizationWorker
+from app.orchestration.summarization_worker import SummarizationWorker, MAX_TURNS_PER_SUMMARY
+from app.orchestration.token_counter import TokenCounter, MESSAGE_OVERHEAD_TOKENS
 from app.orchestration.orchestrator import ChatOrchestrator
 
 
@@ -124,15 +125,20 @@ class TestContextPruner:
         assert result["summary_used"] is True
         assert len(result["messages"]) == 5
 
-        # 验证总结任务已推送到队列
-        queue_len = await redis_client.llen("queue:summarization")
+        # 验证总结任务已推送到高优先级队列
+        queue_len = await redis_client.llen("queue:summarization:high")
         assert queue_len == 1
 
-        # 验证队列内容
-        task_data = await redis_client.lindex("queue:summarization", 0)
+        # 验证队列内容：只携带消息数，不携带历史
+        task_data = await redis_client.lindex("queue:summarization:high", 0)
         task = json.loads(task_data)
         assert task["session_id"] == session_id
-        assert len(task["history"]) == 10  # 除最近 5 条外的历史
+        assert task["upto"] == 10  # 除最近 5 条外的历史
+        assert "history" not in task
+
+        # 重复请求被合并
+        await context_pruner.get_pruned_history(session_id, "user_123")
+        assert await redis_client.llen("queue:summarization:high") == 1
 
     @pytest.mark.asyncio
     async def test_summary_cache(self, context_pruner, redis_client):
@@ -227,6 +233,134 @@ class TestSummarizationWorker:
                 assert summary.decode("utf-8") == "这是一个总结"
 
 
+def _mock_redis(mget_result=(None, None), turns=()):
+    """不依赖真实 Redis 的客户端替身"""
+    client = MagicMock()
+    client.mget = AsyncMock(return_value=list(mget_result))
+    client.lrange = AsyncMock(return_value=[json.dumps(t).encode() for t in turns])
+    client.rpush = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    client.pipeline.return_value = ctx
+    return client, pipe
+
+
+class TestSummarizationWorkerConcurrency:
+    """SummarizationWorker 并发、合并与增量总结（无需 Redis）"""
+
+    def test_coalesce_same_session(self):
+        worker = SummarizationWorker(MagicMock())
+        tasks = [
+            {"session_id": "a", "upto": 10, "priority": "low"},
+            {"session_id": "b", "upto": 3, "priority": "normal"},
+            {"session_id": "a", "upto": 14, "priority": "normal"},
+            {"session_id": "a", "upto": 12, "priority": "high"},
+        ]
+
+        merged = worker._coalesce(tasks)
+
+        assert [t["session_id"] for t in merged] == ["a", "b"]
+        assert merged[0]["upto"] == 14
+        assert merged[0]["priority"] == "high"
+        assert worker.coalesced_count == 2
+
+    @pytest.mark.asyncio
+    async def test_incremental_summary_only_reads_new_turns(self):
+        turns = [{"role": "user", "content": f"新消息 {i}"} for i in range(3)]
+        client, pipe = _mock_redis(("之前的对话讨论了 Python 基础语法".encode(), b"4"), turns)
+        worker = SummarizationWorker(client)
+        worker._generate_summary = AsyncMock(return_value="更新后的摘要：继续讨论了 Python 进阶内容")
+
+        success = await worker._process_task({"session_id": "s1", "user_id": "u1", "upto": 7})
+
+        assert success is True
+        client.lrange.assert_awaited_once_with("chat:history:s1", 4, 6)
+        new_turns, _, previous = worker._generate_summary.await_args[0]
+        assert len(new_turns) == 3
+        assert previous == "之前的对话讨论了 Python 基础语法"
+        pipe.setex.assert_any_call("summary:upto:s1", 3600, 7)
+
+    @pytest.mark.asyncio
+    async def test_large_backlog_is_summarized_from_checkpoint_forward(self):
+        turns = [{"role": "user", "content": f"消息 {i}"} for i in range(MAX_TURNS_PER_SUMMARY)]
+        client, pipe = _mock_redis(("之前的摘要覆盖了前 5 条消息".encode(), b"5"), turns)
+        worker = SummarizationWorker(client)
+        worker._generate_summary = AsyncMock(return_value="更新后的摘要：覆盖到第 25 条消息")
+
+        success = await worker._process_task({"session_id": "s1", "user_id": "u1", "upto": 60})
+
+        # 从检查点开始读取，而不是只读最后 20 条（否则 [5, 40) 永久丢失）
+        assert success is True
+        client.lrange.assert_awaited_once_with("chat:history:s1", 5, 5 + MAX_TURNS_PER_SUMMARY - 1)
+        pipe.setex.assert_any_call("summary:upto:s1", 3600, 5 + MAX_TURNS_PER_SUMMARY)
+
+    @pytest.mark.asyncio
+    async def test_llm_calls_bounded_by_semaphore(self):
+        client, _ = _mock_redis(turns=[{"role": "user", "content": "你好"}])
+        worker = SummarizationWorker(client, max_concurrency=2)
+        active, peak = 0, 0
+
+        async def slow_summary(*args):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return "这是一个足够长的对话摘要"
+
+        worker._generate_summary = slow_summary
+        results = await asyncio.gather(*(
+            worker._process_task({"session_id": f"s{i}", "upto": 1}) for i in range(5)
+        ))
+
+        assert all(results)
+        assert peak == 2
+
+
+class TestTokenBudget:
+    """Token 预算模式与摘要检查点（无需 Redis）"""
+
+    def test_message_tokens_are_cached(self):
+        counter = TokenCounter()
+        counter.count = MagicMock(return_value=7)
+        message = {"role": "user", "content": "解释一下傅里叶变换"}
+
+        assert counter.count_message(message) == 7 + MESSAGE_OVERHEAD_TOKENS
+        assert counter.count_message(dict(message)) == 7 + MESSAGE_OVERHEAD_TOKENS
+        counter.count.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_window_packed_from_checkpoint_tail(self):
+        summary = "之前讨论了 Python 基础"
+        client, pipe = _mock_redis()
+        pipe.execute = AsyncMock(return_value=[30, [summary.encode(), b"20"]])
+        tail = [{"role": "user", "content": f"消息 {i}"} for i in range(20, 30)]
+        client.lrange = AsyncMock(return_value=[json.dumps(m).encode() for m in tail])
+        client.set = AsyncMock(return_value=True)
+
+        pruner = ContextPruner(client, token_budget=100, model_token_budgets={})
+        pruner.token_counter = MagicMock()
+        pruner.token_counter.count.return_value = 40
+        pruner.token_counter.count_message.return_value = 10
+
+        result = await pruner.get_pruned_history("s1", "u1")
+
+        # 只读取检查点之后的消息
+        client.lrange.assert_awaited_once_with("chat:history:s1", 20, -1)
+        # 摘要 40 + 6 条 x 10 = 100
+        assert [m["content"] for m in result["messages"]] == [f"消息 {i}" for i in range(24, 30)]
+        assert result["summary"] == summary
+        assert result["token_count"] == 100
+        assert result["original_count"] == 30
+
+        # 窗口外 4 条未被摘要覆盖，推进检查点到 24
+        task = json.loads(client.rpush.await_args[0][1])
+        assert task["upto"] == 24
+
+
 class TestOrchestratorIntegration:
     """Orchestrator 集成测试"""
 
@@ -0,0 +1,108 @@
+"""
+DecayService 批量衰减测试
+"""
+
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+
+from app.services.decay_service import DecayService
+
+
+def _rows_result(rows):
+    return MagicMock(all=MagicMock(return_value=rows))
+
+
+@pytest.fixture
+def mock_db():
+    return AsyncMock()
+
+
+@pytest.mark.asyncio
+async def test_decay_runs_in_committed_keyset_chunks(mock_db):
+    service = DecayService(mock_db)
+    service.CHUNK_SIZE = 2
+    user_id = uuid.uuid4()
+    nodes = sorted(uuid.uuid4() for _ in range(3))
+    mock_db.execute.side_effect = [
+        _rows_result([
+            (user_id, nodes[0], 25.0, 18.0, False),  # 变暗
+            (user_id, nodes[1], 12.0, 9.0, False),   # 坍缩风险
+        ]),
+        _rows_result([
+            (user_id, nodes[2], 60.0, 50.0, False),
+        ]),
+    ]
+
+    stats = await service.apply_daily_decay()
+
+    assert stats == {'processed': 3, 'dimmed': 1, 'collapsed': 1}
+    assert mock_db.execute.await_count == 2
+    assert mock_db.commit.await_count == 2
+
+    # 第二块从上一块最后的主键之后开始
+    second_stmt = mock_db.execute.await_args_list[1][0][0]
+    params = second_stmt.compile(dialect=postgresql.dialect()).params
+    assert nodes[1] in params.values()
+
+
+@pytest.mark.asyncio
+async def test_decay_is_computed_in_a_single_update(mock_db):
+    service = DecayService(mock_db)
+    mock_db.execute.return_value = _rows_result([])
+
+    stats = await service.apply_daily_decay()
+
+    assert stats == {'processed': 0, 'dimmed': 0, 'collapsed': 0}
+    sql = str(mock_db.execute.await_args[0][0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE user_node_status SET mastery_score=greatest(")
+    assert "exp(" in sql and "RETURNING" in sql
+    # 今天已衰减的行不会被重复处理；按衰减专用标记判断，而不是 updated_at
+    assert "user_node_status.last_decayed_at IS NULL OR user_node_status.last_decayed_at <" in sql
+    assert "user_node_status.updated_at <" not in sql
+    assert "last_decayed_at=" in sql
+
+
+def _projection_rows(rows):
+    return MagicMock(all=MagicMock(return_value=[
+        SimpleNamespace(node_id=nid, name=name, mastery_score=m, decay_paused=p)
+        for nid, name, m, p in rows
+    ]))
+
+
+@pytest.mark.asyncio
+async def test_projection_matches_scalar_decay_and_is_cached(mock_db, monkeypatch):
+    store = {}
+
+    async def fake_get(key):
+        return store.get(key)
+
+    async def fake_set(key, value, ttl=None):
+        store[key] = value
+
+    monkeypatch.setattr("app.services.decay_service.cache_service.get", fake_get)
+    monkeypatch.setattr("app.services.decay_service.cache_service.set", fake_set)
+
+    service = DecayService(mock_db)
+    active, paused = uuid.uuid4(), uuid.uuid4()
+    mock_db.execute.return_value = _projection_rows([
+        (active, "导数", 80.0, False),
+        (paused, "积分", 40.0, True),
+    ])
+    user_id = uuid.uuid4()
+
+    for days in (0, 7, 30, 90):
+        projections = await service.project_decay_future(user_id, days_ahead=days)
+        expected = round(service._calculate_decay(80.0, days), 2)
+        assert projections[str(active)]["future_mastery"] == expected
+        assert projections[str(paused)]["future_mastery"] == 40.0
+
+    # 拖动滑块只查询一次数据库
+    assert mock_db.execute.await_count == 1
+
+    simulated = await service.simulate_intervention(user_id, [active], days_ahead=10)
+    assert simulated[str(active)]["future_mastery"] == round(service._calculate_decay(100.0, 10), 2)
+    assert simulated[str(active)]["is_intervened"] is True
+    assert mock_db.execute.await_count == 1
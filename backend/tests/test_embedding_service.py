@@ -0,0 +1,64 @@
+"""
+EmbeddingService Tests
+测试并发请求合并与内容哈希缓存
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.embedding_service import EmbeddingService
+
+
+def _fake_vectors(texts):
+    return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def service():
+    svc = EmbeddingService()
+    svc.batch_window = 0.01
+    svc._request_embeddings = AsyncMock(side_effect=_fake_vectors)
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_coalesce_into_one_request(service):
+    texts = ["a", "bb", "ccc", "bb"]
+
+    results = await asyncio.gather(*(service.get_embedding(t) for t in texts))
+
+    assert results == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    service._request_embeddings.assert_awaited_once()
+    # 重复文本只请求一次
+    assert service._request_embeddings.await_args[0][0] == ["a", "bb", "ccc"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_text_served_from_cache(service):
+    await service.get_embedding("node name")
+    await service.get_embedding("node name")
+    await service.batch_embeddings(["node name"])
+
+    assert service._request_embeddings.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_split_by_max_batch_size(service):
+    service.max_batch_size = 2
+
+    vectors = await service.batch_embeddings(["a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert len(vectors) == 5
+    assert service._request_embeddings.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_propagates_to_all_waiters(service):
+    service._request_embeddings = AsyncMock(side_effect=RuntimeError("provider down"))
+
+    results = await asyncio.gather(
+        service.get_embedding("x"), service.get_embedding("y"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
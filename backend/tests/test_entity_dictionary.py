@@ -0,0 +1,88 @@
+"""
+GraphRAG 实体词典测试
+测试字典树最长匹配、LLM 兜底与按查询缓存
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from orchestration.graph_rag import EntityDictionary, GraphRAGRetriever
+
+
+@pytest.fixture
+def dictionary():
+    d = EntityDictionary(refresh_interval=3600)
+    d.build([
+        ("机器学习", ["ML"]),
+        ("机器学习基础", []),
+        ("Python", ["python3"]),
+        ("人工智能", ["AI"]),
+        ("量", []),  # 单字词条被忽略
+    ])
+    return d
+
+
+@pytest.fixture
+def retriever(dictionary):
+    with patch("orchestration.graph_rag.get_age_client"):
+        return GraphRAGRetriever(MagicMock(), dictionary=dictionary)
+
+
+def test_match_prefers_longest_term_and_maps_keywords(dictionary):
+    assert dictionary.match("学习机器学习基础需要 python3 吗") == ["机器学习基础", "Python"]
+    assert dictionary.match("ml 和 机器学习") == ["机器学习"]
+    assert dictionary.match("量子计算") == []
+
+
+def test_ascii_terms_require_word_boundaries(dictionary):
+    assert dictionary.match("how to maintain a python3 project") == ["Python"]
+    assert dictionary.match("what is ai?") == ["人工智能"]
+    assert dictionary.match("AI技术和python") == ["人工智能", "Python"]
+    assert dictionary.match("pythonic 写法") == []
+
+
+@pytest.mark.asyncio
+async def test_failed_load_backs_off_instead_of_reloading_every_request():
+    d = EntityDictionary(refresh_interval=3600)
+    session_factory = MagicMock(side_effect=ConnectionError("db down"))
+
+    with patch("orchestration.graph_rag.AsyncSessionLocal", session_factory):
+        await d.ensure_fresh()
+        await d.ensure_fresh()
+        assert session_factory.call_count == 1
+        assert d.loaded is False
+
+        d._failed_at -= d.LOAD_RETRY_INTERVAL
+        await d.ensure_fresh()
+        assert session_factory.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_dictionary_hit_skips_llm(retriever):
+    with patch("orchestration.graph_rag.llm_service") as llm:
+        llm.chat = AsyncMock()
+        entities = await retriever.extract_entities("Python 入门")
+
+    assert entities == ["Python"]
+    llm.chat.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_llm_fallback_result_is_cached(retriever):
+    with patch("orchestration.graph_rag.llm_service") as llm:
+        llm.chat = AsyncMock(return_value='["量子计算"]')
+        first = await retriever.extract_entities("量子计算是什么")
+        second = await retriever.extract_entities("  量子计算是什么 ")
+
+    assert first == second == ["量子计算"]
+    llm.chat.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_llm_failure_is_not_cached(retriever):
+    with patch("orchestration.graph_rag.llm_service") as llm:
+        llm.chat = AsyncMock(side_effect=RuntimeError("timeout"))
+        assert await retriever.extract_entities("量子计算") == []
+        await retriever.extract_entities("量子计算")
+
+    assert llm.chat.await_count == 2
@@ -0,0 +1,92 @@
+"""
+GalaxyService 用户状态批量加载测试
+"""
+
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.galaxy_service import GalaxyService
+from app.models.galaxy import UserNodeStatus
+
+
+def _scalars_result(rows):
+    return MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=rows))))
+
+
+@pytest.fixture
+def mock_db():
+    return AsyncMock()
+
+
+@pytest.fixture
+def service(mock_db):
+    return GalaxyService(mock_db)
+
+
+@pytest.mark.asyncio
+async def test_statuses_loaded_with_single_query(service, mock_db):
+    user_id = uuid.uuid4()
+    node_ids = [uuid.uuid4() for _ in range(3)]
+    rows = [
+        UserNodeStatus(user_id=user_id, node_id=node_ids[0], mastery_score=50, is_unlocked=True),
+        UserNodeStatus(user_id=user_id, node_id=node_ids[2], mastery_score=90, is_unlocked=True),
+    ]
+    mock_db.execute.return_value = _scalars_result(rows)
+
+    statuses = await service._get_user_statuses(user_id, node_ids)
+
+    assert mock_db.execute.await_count == 1
+    assert set(statuses) == {node_ids[0], node_ids[2]}
+    assert statuses[node_ids[2]].mastery_score == 90
+
+
+@pytest.mark.asyncio
+async def test_identity_map_skips_known_pairs(service, mock_db):
+    user_id = uuid.uuid4()
+    node_id = uuid.uuid4()
+    mock_db.execute.return_value = _scalars_result([])
+
+    await service._get_user_statuses(user_id, [node_id])
+    # 不存在的状态也被记录，重复查询不再访问数据库
+    assert await service._get_user_status(user_id, node_id) is None
+    assert mock_db.execute.await_count == 1
+
+
+def _spark_db(mock_db):
+    mock_db.add = MagicMock()
+
+    async def flush():
+        # 模拟 INSERT 时写入的列默认值
+        status = mock_db.add.call_args[0][0]
+        status.mastery_score, status.total_study_minutes, status.study_count = 0, 0, 0
+
+    mock_db.flush.side_effect = flush
+    mock_db.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+    mock_db.get.return_value = MagicMock(name="node", importance_level=1, subject=None)
+    mock_db.get.return_value.name = "熵"
+
+
+@pytest.mark.asyncio
+async def test_new_status_counted_in_summary_only_after_commit(service, mock_db, monkeypatch):
+    from app.services import galaxy_service
+
+    _spark_db(mock_db)
+    apply_change = AsyncMock()
+    monkeypatch.setattr(galaxy_service.learning_summary_service, "apply_mastery_change", apply_change)
+    monkeypatch.setattr(galaxy_service.cache_service, "delete_pattern", AsyncMock())
+    monkeypatch.setattr(galaxy_service.DecayService, "invalidate_projection", AsyncMock())
+    user_id, node_id = uuid.uuid4(), uuid.uuid4()
+
+    # 提交失败：新建的状态不应计入摘要
+    mock_db.commit.side_effect = RuntimeError("commit failed")
+    with pytest.raises(RuntimeError, match="commit failed"):
+        await service.spark_node(user_id, node_id, study_minutes=30, trigger_expansion=False)
+    apply_change.assert_not_awaited()
+
+    mock_db.commit.side_effect = None
+    service._status_map.clear()
+    result = await service.spark_node(user_id, node_id, study_minutes=30, trigger_expansion=False)
+
+    # 新建 + 点亮合并为一次变化：old_mastery 为 None 表示新增节点
+    apply_change.assert_awaited_once_with(user_id, None, result.spark_event.new_mastery)
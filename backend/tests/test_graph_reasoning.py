@@ -3,11 +3,12 @@ GraphReasoningService Tests
 测试基于拓扑排序的动态学习路径生成
 """
 
+import json
 import pytest
 import uuid
 import networkx as nx
 from unittest.mock import Mock, AsyncMock, MagicMock
-from app.services.graph_reasoning_service import GraphReasoningService
+from app.services.graph_reasoning_service import GraphReasoningService, PrerequisiteGraph
 from app.models.galaxy import KnowledgeNode, NodeRelation
 
 @pytest.fixture
@@ -16,7 +17,8 @@ def mock_db():
 
 @pytest.fixture
 def service(mock_db):
-    return GraphReasoningService(mock_db)
+    # 每个测试使用独立的图实例，避免共享进程级单例
+    return GraphReasoningService(mock_db, graph=PrerequisiteGraph())
 
 @pytest.mark.asyncio
 async def test_generate_simple_path(service, mock_db):
@@ -131,5 +133,42 @@ async def test_cycle_detection(service, mock_db):
     assert len(path) == 1
     assert "error" in path[0]
 
+@pytest.mark.asyncio
+async def test_graph_loaded_once_and_updated_incrementally(mock_db):
+    """Graph is shared across service instances and updated from sync events"""
+    id_a = uuid.uuid4()
+    id_b = uuid.uuid4()
+    id_c = uuid.uuid4()
+    user_id = uuid.uuid4()
+    graph = PrerequisiteGraph()
+
+    nodes = [KnowledgeNode(id=id_a, name="Node A"), KnowledgeNode(id=id_b, name="Node B")]
+    edges = [NodeRelation(source_node_id=id_a, target_node_id=id_b, relation_type="PREREQUISITE")]
+    empty = MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=[]))))
+
+    mock_db.execute.side_effect = [
+        MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=nodes)))),
+        MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=edges)))),
+        empty,
+    ]
+    path = await GraphReasoningService(mock_db, graph=graph).generate_learning_path(user_id, id_b)
+    assert [p["id"] for p in path] == [str(id_a), str(id_b)]
+
+    # New node C depends on B, delivered through stream:graph_sync events
+    graph.apply_event({
+        b"type": b"node_created",
+        b"data": json.dumps({"id": str(id_c), "name": "Node C"}).encode(),
+    })
+    graph.apply_event({
+        b"type": b"relation_created",
+        b"data": json.dumps({"source": str(id_b), "target": str(id_c), "type": "PREREQUISITE"}).encode(),
+    })
+
+    # A second service instance only queries mastery, not the graph tables
+    mock_db.execute.side_effect = [empty]
+    path = await GraphReasoningService(mock_db, graph=graph).generate_learning_path(user_id, id_c)
+    assert [p["id"] for p in path] == [str(id_a), str(id_b), str(id_c)]
+    assert path[2]["name"] == "Node C"
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
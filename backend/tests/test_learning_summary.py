@@ -0,0 +1,75 @@
+"""
+LearningSummaryService Tests
+测试摘要缓存读取、缺失时的聚合重建与掌握度分档增量
+"""
+
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.learning_summary_service import LearningSummaryService
+
+
+@pytest.fixture
+def service():
+    return LearningSummaryService(ttl=60)
+
+
+@pytest.fixture
+def mock_redis():
+    redis = MagicMock()
+    redis.hgetall = AsyncMock(return_value={})
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    redis.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    return redis, pipe
+
+
+@pytest.mark.asyncio
+async def test_cached_summary_needs_no_queries(service, mock_redis):
+    redis, pipe = mock_redis
+    redis.hgetall.return_value = {
+        b"total_nodes": b"120", b"mastered_nodes": b"30",
+        b"learning_nodes": b"45", b"analytics_summary": b"summary",
+    }
+    db = AsyncMock()
+
+    with patch("app.services.learning_summary_service.cache_service", MagicMock(redis=redis)):
+        summary = await service.get_summary(db, uuid.uuid4())
+
+    assert summary == {
+        "knowledge_stats": {"total_nodes": 120, "mastered_nodes": 30, "learning_nodes": 45},
+        "analytics_summary": "summary",
+    }
+    db.execute.assert_not_awaited()
+    pipe.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_missing_summary_is_rebuilt_from_aggregate(service, mock_redis):
+    redis, pipe = mock_redis
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(one=MagicMock(return_value=(10, 2, 3)))
+
+    with patch("app.services.learning_summary_service.cache_service", MagicMock(redis=redis)), \
+            patch("app.services.learning_summary_service.AnalyticsService") as analytics:
+        analytics.return_value.get_user_profile_summary = AsyncMock(return_value="profile")
+        summary = await service.get_summary(db, uuid.uuid4())
+
+    assert summary["knowledge_stats"] == {"total_nodes": 10, "mastered_nodes": 2, "learning_nodes": 3}
+    assert db.execute.await_count == 1
+    mapping = pipe.hset.call_args[1]["mapping"]
+    assert mapping["total_nodes"] == 10 and mapping["analytics_summary"] == "profile"
+    pipe.expire.assert_called_once()
+
+
+def test_deltas_follow_mastery_buckets(service):
+    # 新建节点
+    assert dict(service._deltas(None, 0)) == {"total_nodes": 1}
+    # 学习中 -> 已掌握
+    assert dict(service._deltas(50, 85)) == {"learning_nodes": -1, "mastered_nodes": 1}
+    # 衰减跌出学习中
+    assert dict(service._deltas(35, 25)) == {"learning_nodes": -1}
+    # 同档内变化不产生增量
+    assert dict(service._deltas(40, 60)) == {}
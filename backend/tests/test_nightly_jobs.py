@@ -0,0 +1,196 @@
+"""
+夜间批处理任务测试
+测试分块、检查点续跑、并发上限与复习提醒的窗口查询
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
+
+from app.services import nightly_jobs
+from app.services.nightly_jobs import BatchJob, ImplicitMiningJob, ReviewReminderJob, CHECKPOINT_DONE
+from app.services.decay_service import DecayService
+
+
+class _RecordingJob(BatchJob):
+    name = "test_job"
+
+    CHUNK_RETRY_DELAY = 0
+
+    def __init__(self, chunk_size, errors=()):
+        super().__init__(chunk_size)
+        self.chunks = []
+        self.errors = list(errors)  # 依次作为每次 process_chunk 的失败数
+
+    async def process_chunk(self, user_ids):
+        self.chunks.append(list(user_ids))
+        return self.errors.pop(0) if self.errors else 0
+
+
+def _session_factory(db=None):
+    db = db or MagicMock()
+    session_cm = MagicMock()
+    session_cm.__aenter__ = AsyncMock(return_value=db)
+    session_cm.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=session_cm)
+
+
+def _redis(saved=None):
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=saved)
+    redis.set = AsyncMock()
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_run_processes_chunks_and_checkpoints():
+    ids = sorted(uuid.uuid4() for _ in range(5))
+    job = _RecordingJob(chunk_size=2, errors=[0, 1, 0])  # 第二块部分失败：照常推进
+    job._next_chunk = AsyncMock(side_effect=[ids[0:2], ids[2:4], ids[4:5]])
+    redis = _redis()
+
+    with patch.object(nightly_jobs.cache_service, "redis", redis):
+        stats = await job.run()
+
+    assert job.chunks == [ids[0:2], ids[2:4], ids[4:5]]
+    assert stats["processed"] == 5 and stats["chunks"] == 3 and stats["errors"] == 1
+    saved = [c.args[1] for c in redis.set.await_args_list]
+    assert saved == [str(ids[1]).encode(), str(ids[3]).encode(), str(ids[4]).encode(), CHECKPOINT_DONE]
+
+
+@pytest.mark.asyncio
+async def test_whole_chunk_failure_is_retried_then_stops_without_done():
+    ids = sorted(uuid.uuid4() for _ in range(5))
+    job = _RecordingJob(chunk_size=2, errors=[0, 2, 2, 2])
+    job._next_chunk = AsyncMock(side_effect=[ids[0:2], ids[2:4], ids[4:5]])
+    redis = _redis()
+
+    with patch.object(nightly_jobs.cache_service, "redis", redis):
+        stats = await job.run()
+
+    # 失败块重试 CHUNK_RETRIES 次后中止，之后的块本轮不处理
+    assert job.chunks == [ids[0:2]] + [ids[2:4]] * (1 + job.CHUNK_RETRIES)
+    assert stats["aborted"] is True and stats["processed"] == 2
+    saved = [c.args[1] for c in redis.set.await_args_list]
+    assert saved == [str(ids[1]).encode()]  # 不越过失败块，也不写 done
+
+
+@pytest.mark.asyncio
+async def test_whole_chunk_failure_recovers_on_retry():
+    ids = sorted(uuid.uuid4() for _ in range(2))
+    job = _RecordingJob(chunk_size=2, errors=[2, 0])
+    job._next_chunk = AsyncMock(side_effect=[ids, []])
+    redis = _redis()
+
+    with patch.object(nightly_jobs.cache_service, "redis", redis):
+        stats = await job.run()
+
+    assert stats["aborted"] is False and stats["errors"] == 0  # 只计最终结果
+    assert redis.set.await_args_list[-1].args[1] == CHECKPOINT_DONE
+
+
+@pytest.mark.asyncio
+async def test_run_resumes_from_checkpoint_and_skips_when_done():
+    cursor = uuid.uuid4()
+    job = _RecordingJob(chunk_size=2)
+    job._next_chunk = AsyncMock(return_value=[])
+
+    with patch.object(nightly_jobs.cache_service, "redis", _redis(str(cursor).encode())):
+        await job.run()
+    job._next_chunk.assert_awaited_once_with(cursor)
+
+    job._next_chunk.reset_mock()
+    with patch.object(nightly_jobs.cache_service, "redis", _redis(CHECKPOINT_DONE)):
+        stats = await job.run()
+    assert stats["skipped"] is True
+    job._next_chunk.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_mining_is_bounded_and_isolates_failures():
+    running = 0
+    peak = 0
+    failing = uuid.uuid4()
+
+    async def mine(user_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if user_id == failing:
+            raise RuntimeError("boom")
+        return ["fragment"]
+
+    cognitive = MagicMock()
+    cognitive.mining_implicit_behaviors = mine
+    job = ImplicitMiningJob(chunk_size=10, concurrency=2)
+
+    with patch.object(nightly_jobs, "AsyncSessionLocal", _session_factory()), \
+         patch.object(nightly_jobs, "CognitiveService", MagicMock(return_value=cognitive)):
+        errors = await job.process_chunk([uuid.uuid4() for _ in range(5)] + [failing])
+
+    assert errors == 1
+    assert peak == 2
+    assert job.fragments == 5
+
+
+@pytest.mark.asyncio
+async def test_mining_skipped_once_when_not_implemented():
+    job = ImplicitMiningJob(chunk_size=10)
+    job._next_chunk = AsyncMock()
+    redis = _redis()
+
+    with patch.object(nightly_jobs, "CognitiveService", type("CognitiveService", (), {})), \
+         patch.object(nightly_jobs.cache_service, "redis", redis):
+        stats = await job.run()
+
+    assert stats["skipped"] is True
+    job._next_chunk.assert_not_awaited()
+    redis.set.assert_not_awaited()  # 不写 done 检查点，实现后当天仍可运行
+
+
+def test_batch_job_requires_process_chunk():
+    with pytest.raises(TypeError):
+        BatchJob()
+
+
+@pytest.mark.asyncio
+async def test_review_reminders_bulk_create_from_counts():
+    user_a, user_b = uuid.uuid4(), uuid.uuid4()
+    job = ReviewReminderJob(chunk_size=10)
+    decay = MagicMock()
+    decay.get_review_counts = AsyncMock(return_value=[(user_a, 5, 2), (user_b, 1, 0)])
+    create_many = AsyncMock(return_value=2)
+
+    with patch.object(nightly_jobs, "AsyncSessionLocal", _session_factory()), \
+         patch.object(nightly_jobs, "DecayService", MagicMock(return_value=decay)), \
+         patch.object(nightly_jobs.NotificationService, "create_many", create_many):
+        errors = await job.process_chunk([user_a, user_b, uuid.uuid4()])
+
+    assert errors == 0 and job.sent == 2
+    notifications = create_many.await_args.args[1]
+    assert notifications[0][0] == user_a
+    assert notifications[0][1].content == "您有 5 个知识点需要复习，其中 2 个紧急"
+    assert notifications[1][1].data == {"suggestion_count": 1, "urgent_count": 0}
+
+
+@pytest.mark.asyncio
+async def test_get_review_counts_uses_one_windowed_query():
+    user_id = uuid.uuid4()
+    result = MagicMock()
+    result.all.return_value = [(user_id, 3, 1)]
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=result)
+
+    counts = await DecayService(db).get_review_counts([user_id])
+
+    assert counts == [(user_id, 3, 1)]
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "row_number() OVER (PARTITION BY user_node_status.user_id ORDER BY user_node_status.mastery_score ASC)" in sql
+    assert "count(*) FILTER (WHERE" in sql
+    assert await DecayService(db).get_review_counts([]) == []
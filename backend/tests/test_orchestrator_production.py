@@ -0,0 +1,185 @@
+"""
+ProductionChatOrchestrator 测试
+测试 exemplar 长度上限、指标记录失败隔离，以及上下文来源并发构建的截止时间与降级
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+# 依赖 GraphKnowledgeService，该模块不可导入时跳过整个文件（而不是中断整套测试的收集）
+orchestrator_production = pytest.importorskip("app.orchestration.orchestrator_production")
+ProductionChatOrchestrator = orchestrator_production.ProductionChatOrchestrator
+EXEMPLAR_MAX_CHARS = orchestrator_production.EXEMPLAR_MAX_CHARS
+_exemplar = orchestrator_production._exemplar
+_record_with_exemplar = orchestrator_production._record_with_exemplar
+CONTEXT_SOURCE_USER = orchestrator_production.CONTEXT_SOURCE_USER
+CONTEXT_SOURCE_CONVERSATION = orchestrator_production.CONTEXT_SOURCE_CONVERSATION
+CONTEXT_SOURCE_KNOWLEDGE = orchestrator_production.CONTEXT_SOURCE_KNOWLEDGE
+agent_service_pb2 = orchestrator_production.agent_service_pb2
+
+
+def _active_span():
+    context = SpanContext(
+        trace_id=0x1234567890ABCDEF1234567890ABCDEF,
+        span_id=0x1234567890ABCDEF,
+        is_remote=False,
+        trace_flags=TraceFlags(TraceFlags.SAMPLED),
+    )
+    return NonRecordingSpan(context)
+
+
+@pytest.mark.parametrize("session_id", ["", "s" * 78, "s" * 79, "s" * 100, "会话" * 500])
+def test_exemplar_always_fits_label_limit(session_id):
+    with patch.object(orchestrator_production.trace, "get_current_span", return_value=_active_span()):
+        exemplar = _exemplar(session_id)
+
+    assert "trace_id" in exemplar
+    assert sum(len(k) + len(v) for k, v in exemplar.items()) <= EXEMPLAR_MAX_CHARS
+    # 未超长的会话 ID 原样保留，超长的替换为稳定哈希
+    if len(session_id) <= 78:
+        assert exemplar["session_id"] == session_id
+    else:
+        assert exemplar["session_id"] != session_id
+        assert exemplar["session_id"] == _exemplar(session_id)["session_id"]
+
+
+def test_long_session_id_is_recorded_with_exemplar():
+    histogram = Histogram("test_exemplar_seconds", "test", registry=CollectorRegistry())
+
+    with patch.object(orchestrator_production.trace, "get_current_span", return_value=_active_span()):
+        _record_with_exemplar(histogram.observe, 0.2, "x" * 1000)
+
+    assert histogram._sum.get() == pytest.approx(0.2)
+
+
+def test_invalid_exemplar_falls_back_to_plain_record():
+    counter = Counter("test_exemplar_fallback", "test", registry=CollectorRegistry())
+
+    with patch.object(orchestrator_production, "_exemplar", return_value={"bad label": "x"}):
+        _record_with_exemplar(counter.inc, 1, "session")
+
+    assert counter._value.get() == 1
+
+
+def test_metric_failure_never_reaches_the_request():
+    record = MagicMock(side_effect=RuntimeError("registry broken"))
+
+    _record_with_exemplar(record, 1, "session")  # 不抛出
+
+    record.assert_called_once()
+
+
+def test_count_request_with_unbounded_session_id():
+    orchestrator = ProductionChatOrchestrator()
+    counter = orchestrator_production.REQUEST_COUNTER.labels(status="duplicate", model=orchestrator.model_name)
+    before = counter._value.get()
+    with patch.object(orchestrator_production.trace, "get_current_span", return_value=_active_span()):
+        orchestrator._count_request("duplicate", "d" * 10_000)
+
+    assert counter._value.get() == before + 1
+
+
+def _context_orchestrator():
+    return ProductionChatOrchestrator(
+        enable_metrics=False,
+        context_deadlines={
+            CONTEXT_SOURCE_USER: 0.05, CONTEXT_SOURCE_CONVERSATION: 0.05, CONTEXT_SOURCE_KNOWLEDGE: 0.05,
+        },
+    )
+
+
+async def _build(orchestrator):
+    request = agent_service_pb2.ChatRequest(session_id="s1", message="什么是熵")
+    return await orchestrator._build_context(request, "s1", str(uuid.uuid4()), MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_slow_source_times_out_while_others_return():
+    orchestrator = _context_orchestrator()
+
+    async def slow_user_context(user_id, db_session):
+        await asyncio.sleep(1)
+        return {"user_context": {"nickname": "late"}}
+
+    async def conversation(session_id, user_id):
+        return {"messages": [{"role": "user", "content": "hi"}], "summary": "earlier"}
+
+    async def knowledge(query, user_id):
+        return "熵是无序程度的度量"
+
+    orchestrator._build_user_context = slow_user_context
+    orchestrator._build_conversation_context = conversation
+    orchestrator._retrieve_knowledge = knowledge
+
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    user_ctx, conv_ctx, knowledge_ctx, report = await _build(orchestrator)
+
+    assert loop.time() - t0 < 0.5  # 受截止时间约束，而不是等慢来源跑完
+    assert user_ctx == orchestrator._get_fallback_context()
+    assert conv_ctx["summary"] == "earlier" and knowledge_ctx == "熵是无序程度的度量"
+    assert report[CONTEXT_SOURCE_USER]["status"] == "timeout"
+    assert report[CONTEXT_SOURCE_USER]["has_profile"] is False
+    assert report[CONTEXT_SOURCE_CONVERSATION]["status"] == "ok"
+    assert report[CONTEXT_SOURCE_CONVERSATION]["messages"] == 1
+    assert report[CONTEXT_SOURCE_KNOWLEDGE]["status"] == "ok"
+    assert report[CONTEXT_SOURCE_KNOWLEDGE]["chars"] == len(knowledge_ctx)
+
+
+@pytest.mark.asyncio
+async def test_failing_source_uses_fallback_while_others_return():
+    orchestrator = _context_orchestrator()
+
+    async def user_context(user_id, db_session):
+        return {"user_context": {"nickname": "A"}, "analytics_summary": {}, "preferences": {}}
+
+    async def broken_conversation(session_id, user_id):
+        raise ConnectionError("redis down")
+
+    async def broken_knowledge(query, user_id):
+        raise RuntimeError("index missing")
+
+    orchestrator._build_user_context = user_context
+    orchestrator._build_conversation_context = broken_conversation
+    orchestrator._retrieve_knowledge = broken_knowledge
+
+    user_ctx, conv_ctx, knowledge_ctx, report = await _build(orchestrator)
+
+    assert user_ctx["user_context"] == {"nickname": "A"}
+    assert report[CONTEXT_SOURCE_USER]["status"] == "ok"
+    assert conv_ctx == {"messages": [], "summary": None}
+    assert report[CONTEXT_SOURCE_CONVERSATION]["status"] == "error"
+    assert knowledge_ctx == ""
+    assert report[CONTEXT_SOURCE_KNOWLEDGE]["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_knowledge_retrieval_uses_injected_session_factory():
+    rag_db = MagicMock()
+    session_cm = MagicMock()
+    session_cm.__aenter__ = AsyncMock(return_value=rag_db)
+    session_cm.__aexit__ = AsyncMock(return_value=False)
+    session_factory = MagicMock(return_value=session_cm)
+    orchestrator = ProductionChatOrchestrator(enable_metrics=False, session_factory=session_factory)
+
+    graph_ks = MagicMock()
+    graph_ks.graph_rag_search = AsyncMock(return_value={"context": "熵是无序程度的度量"})
+    with patch.object(orchestrator_production, "GraphKnowledgeService", return_value=graph_ks) as service, \
+            patch.object(orchestrator_production, "AsyncSessionLocal") as default_factory:
+        context = await orchestrator._retrieve_knowledge("什么是熵", str(uuid.uuid4()))
+
+    assert context == "熵是无序程度的度量"
+    session_factory.assert_called_once_with()
+    service.assert_called_once_with(rag_db)
+    default_factory.assert_not_called()
+
+
+def test_session_factory_defaults_to_async_session_local():
+    orchestrator = ProductionChatOrchestrator(enable_metrics=False)
+
+    assert orchestrator.session_factory is orchestrator_production.AsyncSessionLocal
@@ -0,0 +1,214 @@
+"""
+PushService 批量推送周期测试
+测试 keyset 分页、批量频控、策略优先级、文案生成并发上限与周期互斥
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+
+from app.services.push_service import PushService
+from app.services.push_strategies import CuriosityStrategy, MemoryStrategy, SprintStrategy
+
+
+def _user(enable_curiosity=False, last_push_time=None, daily_cap=5, tz="Asia/Shanghai"):
+    prefs = SimpleNamespace(
+        enable_curiosity=enable_curiosity,
+        last_push_time=last_push_time,
+        daily_cap=daily_cap,
+        timezone=tz,
+        active_slots=None,
+        persona_type="coach",
+    )
+    return SimpleNamespace(id=uuid.uuid4(), nickname="同学", username="u", push_preference=prefs)
+
+
+def _result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
+
+
+@pytest.mark.asyncio
+async def test_strategy_priority_and_bulk_evaluation():
+    sprint_user, curious_user, memory_user, idle_user = (uuid.uuid4() for _ in range(4))
+    user_ids = [sprint_user, curious_user, memory_user, idle_user]
+    service = PushService(MagicMock())
+    service.sprint_strategy.evaluate_many = AsyncMock(return_value={sprint_user: {"type": "sprint"}})
+    service.curiosity_strategy.evaluate_many = AsyncMock(return_value={curious_user: {"type": "curiosity_capsule"}})
+    service.memory_strategy.evaluate_many = AsyncMock(return_value={memory_user: {"type": "memory"}})
+    service.inactivity_strategy.evaluate_many = AsyncMock(
+        return_value={idle_user: {"type": "inactivity"}, memory_user: {"type": "inactivity"}}
+    )
+
+    triggers = await service.evaluate_strategies(user_ids)
+
+    assert {uid: t for uid, (t, _) in triggers.items()} == {
+        sprint_user: "sprint",
+        curious_user: "curiosity",
+        memory_user: "memory",
+        idle_user: "inactivity",
+    }
+    # 每个策略一次调用，只评估尚未被更高优先级策略认领的用户
+    service.sprint_strategy.evaluate_many.assert_awaited_once()
+    assert service.memory_strategy.evaluate_many.await_args.args[0] == [memory_user, idle_user]
+    assert service.inactivity_strategy.evaluate_many.await_args.args[0] == [idle_user]
+
+
+@pytest.mark.asyncio
+async def test_content_generation_is_bounded_and_sends_sequentially():
+    users = [_user() for _ in range(10)]
+    service = PushService(MagicMock(), content_concurrency=3)
+    service._is_active_time = MagicMock(return_value=True)
+    service._capped_user_ids = AsyncMock(return_value={users[0].id})
+    service.evaluate_strategies = AsyncMock(
+        return_value={u.id: ("inactivity", {"type": "inactivity"}) for u in users}
+    )
+    service._send_push = AsyncMock()
+
+    running = 0
+    peak = 0
+
+    async def generate(user, prefs, trigger_type, data):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return None if user is users[1] else {"title": "t", "body": "b"}
+
+    service._generate_push_content = generate
+
+    stats = await service.process_user_batch(users)
+
+    assert peak == 3
+    assert stats == {"sent": 8, "errors": 0}
+    # 频控命中的用户不参与策略评估
+    assert users[0].id not in service.evaluate_strategies.await_args.args[0]
+    sent_to = [c.args[0] for c in service._send_push.await_args_list]
+    assert sent_to == [u.id for u in users[2:]]
+
+
+@pytest.mark.asyncio
+async def test_capped_user_ids_groups_daily_count_by_local_day():
+    now = datetime.now(timezone.utc)
+    cooling = _user(last_push_time=now - timedelta(minutes=30))
+    capped_sh = _user(daily_cap=2)
+    free_sh = _user(daily_cap=2)
+    ny = _user(daily_cap=1, tz="America/New_York")
+
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        _result([(capped_sh.id, 2), (free_sh.id, 1)]),
+        _result([]),
+    ])
+    service = PushService(db)
+
+    capped = await service._capped_user_ids([cooling, capped_sh, free_sh, ny])
+
+    assert capped == {cooling.id, capped_sh.id}
+    # 两个时区 -> 两次分组计数；冷却中的用户不查询
+    assert db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_process_all_users_paginates_by_keyset():
+    batches = [[_user(), _user()], [_user()]]
+    service = PushService(MagicMock(), batch_size=2)
+    service.db.expunge_all = MagicMock()
+    service._fetch_user_batch = AsyncMock(side_effect=batches)
+    service.process_user_batch = AsyncMock(side_effect=[{"sent": 1, "errors": 0}, {"sent": 0, "errors": 1}])
+
+    stats = await service.process_all_users()
+
+    assert stats == {"processed": 3, "sent": 1, "errors": 1}
+    cursors = [c.args[0] for c in service._fetch_user_batch.await_args_list]
+    assert cursors == [None, batches[0][-1].id]  # 不足一批即结束，不再多查一次
+
+
+@pytest.mark.asyncio
+async def test_overlapping_cycles_are_skipped():
+    release = asyncio.Event()
+    service = PushService(MagicMock())
+    service.db.expunge_all = MagicMock()
+
+    async def slow_fetch(cursor):
+        await release.wait()
+        return []
+
+    service._fetch_user_batch = slow_fetch
+
+    first = asyncio.create_task(service.process_all_users())
+    await asyncio.sleep(0)
+    assert await PushService(MagicMock()).process_all_users() is None
+
+    release.set()
+    assert await first == {"processed": 0, "sent": 0, "errors": 0}
+
+
+@pytest.mark.asyncio
+async def test_memory_evaluate_many_ranks_nodes_per_user():
+    user_a, user_b = uuid.uuid4(), uuid.uuid4()
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result([
+        (user_a, "极限", 0.1), (user_a, "导数", 0.2), (user_b, "矩阵", 0.25),
+    ]))
+
+    triggered = await MemoryStrategy().evaluate_many([user_a, user_b], db)
+
+    assert triggered[user_a] == {"type": "memory", "nodes": ["极限", "导数"], "retention_rate": 0.1}
+    assert triggered[user_b]["nodes"] == ["矩阵"]
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "row_number() OVER (PARTITION BY user_node_status.user_id" in sql
+    assert "IN (__[POSTCOMPILE_user_id_1])" in sql
+
+
+@pytest.mark.asyncio
+async def test_sprint_evaluate_many_uses_one_distinct_on_query():
+    user_id = uuid.uuid4()
+    target = datetime.now(timezone.utc).date() + timedelta(days=2)
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result([(user_id, "期末冲刺", target)]))
+
+    triggered = await SprintStrategy().evaluate_many([user_id], db)
+
+    assert triggered == {user_id: {"type": "sprint", "plan_name": "期末冲刺", "hours_remaining": 48}}
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "DISTINCT ON (plans.user_id)" in sql
+    assert await SprintStrategy().evaluate_many([], db) == {}
+
+
+@pytest.mark.asyncio
+async def test_per_user_methods_delegate_to_evaluate_many_without_shared_state():
+    strategy = MemoryStrategy()
+    user_a, user_b = SimpleNamespace(id=uuid.uuid4()), SimpleNamespace(id=uuid.uuid4())
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        _result([(user_a.id, "极限", 0.1)]),
+        _result([]),
+        _result([]),
+    ])
+
+    assert await strategy.should_trigger(user_a, db) is True
+    # 上一个用户的结果不会泄漏给下一个用户
+    assert await strategy.should_trigger(user_b, db) is False
+    assert await strategy.get_trigger_data(user_b, db) == {}
+
+
+@pytest.mark.asyncio
+async def test_curiosity_evaluate_many_filters_by_preference():
+    enabled = uuid.uuid4()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = [enabled]
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=result)
+
+    triggered = await CuriosityStrategy().evaluate_many([enabled, uuid.uuid4()], db)
+
+    assert triggered == {enabled: {"type": "curiosity_capsule"}}
+    db.execute.assert_awaited_once()
@@ -0,0 +1,57 @@
+"""
+RedisSearchClient 预过滤向量检索测试
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core.redis_search_client import RedisSearchClient
+
+
+@pytest.fixture
+def client():
+    c = RedisSearchClient()
+    c.search = AsyncMock(return_value=MagicMock(docs=[]))
+    return c
+
+
+def test_build_filter_escapes_tags_and_bounds_ranges():
+    expr = RedisSearchClient.build_filter(
+        subject_id=3,
+        parent_ids=["a1-b2"],
+        min_importance=2,
+    )
+    assert expr == "@subject_id:[3 3] @parent_id:{a1\\-b2} @importance:[2 +inf]"
+    assert RedisSearchClient.build_filter() == ""
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_prefilters_knn(client):
+    await client.hybrid_search("*", [0.1, 0.2], top_k=15, subject_id=7, ef_runtime=64)
+
+    query, params = client.search.await_args[0]
+    assert query.query_string() == (
+        "(@subject_id:[7 7])=>[KNN 15 @vector $vec EF_RUNTIME $ef AS vector_score]"
+    )
+    assert params["ef"] == 64
+
+
+@pytest.mark.asyncio
+async def test_unscoped_hybrid_search_keeps_wildcard(client):
+    await client.hybrid_search("", [0.1], top_k=5)
+
+    query, params = client.search.await_args[0]
+    assert query.query_string().startswith("(*)=>[KNN 5 ")
+    assert params["ef"] == client.ef_runtime
+
+
+@pytest.mark.asyncio
+async def test_range_search_combines_radius_and_filter(client):
+    await client.range_search([0.1], radius=0.2, subject_id=1)
+
+    query, params = client.search.await_args[0]
+    assert query.query_string() == (
+        "@vector:[VECTOR_RANGE $radius $vec]=>{$YIELD_DISTANCE_AS: vector_score} "
+        "@subject_id:[1 1]"
+    )
+    assert params["radius"] == 0.2
@@ -0,0 +1,94 @@
+"""
+RerankService Tests
+测试跨请求微批、分数缓存与带分数的排序结果
+"""
+
+import asyncio
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from app.services.rerank_service import RerankService
+
+
+def _chunk(chunk_id, content):
+    return SimpleNamespace(id=chunk_id, content=content)
+
+
+@pytest.fixture
+def service():
+    svc = RerankService()
+    svc.batch_window = 0.01
+    svc.model = MagicMock()
+    # 分数 = 文本长度 / 10，便于断言排序
+    svc._predict = MagicMock(side_effect=lambda pairs: np.array([len(t) / 10 for _, t in pairs]))
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_inference(service):
+    a = [_chunk("c1", "aa"), _chunk("c2", "aaaa")]
+    b = [_chunk("c3", "aaa")]
+
+    results = await asyncio.gather(
+        service.rerank_with_scores("q1", a, top_k=2),
+        service.rerank_with_scores("q2", b, top_k=1),
+    )
+
+    assert service._predict.call_count == 1
+    assert len(service._predict.call_args[0][0]) == 3
+    assert [(c.id, s) for c, s in results[0]] == [("c2", 0.4), ("c1", 0.2)]
+    assert results[1][0][1] == pytest.approx(0.3)
+
+
+@pytest.mark.asyncio
+async def test_scores_are_cached_per_query_and_chunk(service):
+    chunks = [_chunk("c1", "aa"), _chunk("c2", "aaaa")]
+
+    await service.rerank("q", chunks, top_k=2)
+    ranked = await service.rerank("q", chunks, top_k=1)
+
+    assert [c.id for c in ranked] == ["c2"]
+    assert service._predict.call_count == 1
+
+    # 不同查询需要重新打分
+    await service.rerank("other", chunks, top_k=1)
+    assert service._predict.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_model_keeps_order_without_scores(service):
+    service.model = None
+    chunks = [_chunk("c1", "aa"), _chunk("c2", "aaaa")]
+
+    ranked = await service.rerank_with_scores("q", chunks, top_k=1)
+
+    assert ranked == [(chunks[0], None)]
+
+
+def test_torch_and_onnx_backends_return_same_scores():
+    logits = np.array([8.6, -4.3, 0.0, 2.5], dtype=np.float32)
+    pairs = [["q", f"doc {i}"] for i in range(len(logits))]
+
+    torch_svc = RerankService()
+    torch_svc.backend = "torch"
+    torch_svc.model = MagicMock()
+    torch_svc.model.predict.return_value = logits
+
+    onnx_svc = RerankService()
+    onnx_svc.backend = "onnx"
+    onnx_svc.max_batch_size = 3  # 跨两个批次
+    onnx_svc._session = MagicMock()
+    onnx_svc._session.get_inputs.return_value = [SimpleNamespace(name="input_ids")]
+    onnx_svc._session.run.side_effect = [[logits[:3].reshape(-1, 1)], [logits[3:].reshape(-1, 1)]]
+    onnx_svc._tokenizer = MagicMock(side_effect=lambda q, d, **kw: {"input_ids": np.zeros((len(q), 4))})
+
+    torch_scores = torch_svc._predict(pairs)
+    onnx_scores = onnx_svc._predict(pairs)
+
+    # PyTorch 路径请求原始 logits，两个后端用同一个 sigmoid 映射到 [0, 1]
+    assert torch_svc.model.predict.call_args.kwargs["activation_fct"] is torch_svc._logit_activation
+    np.testing.assert_allclose(torch_scores, onnx_scores, rtol=1e-6)
+    assert np.all((torch_scores >= 0) & (torch_scores <= 1))
+    assert torch_scores[0] > 0.99 and torch_scores[1] < 0.02 and torch_scores[2] == pytest.approx(0.5)
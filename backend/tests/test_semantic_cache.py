@@ -0,0 +1,94 @@
+"""
+SemanticCacheService Tests
+测试向量相似度模式下的命中判定、作用域隔离与写入格式
+"""
+
+import json
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import MagicMock, AsyncMock
+
+from app.services.semantic_cache_service import SemanticCacheService, GLOBAL_SCOPE_TAG
+
+
+def _make_redis(nearest_distance=None, payload=None):
+    redis = MagicMock()
+    redis.exists.return_value = True
+    redis.hget.return_value = None
+
+    docs = []
+    if nearest_distance is not None:
+        docs.append(SimpleNamespace(
+            payload=json.dumps({"data": payload}),
+            query="cached query",
+            distance=str(nearest_distance),
+        ))
+    redis.ft.return_value.search.return_value = SimpleNamespace(docs=docs, total=len(docs))
+    return redis
+
+
+def _make_service(redis, scope=SemanticCacheService.SCOPE_USER):
+    embedding_service = MagicMock()
+    embedding_service.get_embedding = AsyncMock(return_value=[0.1, 0.2, 0.3])
+    return SemanticCacheService(
+        redis_client=redis,
+        mode=SemanticCacheService.MODE_SEMANTIC,
+        scope=scope,
+        embedding_service=embedding_service,
+        similarity_threshold=0.9,
+        embedding_dim=3,
+    )
+
+
+@pytest.mark.asyncio
+async def test_semantic_hit_above_threshold():
+    redis = _make_redis(nearest_distance=0.05, payload={"answer": 42})
+    service = _make_service(redis)
+
+    result = await service.get("什么是牛顿第二定律", user_id="user-1")
+
+    assert result == {"answer": 42}
+    redis.hincrby.assert_any_call(service.STATS_KEY, "total_hits", 1)
+
+
+@pytest.mark.asyncio
+async def test_semantic_miss_below_threshold():
+    redis = _make_redis(nearest_distance=0.3, payload={"answer": 42})
+    service = _make_service(redis)
+
+    result = await service.get("完全不同的问题", user_id="user-1")
+
+    assert result is None
+    redis.hincrby.assert_any_call(service.STATS_KEY, "total_misses", 1)
+    # 相似度 0.7 记录到 miss 分布
+    redis.hincrby.assert_any_call(service.SIMILARITY_KEY, "miss:le_0.7", 1)
+
+
+@pytest.mark.asyncio
+async def test_user_scope_filters_by_escaped_user_tag():
+    redis = _make_redis(nearest_distance=0.0, payload={})
+    service = _make_service(redis)
+
+    await service.get("query", user_id="ab-cd")
+
+    query = redis.ft.return_value.search.call_args[0][0]
+    assert "@user_id:{ab\\-cd}" in query.query_string()
+
+
+@pytest.mark.asyncio
+async def test_set_stores_payload_and_embedding_in_hash():
+    redis = _make_redis()
+    service = _make_service(redis, scope=SemanticCacheService.SCOPE_GLOBAL)
+
+    ok = await service.set("query", {"answer": 1}, user_id="user-1", ttl=60)
+
+    assert ok is True
+    pipe = redis.pipeline.return_value
+    key, = pipe.hset.call_args[0]
+    mapping = pipe.hset.call_args[1]["mapping"]
+    assert key.startswith(service.VECTOR_PREFIX)
+    assert mapping["user_id"] == GLOBAL_SCOPE_TAG
+    assert np.frombuffer(mapping["embedding"], dtype=np.float32).shape == (3,)
+    assert json.loads(mapping["payload"])["data"] == {"answer": 1}
+    pipe.expire.assert_called_once_with(key, 60)
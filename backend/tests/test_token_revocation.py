@@ -0,0 +1,121 @@
+"""
+Token 吊销检查测试
+测试布隆过滤器、本地快速路径、Redis 确认 / 失败关闭以及 pub/sub 同步
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core import token_revocation
+from app.core.token_revocation import BloomFilter, TokenRevocationService, REVOCATION_CHANNEL
+
+
+def _redis(keys=()):
+    redis = MagicMock()
+
+    async def scan_iter(match=None, count=None):
+        for key in keys:
+            yield key
+
+    redis.scan_iter = scan_iter
+    redis.publish = AsyncMock()
+    return redis
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"jti-{i}")
+
+    assert all(f"jti-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(5000))
+    assert false_positives < 150  # 约 1%
+
+
+@pytest.mark.asyncio
+async def test_unsynced_service_checks_redis():
+    service = TokenRevocationService()
+    with patch.object(token_revocation.cache_service, "get", AsyncMock(return_value="revoked")) as get:
+        assert await service.is_token_blacklisted("jti-1") is True
+    get.assert_awaited_once_with("token:blacklist:jti-1")
+
+
+@pytest.mark.asyncio
+async def test_synced_filter_answers_unknown_tokens_locally():
+    service = TokenRevocationService()
+    with patch.object(token_revocation.cache_service, "redis", _redis([b"token:blacklist:revoked-1"])):
+        await service._rebuild()
+
+    get = AsyncMock(return_value=None)
+    with patch.object(token_revocation.cache_service, "get", get):
+        assert await service.is_token_blacklisted("fresh-token") is False
+        get.assert_not_awaited()
+
+        # 过滤器命中时回源 Redis 确认：已过期（或误判）的 JTI 返回 False
+        assert await service.is_token_blacklisted("revoked-1") is False
+        get.assert_awaited_once_with("token:blacklist:revoked-1")
+
+
+@pytest.mark.asyncio
+async def test_filter_hit_fails_closed_when_redis_is_down():
+    service = TokenRevocationService()
+    with patch.object(token_revocation.cache_service, "redis", _redis([b"token:blacklist:revoked-1"])):
+        await service._rebuild()
+
+    with patch.object(token_revocation.cache_service, "get", AsyncMock(side_effect=ConnectionError("down"))):
+        assert await service.is_token_blacklisted("revoked-1") is True
+
+
+@pytest.mark.asyncio
+async def test_blacklist_token_stores_publishes_and_updates_local_filter():
+    service = TokenRevocationService()
+    redis = _redis()
+    with patch.object(token_revocation.cache_service, "redis", redis):
+        await service._rebuild()
+        with patch.object(token_revocation.cache_service, "set", AsyncMock()) as cache_set:
+            assert await service.blacklist_token("jti-9", expires_in=120) is True
+
+    cache_set.assert_awaited_once_with("token:blacklist:jti-9", "revoked", ttl=120)
+    redis.publish.assert_awaited_once_with(REVOCATION_CHANNEL, "jti-9")
+    assert "jti-9" in service._filter
+
+
+def _listening_service(messages):
+    service = TokenRevocationService()
+    service._pubsub = MagicMock()
+    service._pubsub.get_message = AsyncMock(side_effect=[*messages, asyncio.CancelledError()])
+    return service
+
+
+@pytest.mark.asyncio
+async def test_listener_applies_published_revocations():
+    service = _listening_service([{"type": "message", "data": b"from-pubsub"}])
+
+    with patch.object(token_revocation.cache_service, "redis", _redis()):
+        await service._rebuild()
+        with pytest.raises(asyncio.CancelledError):
+            await service._listen()
+
+    assert "from-pubsub" in service._filter
+
+
+@pytest.mark.asyncio
+async def test_listener_resyncs_from_redis_after_connection_error():
+    service = _listening_service([ConnectionError("lost"), None])
+    synced_after_error = []
+
+    async def sleep(_):
+        synced_after_error.append(service._synced)
+
+    with patch.object(token_revocation.cache_service, "redis", _redis([b"token:blacklist:missed"])), \
+         patch.object(token_revocation.asyncio, "sleep", sleep):
+        service._synced = True
+        with pytest.raises(asyncio.CancelledError):
+            await service._listen()
+
+    # 断线期间改走 Redis，恢复后全量重建（丢失的消息由 SCAN 补齐）
+    assert synced_after_error == [False]
+    assert service._synced is True
+    assert "missed" in service._filter
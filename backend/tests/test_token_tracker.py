@@ -0,0 +1,68 @@
+"""
+TokenTracker 记账测试
+测试单次事务写入与基于有序集合的配额/排行榜读取
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from app.orchestration.token_tracker import TokenTracker
+
+
+def _make_redis(results):
+    redis = MagicMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results)
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    redis.pipeline.return_value = ctx
+    return redis, pipe
+
+
+@pytest.mark.asyncio
+async def test_record_usage_single_transaction():
+    redis, pipe = _make_redis([])
+    tracker = TokenTracker(redis)
+
+    total = await tracker.record_usage("u1", "s1", "r1", 100, 50, model="gpt-4")
+
+    assert total == 150
+    redis.pipeline.assert_called_once_with(transaction=True)
+    pipe.execute.assert_awaited_once()
+    today = datetime.now().strftime("%Y-%m-%d")
+    pipe.zincrby.assert_called_once_with(f"leaderboard:daily_tokens:{today}", 150, "u1")
+    pipe.incrby.assert_any_call(f"system:tokens:{today}", 150)
+    assert pipe.rpush.call_args_list[0][0][0] == "queue:billing"
+
+
+@pytest.mark.asyncio
+async def test_check_quota_reads_leaderboard():
+    redis = MagicMock()
+    redis.zscore = AsyncMock(return_value=900.0)
+    tracker = TokenTracker(redis)
+
+    quota = await tracker.check_quota("u1", daily_limit=1000)
+
+    assert quota["used"] == 900
+    assert quota["remaining"] == 100
+    assert quota["within_quota"] is True
+
+
+@pytest.mark.asyncio
+async def test_top_users_merges_days_server_side():
+    redis, pipe = _make_redis([3, [(b"u2", 500.0), (b"u1", 150.0)], 1])
+    redis.scan_iter = MagicMock(side_effect=AssertionError("should not scan keyspace"))
+    tracker = TokenTracker(redis)
+
+    top = await tracker.get_top_users(days=3, limit=2)
+
+    assert top == [
+        {"user_id": "u2", "total_tokens": 500},
+        {"user_id": "u1", "total_tokens": 150},
+    ]
+    union_key, sources = pipe.zunionstore.call_args[0]
+    assert len(sources) == 3
+    pipe.zrevrange.assert_called_once_with(union_key, 0, 1, withscores=True)
+    pipe.delete.assert_called_once_with(union_key)
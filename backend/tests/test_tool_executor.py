@@ -0,0 +1,143 @@
+"""
+ToolExecutor 并发执行测试
+测试独立调用并发、写操作串行以及超时处理
+"""
+
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from pydantic import BaseModel
+
+from app.orchestration.executor import ToolExecutor
+from app.tools.base import BaseTool, ToolCategory, ToolResult, DEFAULT_TOOL_TIMEOUT
+from app.tools.registry import tool_registry
+
+
+class _Params(BaseModel):
+    label: str = ""
+
+
+def _make_tool(name, read_only=False, uses_db=True, delay=0.05, timeout=None, log=None):
+    class _Tool(BaseTool):
+        description = "test"
+        category = ToolCategory.QUERY
+        parameters_schema = _Params
+
+        async def execute(self, params, user_id, db_session):
+            if log is not None:
+                log.append(("start", params.label, db_session))
+            await asyncio.sleep(delay)
+            if log is not None:
+                log.append(("end", params.label, db_session))
+            return ToolResult(success=True, tool_name=self.name, data={"label": params.label})
+
+    tool = _Tool()
+    tool.name = name
+    tool.read_only = read_only
+    tool.uses_db = uses_db
+    tool.timeout = timeout
+    return tool
+
+
+def _call(name, label):
+    return {"function": {"name": name, "arguments": {"label": label}}}
+
+
+@pytest.mark.asyncio
+async def test_independent_calls_run_concurrently():
+    tools = {"t_remote": _make_tool("t_remote", read_only=True, uses_db=False)}
+    with patch.dict(tool_registry._tools, tools):
+        started = time.perf_counter()
+        results = await ToolExecutor().execute_tool_calls(
+            [_call("t_remote", str(i)) for i in range(4)], "u1", MagicMock()
+        )
+        elapsed = time.perf_counter() - started
+
+    assert [r.data["label"] for r in results] == ["0", "1", "2", "3"]
+    assert elapsed < 0.15  # 串行需要 0.2s
+
+
+@pytest.mark.asyncio
+async def test_mutations_serialized_on_caller_session():
+    log = []
+    caller_session = MagicMock(name="caller")
+    own_session = MagicMock(name="own")
+    tools = {
+        "t_read": _make_tool("t_read", read_only=True, log=log),
+        "t_write": _make_tool("t_write", log=log),
+    }
+
+    session_ctx = MagicMock()
+    session_ctx.__aenter__.return_value = own_session
+    with patch.dict(tool_registry._tools, tools), \
+            patch("app.orchestration.executor.AsyncSessionLocal", return_value=session_ctx):
+        calls = [_call("t_read", "r1"), _call("t_write", "w1"), _call("t_write", "w2"), _call("t_read", "r2")]
+        results = await ToolExecutor().execute_tool_calls(calls, "u1", caller_session)
+
+    assert [r.data["label"] for r in results] == ["r1", "w1", "w2", "r2"]
+
+    # 写操作之前的读取使用独立会话，与写操作并发
+    assert ("start", "r1", own_session) in log
+    assert log.index(("start", "w1", caller_session)) < log.index(("end", "r1", own_session))
+
+    # 写操作及其后的读取在调用方会话上按顺序执行，互不重叠
+    serial = [(event, label) for event, label, session in log if session is caller_session]
+    assert serial == [("start", "w1"), ("end", "w1"), ("start", "w2"), ("end", "w2"), ("start", "r2"), ("end", "r2")]
+
+
+@pytest.mark.asyncio
+async def test_timeout_returns_failed_result():
+    tools = {"t_slow": _make_tool("t_slow", delay=1, timeout=0.01)}
+    with patch.dict(tool_registry._tools, tools):
+        result = await ToolExecutor().execute_tool_call("t_slow", {"label": "x"}, "u1", MagicMock())
+
+    assert result.success is False
+    assert "超时" in result.error_message
+
+
+def test_mutating_tools_are_not_cancelled_by_default():
+    # 写数据库的工具在调用方会话上运行，默认不设超时，避免 flush 中途被取消
+    assert _make_tool("t_write").effective_timeout is None
+    assert _make_tool("t_read", read_only=True).effective_timeout == DEFAULT_TOOL_TIMEOUT
+    assert _make_tool("t_remote", uses_db=False).effective_timeout == DEFAULT_TOOL_TIMEOUT
+    assert _make_tool("t_write", timeout=5).effective_timeout == 5
+
+
+@pytest.mark.asyncio
+async def test_slow_mutation_runs_to_completion():
+    tools = {"t_write": _make_tool("t_write", delay=0.05)}
+    with patch.dict(tool_registry._tools, tools), \
+            patch("app.tools.base.DEFAULT_TOOL_TIMEOUT", 0.01):
+        result = await ToolExecutor().execute_tool_call("t_write", {"label": "w"}, "u1", MagicMock())
+
+    assert result.success is True
+
+
+@pytest.mark.asyncio
+async def test_failures_become_results_without_abandoning_the_serial_chain():
+    log = []
+    failing = _make_tool("t_fail", read_only=True)
+    failing.execute = MagicMock(side_effect=RuntimeError("boom"))
+    tools = {
+        "t_fail": failing,
+        "t_read": _make_tool("t_read", read_only=True),
+        "t_write": _make_tool("t_write", log=log),
+    }
+
+    # 独立会话打开失败（发生在工具自身的 try 之外）
+    session_ctx = MagicMock()
+    session_ctx.__aenter__.side_effect = ConnectionError("pool exhausted")
+    with patch.dict(tool_registry._tools, tools), \
+            patch("app.orchestration.executor.AsyncSessionLocal", return_value=session_ctx), \
+            patch("app.orchestration.executor.TOOL_EXECUTION_COUNT") as counter:
+        calls = [_call("t_read", "r1"), _call("t_write", "w1"), _call("t_fail", "f1"), _call("t_write", "w2")]
+        results = await ToolExecutor().execute_tool_calls(calls, "u1", MagicMock())
+
+    assert [r.success for r in results] == [False, True, False, True]
+    assert "pool exhausted" in results[0].error_message
+    assert "boom" in results[2].error_message
+    # 串行链在 gather 返回前已全部完成
+    assert [label for event, label, _ in log if event == "end"] == ["w1", "w2"]
+    error_counts = [c for c in counter.labels.call_args_list if c.kwargs["status"] == "error"]
+    assert sorted(c.kwargs["tool_name"] for c in error_counts) == ["t_fail", "t_read"]
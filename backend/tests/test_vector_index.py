@@ -0,0 +1,48 @@
+"""
+pgvector 索引管理测试
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db.vector_index import apply_ef_search, hnsw_index_sql
+
+
+def _db(dialect="postgresql"):
+    db = AsyncMock()
+    db.get_bind = MagicMock(return_value=MagicMock(dialect=MagicMock(name=dialect)))
+    db.get_bind.return_value.dialect.name = dialect
+    return db
+
+
+def test_hnsw_index_sql():
+    sql = hnsw_index_sql("ix_nodes_hnsw", "knowledge_nodes", m=32, ef_construction=128)
+    assert sql == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_nodes_hnsw ON knowledge_nodes "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 32, ef_construction = 128)"
+    )
+
+
+@pytest.mark.asyncio
+async def test_ef_search_set_locally_for_postgres():
+    db = _db()
+    await apply_ef_search(db, 100)
+    assert str(db.execute.await_args[0][0]) == "SET LOCAL hnsw.ef_search = 100"
+
+
+@pytest.mark.asyncio
+async def test_default_ef_search_still_resets_earlier_value():
+    db = _db()
+    await apply_ef_search(db, 200)
+    await apply_ef_search(db, 40)
+    assert [str(c.args[0]) for c in db.execute.await_args_list] == [
+        "SET LOCAL hnsw.ef_search = 200",
+        "SET LOCAL hnsw.ef_search = 40",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ef_search_skipped_for_sqlite():
+    sqlite = _db("sqlite")
+    await apply_ef_search(sqlite, 100)
+    sqlite.execute.assert_not_awaited()